@@ -27,23 +27,42 @@
 from __future__ import print_function
 
 from datetime import datetime
-from heapq import heappush, heappop, heapify
 from threading import Lock
+from collections import deque
 from random import random
-import sys, traceback, signal
+import sys, os, traceback, signal, socket
 if sys.version_info[0] < 3:
     from thread import get_ident
 else:
     from _thread import get_ident
 from sippy.Time.MonoTime import MonoTime
+from sippy.Time.clock_dtime import clock_getdtime, CLOCK_MONOTONIC
 from sippy.Core.Exceptions import dump_exception, StdException
+from sippy.Core.TimerQueue import TimerHeap
 
 from elperiodic.ElPeriodic import ElPeriodic
 
 class EventListener(object):
-    etime = None
-    cb_with_ts = False
-    randomize_runs = None
+    __slots__ = ('etime', 'cb_with_ts', 'randomize_runs', 'cb_func', 'cb_params', \
+      'cb_kw_args', 'ed', 'itime', 'ival', 'nticks', 'abs_time', 'signum', 'tbucket', \
+      'tindex', 'rearm')
+
+    def __init__(self):
+        self.etime = None
+        self.cb_with_ts = False
+        self.randomize_runs = None
+        self.cb_func = None
+        self.cb_params = None
+        self.cb_kw_args = None
+        self.ed = None
+        self.itime = None
+        self.ival = None
+        self.nticks = None
+        self.abs_time = False
+        self.signum = None
+        self.tbucket = None
+        self.tindex = None
+        self.rearm = False
 
     def __cmp__(self, other):
         if other == None:
@@ -56,7 +75,7 @@ class EventListener(object):
     def cancel(self):
         if self.ed != None:
             # Do not crash if cleanup() has already been called
-            self.ed.twasted += 1
+            self.ed.timers.remove(self)
         self.cleanup()
 
     def cleanup(self):
@@ -89,9 +108,46 @@ class EventListener(object):
             self.etime = self.ival
             self.ival = None
             self.nticks = 1
-        heappush(self.ed.tlisteners, self)
+        self.ed.timers.insert(self)
         return
 
+    def reschedule(self, ival):
+        # Re-arm the timer to fire ival seconds after the current event
+        # loop iteration (or at the ival MonoTime for the absolute one),
+        # reusing the same listener. Works for the timers that are still
+        # pending, as well as for the ones that have already fired if
+        # the rearm has been set, since otherwise the listener is cleaned
+        # up once it fires.
+        if self.ed == None:
+            raise StdException('EventListener: timer has been cancelled or has fired ' \
+              'with no rearm set')
+        if self.abs_time:
+            if not isinstance(ival, MonoTime):
+                raise TypeError('ival is not MonoTime')
+            self.etime = ival
+        else:
+            self.ival = ival
+            if self.randomize_runs != None:
+                ival = self.randomize_runs(ival)
+            now = self.ed.last_ts
+            if self.etime == None:
+                self.etime = now.getOffsetCopy(ival)
+            else:
+                self.etime.monot = now.monot + ival
+                self.etime.realt = now.realt + ival
+        self.ed.timers.update(self)
+
+    def restart(self):
+        # Re-arm the timer with the same interval, absolute timer is
+        # re-armed at the same time it has been set to fire at
+        if self.ed == None:
+            raise StdException('EventListener: timer has been cancelled or has fired ' \
+              'with no rearm set')
+        if self.abs_time:
+            self.ed.timers.update(self)
+        else:
+            self.reschedule(self.ival)
+
 class Singleton(object):
     '''Use to create a singleton'''
     __state_lock = Lock()
@@ -116,18 +172,26 @@ class Singleton(object):
         pass
 
 class EventDispatcher2(Singleton):
-    tlisteners = None
+    timers = None
     slisteners = None
     endloop = False
     signals_pending = None
-    twasted = 0
-    tcbs_lock = None
+    mailbox = None
+    mb_wakeup = False
+    cft_batches = 0
+    cft_dispatched = 0
+    cft_maxbatch = 0
+    cft_draintime = 0.0
+    cft_maxdrain = 0.0
     last_ts = None
     my_ident = None
     state_lock = Lock()
     ed_inum = 0
     elp = None
     bands = None
+    # Whether sockets can be polled by the loop itself, see the regReader()
+    # and the regWriter()
+    selector_io = False
 
     def __init__(self, freq = 100.0):
         EventDispatcher2.state_lock.acquire()
@@ -136,12 +200,15 @@ class EventDispatcher2(Singleton):
             raise StdException('BZZZT, EventDispatcher2 has to be singleton!')
         EventDispatcher2.ed_inum = 1
         EventDispatcher2.state_lock.release()
-        self.tcbs_lock = Lock()
-        self.tlisteners = []
+        self.mailbox = deque()
+        self.timers = TimerHeap()
         self.slisteners = []
         self.signals_pending = []
         self.last_ts = MonoTime()
         self.my_ident = get_ident()
+        self.initLoop(freq)
+
+    def initLoop(self, freq):
         self.elp = ElPeriodic(freq)
         self.elp.CFT_enable(signal.SIGURG)
         self.bands = [(freq, 0),]
@@ -165,17 +232,20 @@ class EventDispatcher2(Singleton):
         el.ed = self
         return el
 
+    def setTimerQueue(self, timers):
+        # Switch to another timer queue implementation, see
+        # sippy.Core.TimerQueue, moving all active timers over
+        for el in self.timers.listeners():
+            self.timers.remove(el)
+            timers.insert(el)
+        self.timers = timers
+
     def dispatchTimers(self):
-        while len(self.tlisteners) != 0:
-            el = self.tlisteners[0]
-            if el.cb_func != None and el.etime > self.last_ts:
+        while True:
+            el = self.timers.getExpired(self.last_ts)
+            if el == None:
                 # We've finished
                 return
-            el = heappop(self.tlisteners)
-            if el.cb_func == None:
-                # Skip any already removed timers
-                self.twasted -= 1
-                continue
             if el.nticks == -1 or el.nticks > 1:
                 # Re-schedule periodic timer
                 if el.nticks > 1:
@@ -185,10 +255,12 @@ class EventDispatcher2(Singleton):
                 else:
                     ival = el.ival
                 el.etime.offset(ival)
-                heappush(self.tlisteners, el)
+                self.timers.insert(el)
                 cleanup = False
             else:
-                cleanup = True
+                # One-shot timer is only kept for the reschedule() or
+                # restart() if the rearm is set
+                cleanup = not el.rearm
             try:
                 if not el.cb_with_ts:
                     el.cb_func(*el.cb_params)
@@ -198,15 +270,15 @@ class EventDispatcher2(Singleton):
                 if isinstance(ex, SystemExit):
                     raise
                 dump_exception('EventDispatcher2: unhandled exception when processing timeout event')
-            if self.endloop:
-                return
             if cleanup:
                 el.cleanup()
+            if self.endloop:
+                return
 
     def regSignal(self, signum, signal_cb, *cb_params, **cb_kw_args):
         sl = EventListener()
         if len([x for x in self.slisteners if x.signum == signum]) == 0:
-            signal.signal(signum, self.signal)
+            self.installSignal(signum)
         sl.signum = signum
         sl.cb_func = signal_cb
         sl.cb_params = cb_params
@@ -217,9 +289,15 @@ class EventDispatcher2(Singleton):
     def unregSignal(self, sl):
         self.slisteners.remove(sl)
         if len([x for x in self.slisteners if x.signum == sl.signum]) == 0:
-            signal.signal(sl.signum, signal.SIG_DFL)
+            self.uninstallSignal(sl.signum)
         sl.cleanup()
 
+    def installSignal(self, signum):
+        signal.signal(signum, self.signal)
+
+    def uninstallSignal(self, signum):
+        signal.signal(signum, signal.SIG_DFL)
+
     def dispatchSignals(self):
         while len(self.signals_pending) > 0:
             signum = self.signals_pending.pop(0)
@@ -235,18 +313,64 @@ class EventDispatcher2(Singleton):
                 if self.endloop:
                     return
 
-    def dispatchThreadCallback(self, thread_cb, cb_params):
-        try:
-            thread_cb(*cb_params)
-        except Exception as ex:
-            if isinstance(ex, SystemExit):
-                raise
-            dump_exception('EventDispatcher2: unhandled exception when processing from-thread-call')
-        #print('dispatchThreadCallback dispatched', thread_cb, cb_params)
+    def drainMailbox(self):
+        # Clear the flag first, so that anything that is posted after
+        # the snapshot below wakes us up again
+        self.mb_wakeup = False
+        nitems = len(self.mailbox)
+        if nitems == 0:
+            return
+        stime = clock_getdtime(CLOCK_MONOTONIC)
+        for i in range(0, nitems):
+            thread_cb, cb_params = self.mailbox.popleft()
+            try:
+                thread_cb(*cb_params)
+            except Exception as ex:
+                if isinstance(ex, SystemExit):
+                    raise
+                dump_exception('EventDispatcher2: unhandled exception when processing from-thread-call')
+        draintime = clock_getdtime(CLOCK_MONOTONIC) - stime
+        self.cft_batches += 1
+        self.cft_dispatched += nitems
+        self.cft_draintime += draintime
+        if nitems > self.cft_maxbatch:
+            self.cft_maxbatch = nitems
+        if draintime > self.cft_maxdrain:
+            self.cft_maxdrain = draintime
 
     def callFromThread(self, thread_cb, *cb_params):
-        self.elp.call_from_thread(self.dispatchThreadCallback, thread_cb, cb_params)
-        #print('EventDispatcher2.callFromThread completed', str(self), thread_cb, cb_params)
+        # deque.append() is atomic, so no locking is needed here. The
+        # main loop is only woken up once for the whole batch of calls
+        # that pile up until it gets to drain the mailbox.
+        self.mailbox.append((thread_cb, cb_params))
+        if not self.mb_wakeup:
+            self.mb_wakeup = True
+            self.wakeup()
+
+    def wakeup(self):
+        self.elp.call_from_thread(self.drainMailbox)
+
+    @property
+    def cft_pending(self):
+        return len(self.mailbox)
+
+    def resetCftStats(self):
+        self.cft_batches = 0
+        self.cft_dispatched = 0
+        self.cft_maxbatch = len(self.mailbox)
+        self.cft_draintime = 0.0
+        self.cft_maxdrain = 0.0
+
+    def getCftStats(self):
+        if self.cft_batches > 0:
+            avgbatch = float(self.cft_dispatched) / self.cft_batches
+            avgdrain = self.cft_draintime / self.cft_batches
+        else:
+            avgbatch = avgdrain = 0.0
+        return 'calls from threads: pending %d, dispatched %d in %d batches, batch size ' \
+          'avg %.1f max %d, drain time avg %.3f ms max %.3f ms' % (len(self.mailbox), \
+          self.cft_dispatched, self.cft_batches, avgbatch, self.cft_maxbatch, \
+          avgdrain * 1000.0, self.cft_maxdrain * 1000.0)
 
     def loop(self, timeout = None, freq = None):
         if freq != None and self.bands[0][0] != freq:
@@ -272,11 +396,6 @@ class EventDispatcher2(Singleton):
             self.dispatchTimers()
             if self.endloop:
                 return
-            if self.twasted * 2 > len(self.tlisteners):
-                # Clean-up removed timers when their share becomes more than 50%
-                self.tlisteners = [x for x in self.tlisteners if x.cb_func != None]
-                heapify(self.tlisteners)
-                self.twasted = 0
             if (timeout != None and self.last_ts > etime) or self.endloop:
                 self.endloop = False
                 break
@@ -290,4 +409,134 @@ class EventDispatcher2(Singleton):
         #import sys
         #traceback.print_stack(file = sys.stdout)
 
-ED2 = EventDispatcher2()
+class EventDispatcher2Asyncio(EventDispatcher2):
+    '''
+    EventDispatcher2 running on top of the asyncio event loop (or uvloop
+    if it's installed) instead of the fixed-frequency ElPeriodic. There
+    is no polling: timers are dispatched from a single loop timer armed
+    for the nearest expiration time, while calls from other threads and
+    signals wake the loop up through the selector right away. Sockets
+    can be polled by the same selector via the regReader() and the
+    regWriter(), the loop itself is available as the aloop for the code
+    that needs more than that.
+    '''
+    aloop = None
+    thandle = None
+    tnext = None
+    sigwakeup = None
+    selector_io = True
+
+    def initLoop(self, freq):
+        import asyncio
+
+        try:
+            import uvloop
+        except ImportError:
+            self.aloop = asyncio.new_event_loop()
+        else:
+            self.aloop = uvloop.new_event_loop()
+        # Python signal handlers are only run by the main thread, which
+        # could be sitting in the select() while the signal is delivered
+        # to some other thread. Have the signal wakeup fd polled by the
+        # loop, so that the select() returns and the handlers (see the
+        # signal() below and sippy.Signal) get to run right away.
+        self.sigwakeup = socket.socketpair()
+        for skt in self.sigwakeup:
+            skt.setblocking(False)
+        self.aloop.add_reader(self.sigwakeup[0].fileno(), self.drainSigwakeup)
+        signal.set_wakeup_fd(self.sigwakeup[1].fileno(), warn_on_full_buffer = False)
+
+    def drainSigwakeup(self):
+        try:
+            while self.sigwakeup[0].recv(4096):
+                pass
+        except (OSError, IOError):
+            pass
+
+    def signal(self, signum, frame):
+        self.signals_pending.append(signum)
+        self.aloop.call_soon_threadsafe(self.signalEvent)
+
+    def armTimer(self):
+        tnext = self.timers.nextExpiry()
+        if tnext == None:
+            if self.thandle != None:
+                self.thandle.cancel()
+                self.thandle = None
+            return
+        if self.thandle != None:
+            if self.tnext <= tnext:
+                return
+            self.thandle.cancel()
+        self.tnext = tnext
+        delay = max(tnext - clock_getdtime(CLOCK_MONOTONIC), 0.0)
+        self.thandle = self.aloop.call_later(delay, self.timerEvent)
+
+    def timerEvent(self):
+        self.thandle = None
+        self.last_ts = MonoTime()
+        self.dispatchTimers()
+        self.armTimer()
+
+    def signalEvent(self):
+        self.last_ts = MonoTime()
+        self.dispatchSignals()
+        self.armTimer()
+
+    def regReader(self, fileobj, reader_cb, *cb_params):
+        # Have the reader_cb called from the loop whenever the fileobj
+        # is readable
+        self.aloop.add_reader(fileobj, self.ioEvent, reader_cb, cb_params)
+
+    def unregReader(self, fileobj):
+        self.aloop.remove_reader(fileobj)
+
+    def regWriter(self, fileobj, writer_cb, *cb_params):
+        # Same for the fileobj being writable
+        self.aloop.add_writer(fileobj, self.ioEvent, writer_cb, cb_params)
+
+    def unregWriter(self, fileobj):
+        self.aloop.remove_writer(fileobj)
+
+    def ioEvent(self, io_cb, cb_params):
+        self.last_ts = MonoTime()
+        try:
+            io_cb(*cb_params)
+        except Exception as ex:
+            if isinstance(ex, SystemExit):
+                raise
+            dump_exception('EventDispatcher2: unhandled exception when processing I/O event')
+        self.armTimer()
+
+    def drainMailbox(self):
+        self.last_ts = MonoTime()
+        EventDispatcher2.drainMailbox(self)
+        self.armTimer()
+
+    def wakeup(self):
+        self.aloop.call_soon_threadsafe(self.drainMailbox)
+
+    def loop(self, timeout = None, freq = None):
+        # There is no polling frequency, freq is only accepted for the
+        # compatibility
+        self.endloop = False
+        if timeout != None:
+            thandle = self.aloop.call_later(timeout, self.aloop.stop)
+        # Timers registered while the loop was not running
+        if self.thandle != None:
+            self.thandle.cancel()
+            self.thandle = None
+        self.aloop.call_soon(self.timerEvent)
+        self.aloop.run_forever()
+        if timeout != None:
+            thandle.cancel()
+
+    def breakLoop(self):
+        self.endloop = True
+        if self.aloop.is_running():
+            self.aloop.stop()
+
+if os.environ.get('SIPPY_ED2_BACKEND', 'elperiodic').lower() == 'asyncio':
+    ED2 = EventDispatcher2Asyncio()
+else:
+    ED2 = EventDispatcher2()
@@ -0,0 +1,152 @@
+# Copyright (c) 2006-2014 Sippy Software, Inc. All rights reserved.
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from collections import deque
+
+from sippy.Core.EventDispatcher import ED2
+from sippy.Core.Exceptions import dump_exception
+from sippy.Time.clock_dtime import clock_getdtime, CLOCK_MONOTONIC
+
+class PriorityLanes(object):
+    '''
+    Drop-in replacement for the ED2.callFromThread() that lets caller
+    put each call into one of the several lanes. The main loop drains
+    lanes in the weighted round-robin order: each round takes up to
+    weights[i] calls from the lane i, lower numbered lanes go first. No
+    more than max_batch calls are dispatched in one go, the rest waits
+    until timers and other events have been processed.
+
+    Same as with the ED2 mailbox, producers only append to the lane
+    and the main loop is woken up once per batch.
+    '''
+    weights = None
+    lanes = None
+    scheduled = False
+    max_batch = None
+    dispatched = None
+    maxdepth = None
+    nbatches = 0
+    maxbatch = 0
+    draintime = 0.0
+    maxdrain = 0.0
+
+    def __init__(self, weights, max_batch = 256):
+        self.weights = tuple(weights)
+        self.lanes = tuple([deque() for x in weights])
+        self.max_batch = max_batch
+        self.dispatched = [0 for x in weights]
+        self.maxdepth = [0 for x in weights]
+
+    def callFromThread(self, lane, thread_cb, *cb_params):
+        q = self.lanes[lane]
+        q.append((thread_cb, cb_params))
+        if len(q) > self.maxdepth[lane]:
+            self.maxdepth[lane] = len(q)
+        if not self.scheduled:
+            self.scheduled = True
+            ED2.callFromThread(self.dispatch)
+
+    def dispatch(self):
+        # Clear the flag first, so that anything that is posted while
+        # we are busy here schedules another run
+        self.scheduled = False
+        stime = clock_getdtime(CLOCK_MONOTONIC)
+        nleft = self.max_batch
+        while nleft > 0:
+            batch = []
+            for lane in range(len(self.lanes)):
+                q = self.lanes[lane]
+                n = min(self.weights[lane], len(q), nleft)
+                batch.extend([q.popleft() for i in range(n)])
+                self.dispatched[lane] += n
+                nleft -= n
+                if nleft == 0:
+                    break
+            if len(batch) == 0:
+                break
+            for thread_cb, cb_params in batch:
+                try:
+                    thread_cb(*cb_params)
+                except Exception as ex:
+                    if isinstance(ex, SystemExit):
+                        raise
+                    dump_exception('PriorityLanes: unhandled exception when processing from-thread-call')
+        ndispatched = self.max_batch - nleft
+        if ndispatched > 0:
+            draintime = clock_getdtime(CLOCK_MONOTONIC) - stime
+            self.nbatches += 1
+            self.draintime += draintime
+            if ndispatched > self.maxbatch:
+                self.maxbatch = ndispatched
+            if draintime > self.maxdrain:
+                self.maxdrain = draintime
+        if nleft == 0 and not self.scheduled and len(self) > 0:
+            self.scheduled = True
+            ED2.callFromThread(self.dispatch)
+
+    def __len__(self):
+        return sum([len(x) for x in self.lanes])
+
+    def resetStats(self):
+        self.dispatched = [0 for x in self.weights]
+        self.maxdepth = [len(x) for x in self.lanes]
+        self.nbatches = 0
+        self.maxbatch = 0
+        self.draintime = 0.0
+        self.maxdrain = 0.0
+
+    def __str__(self):
+        if self.nbatches > 0:
+            avgbatch = float(sum(self.dispatched)) / self.nbatches
+            avgdrain = self.draintime / self.nbatches
+        else:
+            avgbatch = avgdrain = 0.0
+        return 'priority lanes: ' + ', '.join(['lane %d: weight %d, depth %d/%d, dispatched %d' % \
+          (i, self.weights[i], len(self.lanes[i]), self.maxdepth[i], self.dispatched[i]) \
+          for i in range(len(self.weights))]) + '; %d batches, batch size avg %.1f max %d, ' \
+          'drain time avg %.3f ms max %.3f ms' % (self.nbatches, avgbatch, self.maxbatch, \
+          avgdrain * 1000.0, self.maxdrain * 1000.0)
+
+if __name__ == '__main__':
+    from threading import Thread
+
+    got = []
+    pl = PriorityLanes((2, 1), max_batch = 4)
+    def producer():
+        for i in range(4):
+            pl.callFromThread(1, got.append, 'b%d' % i)
+        for i in range(4):
+            pl.callFromThread(0, got.append, 'a%d' % i)
+        pl.callFromThread(1, ED2.breakLoop)
+    t = Thread(target = producer)
+    t.start()
+    t.join()
+    ED2.loop()
+    # First batch of 4 ends in the middle of the second (2, 1) round
+    assert got == ['a0', 'a1', 'b0', 'a2', 'a3', 'b1', 'b2', 'b3'], got
+    assert pl.dispatched == [4, 5] and len(pl) == 0 and not pl.scheduled
+    assert pl.maxbatch <= pl.max_batch, pl.maxbatch
+    print(pl)
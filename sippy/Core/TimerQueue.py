@@ -0,0 +1,324 @@
+# Copyright (c) 2006-2018 Sippy Software, Inc. All rights reserved.
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from heapq import heappush, heappop
+
+from sippy.Time.MonoTime import MonoTime
+
+# Timer queues used by the EventDispatcher2. Each one holds the
+# EventListener objects ordered by their etime and provides:
+#
+#  insert(el)        - schedule the el at el.etime
+#  remove(el)        - el has been cancelled
+#  update(el)        - el.etime has changed, move the el or insert it
+#                      if it's not in the queue
+#  getExpired(now)   - pop the next active el with etime <= now, or None
+#  nextExpiry()      - monotonic time the getExpired() should be called
+#                      at next, or None if the queue is empty
+#  listeners()       - list of the active listeners
+#  len()             - number of the active listeners
+
+class TimerHeap(object):
+    '''
+    Binary heap of the timers. Every listener keeps its current position
+    in the heap in the tindex, so that cancelled timers are taken out
+    right away in O(log n) and the heap only holds the active ones.
+    '''
+    tlisteners = None
+
+    def __init__(self):
+        self.tlisteners = []
+
+    def insert(self, el):
+        el.tindex = len(self.tlisteners)
+        self.tlisteners.append(el)
+        self.__siftup(el.tindex)
+
+    def remove(self, el):
+        i = el.tindex
+        if i == None:
+            return
+        el.tindex = None
+        last = self.tlisteners.pop()
+        if last is el:
+            return
+        self.tlisteners[i] = last
+        last.tindex = i
+        self.__siftdown(i)
+        self.__siftup(last.tindex)
+
+    def update(self, el):
+        if el.tindex == None:
+            self.insert(el)
+            return
+        self.__siftdown(el.tindex)
+        self.__siftup(el.tindex)
+
+    def getExpired(self, now):
+        if len(self.tlisteners) == 0:
+            return None
+        el = self.tlisteners[0]
+        if el.etime.monot > now.monot:
+            return None
+        self.remove(el)
+        return el
+
+    def nextExpiry(self):
+        if len(self.tlisteners) == 0:
+            return None
+        return self.tlisteners[0].etime.monot
+
+    def __siftup(self, i):
+        # Move the element towards the root until its parent is earlier
+        heap = self.tlisteners
+        el = heap[i]
+        etime = el.etime.monot
+        while i > 0:
+            pi = (i - 1) >> 1
+            parent = heap[pi]
+            if parent.etime.monot <= etime:
+                break
+            heap[i] = parent
+            parent.tindex = i
+            i = pi
+        heap[i] = el
+        el.tindex = i
+
+    def __siftdown(self, i):
+        # Move the element towards the leaves until both children are later
+        heap = self.tlisteners
+        n = len(heap)
+        el = heap[i]
+        etime = el.etime.monot
+        while True:
+            ci = 2 * i + 1
+            if ci >= n:
+                break
+            child = heap[ci]
+            if ci + 1 < n and heap[ci + 1].etime.monot < child.etime.monot:
+                ci += 1
+                child = heap[ci]
+            if child.etime.monot >= etime:
+                break
+            heap[i] = child
+            child.tindex = i
+            i = ci
+        heap[i] = el
+        el.tindex = i
+
+    def listeners(self):
+        return list(self.tlisteners)
+
+    def __len__(self):
+        return len(self.tlisteners)
+
+class TimerWheel(object):
+    '''
+    Hierarchical timer wheel with O(1) insert and cancel. Expiration
+    times are rounded up to the tick, so that timers never fire early,
+    but may fire up to one tick late. Level 0 has 256 slots of one tick
+    each, every next level has 64 slots each spanning the whole previous
+    level. Slots are kept in dicts keyed by the absolute slot number,
+    so that the last level never overflows. When the wheel turns past
+    a slot of the upper level its timers are cascaded down.
+    '''
+    tick = None
+    curtick = None
+    levels = None
+    grans = None
+    nslots = None
+    due = None
+    nactive = 0
+    ncascaded = 0
+
+    def __init__(self, tick = 0.01, now = None, nlevels = 5):
+        self.tick = tick
+        self.levels = [{} for i in range(0, nlevels)]
+        self.grans = [1,]
+        self.grans.extend([256 * (64 ** i) for i in range(0, nlevels - 1)])
+        self.nslots = [256,]
+        self.nslots.extend([64,] * (nlevels - 1))
+        self.due = []
+        if now == None:
+            now = MonoTime()
+        self.curtick = self.getTick(now)
+
+    def getTick(self, mtime):
+        return int(mtime.monot / self.tick)
+
+    def insert(self, el):
+        # ceil(), so that once the wheel gets to the etick the timer is
+        # already due
+        etick = -int(-el.etime.monot // self.tick)
+        self.nactive += 1
+        self.__place(el, etick)
+
+    def __place(self, el, etick):
+        if etick <= self.curtick:
+            el.tbucket = self.due
+            heappush(self.due, el)
+            return
+        for level, gran, nslots in zip(self.levels, self.grans, self.nslots):
+            slot = etick // gran
+            if slot - self.curtick // gran < nslots:
+                break
+        bucket = level.get(slot, None)
+        if bucket == None:
+            bucket = level[slot] = set()
+        bucket.add(el)
+        el.tbucket = bucket
+
+    def remove(self, el):
+        bucket = el.tbucket
+        if bucket == None:
+            return
+        if bucket is not self.due:
+            bucket.discard(el)
+        el.tbucket = None
+        self.nactive -= 1
+
+    def update(self, el):
+        self.remove(el)
+        self.insert(el)
+
+    def advance(self, now):
+        ntick = self.getTick(now)
+        while self.curtick < ntick:
+            for i in range(0, len(self.levels)):
+                if len(self.levels[i]) > 0:
+                    break
+            else:
+                # Nothing in the wheel, no need to turn it
+                self.curtick = ntick
+                return
+            if i > 0:
+                # Skip right to the next slot of the lowest non-empty level
+                gran = self.grans[i]
+                self.curtick = min((self.curtick // gran + 1) * gran, ntick)
+            else:
+                self.curtick += 1
+            tick = self.curtick
+            for i in range(len(self.levels) - 1, -1, -1):
+                gran = self.grans[i]
+                if tick % gran != 0:
+                    continue
+                bucket = self.levels[i].pop(tick // gran, None)
+                if bucket == None:
+                    continue
+                for el in bucket:
+                    if i > 0:
+                        self.ncascaded += 1
+                    self.__place(el, -int(-el.etime.monot // self.tick))
+
+    def getExpired(self, now):
+        while True:
+            if len(self.due) == 0:
+                self.advance(now)
+                if len(self.due) == 0:
+                    return None
+            el = heappop(self.due)
+            if el.tbucket is not self.due:
+                # Cancelled while waiting in the due queue
+                continue
+            el.tbucket = None
+            self.nactive -= 1
+            return el
+
+    def nextExpiry(self):
+        if len(self.due) > 0:
+            return self.curtick * self.tick
+        # Time when the wheel gets to the nearest non-empty slot
+        for level, gran in zip(self.levels, self.grans):
+            if len(level) > 0:
+                return min(level.keys()) * gran * self.tick
+        return None
+
+    def listeners(self):
+        rval = [x for x in self.due if x.tbucket is self.due]
+        for level in self.levels:
+            for bucket in level.values():
+                rval.extend(bucket)
+        return rval
+
+    def __len__(self):
+        return self.nactive
+
+if __name__ == '__main__':
+    class Listener(object):
+        def __init__(self, etime):
+            self.etime = etime
+            self.cb_func = True
+            self.tbucket = None
+            self.tindex = None
+
+        def __lt__(self, other):
+            return self.etime < other.etime
+
+    base = MonoTime(monot = 1000.0)
+    offsets = (0.0, 0.005, 0.011, 1.0, 2.55, 2.56, 3.0, 170.0, 700.0, 50000.0, 2.0 ** 25)
+    for tq in (TimerHeap(), TimerWheel(0.01, base)):
+        els = [Listener(base.getOffsetCopy(x)) for x in offsets]
+        for el in reversed(els):
+            tq.insert(el)
+        cancelled = els.pop(3)
+        tq.remove(cancelled)
+        cancelled.cb_func = None
+        assert len(tq) == len(els) and len(tq.listeners()) == len(els)
+        fired = []
+        for ival in (0.0, 0.01, 0.02, 2.549, 2.56, 100.0, 1000.0, 100000.0, 2.0 ** 26):
+            now = base.getOffsetCopy(ival)
+            while True:
+                el = tq.getExpired(now)
+                if el == None:
+                    break
+                assert el.etime <= now
+                fired.append(el)
+        assert fired == els and len(tq) == 0
+    assert tq.ncascaded > 0
+    tq = TimerHeap()
+    els = [Listener(base.getOffsetCopy(x)) for x in range(0, 100)]
+    for el in els:
+        tq.insert(el)
+    for el in els[::3]:
+        tq.remove(el)
+        tq.remove(el)
+    assert len(tq) == 66 and all([x.tindex == i for i, x in enumerate(tq.tlisteners)])
+    fired = []
+    while len(tq) > 0:
+        fired.append(tq.getExpired(base.getOffsetCopy(1000.0)))
+    assert fired == [x for x in els if x not in els[::3]]
+    for tq in (TimerHeap(), TimerWheel(0.01, base)):
+        els = [Listener(base.getOffsetCopy(x)) for x in (1.0, 2.0, 3.0)]
+        for el in els:
+            tq.insert(el)
+        els[2].etime = base.getOffsetCopy(0.5)
+        tq.update(els[2])
+        els[0].etime = base.getOffsetCopy(4.0)
+        tq.update(els[0])
+        fired = [tq.getExpired(base.getOffsetCopy(10.0)) for x in els]
+        assert fired == [els[2], els[1], els[0]] and len(tq) == 0
+        tq.update(els[1])
+        assert len(tq) == 1 and tq.getExpired(base.getOffsetCopy(10.0)) is els[1]
+    print('passed')
@@ -98,6 +98,50 @@ SUPPORTED_OPTIONS = { \
                              'and "SUBSCRIBE" messages. Address in the format ' \
                              '"host[:port]"'),
  'nat_traversal':     ('B', 'enable NAT traversal for signalling'), \
+ 'sip_tcp':           ('B', 'accept SIP over TCP too and use TCP for the outgoing ' \
+                             'requests that are too large for UDP'), \
+ 'sip_priority_lanes': ('B', 'dispatch received SIP messages in the weighted ' \
+                             'priority lanes, so that responses and in-dialog ' \
+                             'requests are processed ahead of new calls when ' \
+                             'overloaded'), \
+ 'pktinfo':           ('B', 'when listening on all addresses, use IP_PKTINFO to ' \
+                             'reply from the address a request has been received ' \
+                             'at instead of opening per-address sockets'), \
+ 'parse_cache_size':  ('I', 'maximum number of entries in each of the SIP URI ' \
+                             'and SIP address parse caches (0 to disable)'), \
+ 'rcache_size':       ('I', 'maximum number of entries in the SIP retransmission ' \
+                             'cache'), \
+ 'rcache_bytes':      ('I', 'maximum total size in bytes of the responses kept in ' \
+                             'the SIP retransmission cache'), \
+ 'stateless_methods': ('S', 'out-of-dialog requests to be answered with 200 OK ' \
+                             'right away without creating any transaction state, ' \
+                             'i.e. OPTIONS keepalives (comma-separated list)'), \
+ 'stateless_rate':    ('I', 'maximum rate of the stateless responses sent to a ' \
+                             'single IP address, per second (0 for no limit)'), \
+ 'overload_max_lag':  ('I', 'reject new calls with 503 while the event loop lag ' \
+                             'is over that many milliseconds (0 for no limit)'), \
+ 'overload_max_cft':  ('I', 'reject new calls with 503 while there are more than ' \
+                             'that many calls from other threads waiting to be ' \
+                             'dispatched (0 for no limit)'), \
+ 'overload_max_timers': ('I', 'reject new calls with 503 while there are more ' \
+                             'than that many active timers (0 for no limit)'), \
+ 'overload_max_transactions': ('I', 'reject new calls with 503 while there are ' \
+                             'more than that many SIP transactions in progress (0 ' \
+                             'for no limit)'), \
+ 'overload_retry_after': ('I', 'value of the Retry-After in the 503 responses sent ' \
+                             'when overloaded, in seconds'), \
+ 'max_client_transactions': ('I', 'maximum number of SIP client transactions, ' \
+                             'new outgoing requests fail locally with 503 once ' \
+                             'reached (0 for no limit)'), \
+ 'max_server_transactions': ('I', 'maximum number of SIP server transactions, ' \
+                             'new incoming requests are rejected with 503 once ' \
+                             'reached (0 for no limit)'), \
+ 'max_dialogs':       ('I', 'maximum number of Call-IDs with dialogs registered ' \
+                             'in the SIP transaction manager, new incoming calls ' \
+                             'are rejected with 503 once reached (0 for no limit)'), \
+ 'timer_wheel_tick':  ('I', 'keep timers in the hierarchical timer wheel with that ' \
+                             'tick in milliseconds instead of the binary heap (0 ' \
+                             'to use the heap)'), \
  'xmpp_b2bua_id':     ('I', 'ID passed to the XMPP socket server')}
 
 class MyConfigParser(RawConfigParser):
@@ -192,6 +236,22 @@ class MyConfigParser(RawConfigParser):
         elif key == 'max_credit_time':
             if _value <= 0:
                 raise ValueError('max_credit_time should be more than zero')
+        elif key == 'parse_cache_size':
+            if _value < 0:
+                raise ValueError('parse_cache_size should be non-negative')
+        elif key in ('rcache_size', 'rcache_bytes'):
+            if _value <= 0:
+                raise ValueError('%s should be more than zero' % key)
+        elif key in ('stateless_rate', 'overload_max_lag', 'overload_max_cft', \
+          'overload_max_timers', 'overload_max_transactions', 'max_client_transactions', \
+          'max_server_transactions', 'max_dialogs', 'timer_wheel_tick'):
+            if _value < 0:
+                raise ValueError('%s should be non-negative' % key)
+        elif key == 'overload_retry_after':
+            if _value <= 0:
+                raise ValueError('overload_retry_after should be more than zero')
+        elif key == 'stateless_methods':
+            self['_' + key] = [x.strip().upper() for x in value.split(',')]
         elif key == 'allowed_pts':
             self['_allowed_pts'] = [int(x) for x in value.split(',')]
         elif key in ('accept_ips', 'rtp_proxy_clients'):
@@ -244,6 +304,8 @@ if __name__ == '__main__':
     assert m['pass_headers'] == 'a,b'
     assert m['_pass_headers'][0] == 'a'
     assert m['_pass_headers'][1] == 'b'
+    m.check_and_set('stateless_methods', 'options, NOTIFY')
+    assert m['_stateless_methods'] == ['OPTIONS', 'NOTIFY']
     m.check_and_set('accept_ips', '1.2.3.4, 5.6.7.8')
     assert m['accept_ips'] == '1.2.3.4, 5.6.7.8'
     assert m['_accept_ips'][0] == '1.2.3.4'
@@ -0,0 +1,193 @@
+# Copyright (c) 2006-2014 Sippy Software, Inc. All rights reserved.
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from datetime import datetime
+import sys
+
+from sippy.Core.EventDispatcher import ED2
+from sippy.Time.Timeout import Timeout
+from sippy.SipHeader import SipHeader
+
+class OverloadControl(object):
+    '''
+    Admission control for the new calls. The state of the event loop
+    is probed periodically: how late the probe timer fires (loop lag
+    in milliseconds, smoothed), number of the callFromThread() items
+    waiting to be dispatched (including ones in the TM's priority
+    lanes), number of the active timers and SIP transactions. Once any
+    of them goes above its limit the controller switches into the
+    overloaded state and stays there until all of them drop below the
+    recover_ratio of their limits. While overloaded, new calls are to
+    be rejected with the reject() response. Limits set to 0 are not
+    checked, with all of them set to 0 there is no probing at all.
+    '''
+    params = ('max_lag', 'max_cft', 'max_timers', 'max_transactions', 'retry_after')
+    probed = ('lag', 'cft', 'timers', 'transactions')
+    max_lag = 0.0
+    max_cft = 0
+    max_timers = 0
+    max_transactions = 0
+    retry_after = 5
+    recover_ratio = 0.8
+    probe_ival = None
+    tm = None
+    lag = 0.0
+    cft = 0
+    timers = 0
+    transactions = 0
+    overloaded = False
+    reasons = None
+    noverloads = 0
+    admitted = 0
+    rejected = 0
+    el = None
+
+    def __init__(self, tm, probe_ival = 0.1):
+        self.tm = tm
+        self.probe_ival = probe_ival
+        self.reasons = ()
+
+    def probe(self):
+        # The timer is due at the el.etime, while the last_ts is the
+        # time the current loop iteration has started at
+        lag = max(ED2.last_ts - self.el.etime, 0.0) * 1000.0
+        self.lag = self.lag * 0.75 + lag * 0.25
+        self.cft = ED2.cft_pending
+        if self.tm.lanes != None:
+            self.cft += len(self.tm.lanes)
+        self.timers = len(ED2.timers)
+        self.transactions = len(self.tm.tclient) + len(self.tm.tserver)
+        self.update()
+        self.el.reschedule(self.probe_ival)
+
+    def update(self):
+        if len([x for x in self.probed if getattr(self, 'max_' + x) > 0]) == 0:
+            # Nothing to check
+            if self.el != None:
+                self.el.cancel()
+                self.el = None
+            self.lag = 0.0
+            self.cft = self.timers = self.transactions = 0
+        elif self.el == None:
+            self.el = Timeout(self.probe, self.probe_ival)
+            self.el.rearm = True
+        if self.overloaded:
+            ratio = self.recover_ratio
+        else:
+            ratio = 1.0
+        reasons = []
+        for name in self.probed:
+            limit = getattr(self, 'max_' + name)
+            if limit > 0 and getattr(self, name) > limit * ratio:
+                reasons.append(name)
+        overloaded = len(reasons) > 0
+        if overloaded != self.overloaded:
+            if overloaded:
+                self.noverloads += 1
+                print(datetime.now(), 'OverloadControl: overloaded (%s), rejecting new calls' % \
+                  ', '.join(reasons))
+            else:
+                print(datetime.now(), 'OverloadControl: recovered, %d calls have been rejected' % \
+                  self.rejected)
+            sys.stdout.flush()
+        self.overloaded = overloaded
+        self.reasons = tuple(reasons)
+
+    def admit(self):
+        if self.overloaded:
+            self.rejected += 1
+            return False
+        self.admitted += 1
+        return True
+
+    def reject(self, req):
+        resp = req.genResponse(503, 'Service Unavailable')
+        resp.appendHeader(SipHeader(name = 'retry-after', bodys = str(self.retry_after)))
+        return resp
+
+    def set(self, name, value):
+        if not name in self.params:
+            raise KeyError('unknown parameter: %s' % name)
+        if name == 'max_lag':
+            value = float(value)
+        else:
+            value = int(value)
+        if value < 0 or (name == 'retry_after' and value == 0):
+            raise ValueError('%s is out of range' % name)
+        setattr(self, name, value)
+        self.update()
+
+    def resetStats(self):
+        self.noverloads = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def __str__(self):
+        if self.overloaded:
+            state = 'overloaded (%s)' % ', '.join(self.reasons)
+        else:
+            state = 'normal'
+        return 'overload control: %s\n' \
+          '  lag %.1f/%.1f ms, cft %d/%d, timers %d/%d, transactions %d/%d\n' \
+          '  retry_after %d, admitted %d, rejected %d, overloads %d' % (state, \
+          self.lag, self.max_lag, self.cft, self.max_cft, self.timers, self.max_timers, \
+          self.transactions, self.max_transactions, self.retry_after, self.admitted, \
+          self.rejected, self.noverloads)
+
+if __name__ == '__main__':
+    from time import sleep
+    from sippy.Time.Timeout import Timeout
+
+    class FakeTM(object):
+        tclient = {}
+        tserver = {}
+        lanes = None
+
+    oc = OverloadControl(FakeTM(), probe_ival = 0.01)
+    assert oc.el == None
+    oc.set('max_lag', '50')
+    el = oc.el
+    def busy():
+        # Block the loop for a while, so that the probe is late
+        sleep(0.5)
+    def done():
+        # Has gone into overload and recovered since then
+        assert oc.noverloads == 1 and not oc.overloaded and oc.admit()
+        oc.set('max_transactions', 1)
+        FakeTM.tserver[1] = FakeTM.tclient[1] = None
+        oc.transactions = 2
+        oc.update()
+        assert oc.reasons == ('transactions',) and not oc.admit()
+        print(oc)
+        # The same listener all along, gone once there are no limits
+        assert oc.el is el
+        oc.set('max_lag', '0')
+        oc.set('max_transactions', '0')
+        assert oc.el == None and el.cb_func == None and not oc.overloaded
+        ED2.breakLoop()
+    Timeout(busy, 0.1)
+    Timeout(done, 1.0)
+    ED2.loop()
@@ -0,0 +1,86 @@
+# Copyright (c) 2006-2014 Sippy Software, Inc. All rights reserved.
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from collections import OrderedDict
+
+class ParseCache(object):
+    '''
+    Bounded LRU cache of parsed objects keyed by their raw text. The
+    cached objects serve as templates and are never handed out, the
+    caller gets a copy made by the getCopy() instead.
+    '''
+    name = None
+    maxsize = None
+    maxkeylen = None
+    hits = 0
+    misses = 0
+    cache = None
+
+    def __init__(self, name, maxsize = 1024, maxkeylen = 256):
+        self.name = name
+        self.maxsize = maxsize
+        self.maxkeylen = maxkeylen
+        self.cache = OrderedDict()
+
+    def get(self, key, parse):
+        template = self.cache.pop(key, None)
+        if template != None:
+            self.hits += 1
+            self.cache[key] = template
+            return template.getCopy()
+        self.misses += 1
+        # Parsing exceptions are not cached, it's the caller's problem
+        obj = parse()
+        if self.maxsize > 0 and len(key[0]) <= self.maxkeylen:
+            template = obj.getCopy()
+            self.cache[key] = template
+            while len(self.cache) > self.maxsize:
+                self.cache.popitem(last = False)
+        return obj
+
+    def clear(self):
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return '%s parse cache: size %d/%d, hits %d, misses %d' % (self.name, \
+          len(self.cache), self.maxsize, self.hits, self.misses)
+
+if __name__ == '__main__':
+    class Foo(object):
+        def __init__(self, s):
+            self.s = s
+
+        def getCopy(self):
+            return Foo(self.s)
+
+    pc = ParseCache('foo', maxsize = 2, maxkeylen = 3)
+    for s in ('a', 'b', 'a', 'c', 'b', 'toolong', 'toolong'):
+        f = pc.get((s,), lambda: Foo(s))
+        assert f.s == s
+    assert list(pc.cache.keys()) == [('c',), ('b',)]
+    assert (pc.hits, pc.misses) == (1, 6)
+    print(pc)
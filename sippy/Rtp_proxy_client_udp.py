@@ -115,6 +115,7 @@ class Rtp_proxy_client_udp(Rtp_proxy_client_net):
             nretr = getnretrans(next_retr, exp_time)
         command = '%s %s' % (cookie, command)
         timer = Timeout(self.retransmit, next_retr, 1, cookie)
+        timer.rearm = True
         preq = Rtp_proxy_pending_req(next_retr, nretr - 1, timer, command, \
           result_callback, callback_parameters)
         self.worker.send_to(command, self.address)
@@ -131,7 +132,7 @@ class Rtp_proxy_client_udp(Rtp_proxy_client_net):
             return
         preq.retransmits += 1
         preq.next_retr *= 2
-        preq.timer = Timeout(self.retransmit, preq.next_retr, 1, cookie)
+        preq.timer.reschedule(preq.next_retr)
         self.worker.send_to(preq.command, self.address)
         preq.triesleft -= 1
 
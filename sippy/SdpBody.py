@@ -35,58 +35,74 @@ f_types = {'v':SdpGeneric, 'o':SdpOrigin, 's':SdpGeneric, 'i':SdpGeneric, \
   'k':SdpGeneric}
 
 class SdpBody(object):
-    v_header = None
-    o_header = None
-    s_header = None
-    i_header = None
-    u_header = None
-    e_header = None
-    p_header = None
-    c_header = None
-    b_header = None
-    t_header = None
-    r_header = None
-    z_header = None
-    k_header = None
-    a_headers = None
+    # "a=" lines are kept as raw strings in the a_lines until someone
+    # asks for the a_headers, see SdpMediaDescription
+    __slots__ = ('v_header', 'o_header', 's_header', 'i_header', 'u_header', \
+      'e_header', 'p_header', 'c_header', 'b_header', 't_header', 'r_header', \
+      'z_header', 'k_header', 'a_lines', '__a_headers', 'sections')
     first_half = ('v', 'o', 's', 'i', 'u', 'e', 'p')
     second_half = ('b', 't', 'r', 'z', 'k')
     all_headers = ('v', 'o', 's', 'i', 'u', 'e', 'p', 'c', 'b', 't', 'r', 'z', 'k')
     top_hdrs_req = ('v', 'o', 's', 't')
     sect_hdrs_req = ('c', 'm')
-    sections = None
+    # ("name=", attribute name) pairs for the above, used by the localStr()
+    first_half_hfs = tuple([(x + '=', x + '_header') for x in first_half])
+    second_half_hfs = tuple([(x + '=', x + '_header') for x in second_half])
+    all_hfs = tuple([(x + '=', x + '_header') for x in all_headers])
+    # name -> (attribute name, type), used by the parser and the addHeader()
+    hf_types = dict([(x, (x + '_header', f_types[x])) for x in all_headers])
 
     def __init__(self, body = None, cself = None):
         if cself != None:
-            for header_name in [x + '_header' for x in self.all_headers]:
-                try:
-                    setattr(self, header_name, getattr(cself, header_name).getCopy())
-                except AttributeError:
-                    pass
-            self.a_headers = [x.getCopy() for x in cself.a_headers]
+            for name, hname in self.all_hfs:
+                header = getattr(cself, hname)
+                if header != None:
+                    header = header.getCopy()
+                setattr(self, hname, header)
+            if cself.__a_headers != None:
+                self.__a_headers = [x.getCopy() for x in cself.__a_headers]
+                self.a_lines = None
+            else:
+                self.__a_headers = None
+                self.a_lines = cself.a_lines[:]
             self.sections = [x.getCopy() for x in cself.sections]
             return
-        self.a_headers = []
+        self.v_header = self.o_header = self.s_header = self.i_header = self.u_header = \
+          self.e_header = self.p_header = self.c_header = self.b_header = \
+          self.t_header = self.r_header = self.z_header = self.k_header = None
+        self.a_lines = []
+        self.__a_headers = None
         self.sections = []
         if body == None:
             return
-        avpairs = [x.split('=', 1) for x in body.strip().splitlines() if len(x.strip()) > 0]
-        current_snum = 0
+        hf_types = self.hf_types
+        section = None
+        a_lines = self.a_lines
         c_header = None
-        for name, v in avpairs:
-            name = name.lower()
+        for line in body.strip().splitlines():
+            if line[1:2] == '=':
+                # Fast path, the only form allowed by the RFC4566
+                name = line[0].lower()
+                v = line[2:]
+            elif len(line) == 0 or line.isspace():
+                continue
+            else:
+                name, v = line.split('=', 1)
+                name = name.lower()
+            if name == 'a':
+                a_lines.append(v)
+                continue
             if name == 'm':
-                current_snum += 1
-                self.sections.append(SdpMediaDescription())
-            if current_snum == 0:
-                if name == 'c':
-                    c_header = v
-                elif name == 'a':
-                    self.a_headers.append(a_header(v))
-                else:
-                    setattr(self, name + '_header', f_types[name](v))
+                section = SdpMediaDescription()
+                self.sections.append(section)
+                a_lines = section.a_lines
+            if section != None:
+                section.addHeader(name, v)
+            elif name == 'c':
+                c_header = v
             else:
-                self.sections[-1].addHeader(name, v)
+                hname, htype = hf_types[name]
+                setattr(self, hname, htype(v))
         if c_header != None:
             for section in self.sections:
                 if section.c_header == None:
@@ -94,117 +110,72 @@ class SdpBody(object):
             if len(self.sections) == 0:
                 self.addHeader('c', c_header)
         # Do some sanity checking, RFC4566
-        for header_name in [x + '_header' for x in self.top_hdrs_req]:
-            if getattr(self, header_name) == None:
-                raise Exception('Mandatory "%s=" session header is missing' % header_name[0])
+        for name in self.top_hdrs_req:
+            if getattr(self, name + '_header') == None:
+                raise Exception('Mandatory "%s=" session header is missing' % name)
         for section in self.sections:
-            for header_name in [x + '_header' for x in self.sect_hdrs_req]:
-                if getattr(section, header_name) == None:
-                    raise Exception('Mandatory "%s=" media header is missing' % header_name[0])
+            if section.c_header == None or section.m_header == None:
+                name = 'c' if section.c_header == None else 'm'
+                raise Exception('Mandatory "%s=" media header is missing' % name)
+
+    @property
+    def a_headers(self):
+        if self.__a_headers == None:
+            self.__a_headers = [a_header(x) for x in self.a_lines]
+            self.a_lines = None
+        return self.__a_headers
+
+    @a_headers.setter
+    def a_headers(self, a_headers):
+        self.__a_headers = a_headers
+        self.a_lines = None
 
     def __str__(self):
-        s = ''
-        if len(self.sections) == 1 and self.sections[0].c_header != None:
-            for name in self.first_half:
-                header = getattr(self, name + '_header')
-                if header != None:
-                    s += '%s=%s\r\n' % (name, str(header))
-            s += 'c=%s\r\n' % str(self.sections[0].c_header)
-            for name in self.second_half:
-                header = getattr(self, name + '_header')
-                if header != None:
-                    s += '%s=%s\r\n' % (name, str(header))
-            for header in self.a_headers:
-                s += 'a=%s\r\n' % str(header)
-            s += self.sections[0].localStr(noC = True)
-            return s
-        # Special code to optimize for the cases when there are many media streams pointing to
-        # the same IP. Only include c= header into the top section of the SDP and remove it from
-        # the streams that match.
-        optimize_c_headers = False
-        if len(self.sections) > 1 and self.c_header == None and self.sections[0].c_header != None and \
-          str(self.sections[0].c_header) == str(self.sections[1].c_header):
-            # Special code to optimize for the cases when there are many media streams pointing to
-            # the same IP. Only include c= header into the top section of the SDP and remove it from
-            # the streams that match.
-            optimize_c_headers = True
-            sections_0_str = str(self.sections[0].c_header)
-        if optimize_c_headers:
-            for name in self.first_half:
-                header = getattr(self, name + '_header')
-                if header != None:
-                    s += '%s=%s\r\n' % (name, str(header))
-            s += 'c=%s\r\n' % sections_0_str
-            for name in self.second_half:
-                header = getattr(self, name + '_header')
-                if header != None:
-                    s += '%s=%s\r\n' % (name, str(header))
-        else:
-            for name in self.all_headers:
-                header = getattr(self, name + '_header')
-                if header != None:
-                    s += '%s=%s\r\n' % (name, str(header))
-        for header in self.a_headers:
-            s += 'a=%s\r\n' % str(header)
-        for section in self.sections:
-            if optimize_c_headers and section.c_header != None and \
-              str(section.c_header) == sections_0_str:
-                s += section.localStr(noC = True)
-            else:
-                s += str(section)
-        return s
+        return self.localStr()
+
+    def __w_hfs(self, w, hfs, local_addr, local_port):
+        for name, hname in hfs:
+            header = getattr(self, hname)
+            if header != None:
+                w(name)
+                w(header.localStr(local_addr, local_port))
+                w('\r\n')
 
     def localStr(self, local_addr = None, local_port = None):
-        s = ''
-        if len(self.sections) == 1 and self.sections[0].c_header != None:
-            for name in self.first_half:
-                header = getattr(self, name + '_header')
-                if header != None:
-                    s += '%s=%s\r\n' % (name, header.localStr(local_addr, local_port))
-            s += 'c=%s\r\n' % self.sections[0].c_header.localStr(local_addr, local_port)
-            for name in self.second_half:
-                header = getattr(self, name + '_header')
-                if header != None:
-                    s += '%s=%s\r\n' % (name, header.localStr(local_addr, local_port))
-            for header in self.a_headers:
-                s += 'a=%s\r\n' % str(header)
-            s += self.sections[0].localStr(local_addr, local_port, noC = True)
-            return s
+        l = []; w = l.append
+        sections = self.sections
         # Special code to optimize for the cases when there are many media streams pointing to
         # the same IP. Only include c= header into the top section of the SDP and remove it from
         # the streams that match.
-        optimize_c_headers = False
-        if len(self.sections) > 1 and self.c_header == None and self.sections[0].c_header != None and \
-          self.sections[0].c_header.localStr(local_addr, local_port) == self.sections[1].c_header.localStr(local_addr, local_port):
-            # Special code to optimize for the cases when there are many media streams pointing to
-            # the same IP. Only include c= header into the top section of the SDP and remove it from
-            # the streams that match.
-            optimize_c_headers = True
-            sections_0_str = self.sections[0].c_header.localStr(local_addr, local_port)
-        if optimize_c_headers:
-            for name in self.first_half:
-                header = getattr(self, name + '_header')
-                if header != None:
-                    s += '%s=%s\r\n' % (name, header.localStr(local_addr, local_port))
-            s += 'c=%s\r\n' % sections_0_str
-            for name in self.second_half:
-                header = getattr(self, name + '_header')
-                if header != None:
-                    s += '%s=%s\r\n' % (name, header.localStr(local_addr, local_port))
+        sections_c = None
+        if len(sections) == 1 and sections[0].c_header != None:
+            sections_c = sections[0].c_header.localStr(local_addr, local_port)
+            noCs = (True,)
+        elif len(sections) > 1 and self.c_header == None and sections[0].c_header != None \
+          and sections[1].c_header != None:
+            sect_cs = [x.c_header.localStr(local_addr, local_port) if x.c_header != None \
+              else None for x in sections]
+            if sect_cs[1] == sect_cs[0]:
+                sections_c = sect_cs[0]
+                noCs = [x == sections_c for x in sect_cs]
+        if sections_c != None:
+            self.__w_hfs(w, self.first_half_hfs, local_addr, local_port)
+            w('c=%s\r\n' % sections_c)
+            self.__w_hfs(w, self.second_half_hfs, local_addr, local_port)
         else:
-            for name in self.all_headers:
-                header = getattr(self, name + '_header')
-                if header != None:
-                    s += '%s=%s\r\n' % (name, header.localStr(local_addr, local_port))
-        for header in self.a_headers:
-            s += 'a=%s\r\n' % str(header)
-        for section in self.sections:
-            if optimize_c_headers and section.c_header != None and \
-              section.c_header.localStr(local_addr, local_port) == sections_0_str:
-                s += section.localStr(local_addr, local_port, noC = True)
-            else:
-                s += section.localStr(local_addr, local_port)
-        return s
+            self.__w_hfs(w, self.all_hfs, local_addr, local_port)
+            noCs = [False] * len(sections)
+        if self.__a_headers == None:
+            for line in self.a_lines:
+                w('a=')
+                w(line)
+                w('\r\n')
+        else:
+            for header in self.__a_headers:
+                w('a=%s\r\n' % str(header))
+        for section, noC in zip(sections, noCs):
+            w(section.localStr(local_addr, local_port, noC = noC))
+        return ''.join(l)
 
     def __iadd__(self, other):
         if len(self.sections) > 0:
@@ -218,6 +189,10 @@ class SdpBody(object):
 
     def addHeader(self, name, header):
         if name == 'a':
-            self.a_headers.append(a_header(header))
+            if self.__a_headers == None:
+                self.a_lines.append(header)
+            else:
+                self.__a_headers.append(a_header(header))
         else:
-            setattr(self, name + '_header', f_types[name](header))
+            hname, htype = self.hf_types[name]
+            setattr(self, hname, htype(header))
@@ -26,9 +26,7 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 class SdpConnecton(object):
-    ntype = None
-    atype = None
-    addr = None
+    __slots__ = ('ntype', 'atype', 'addr')
 
     def __init__(self, body = None, cself = None):
         if body != None:
@@ -34,11 +34,7 @@ class MTOther(object):
     pass
 
 class SdpMedia(object):
-    type = None
-    stype = None
-    port = None
-    transport = None
-    formats = None
+    __slots__ = ('type', 'stype', 'port', 'transport', 'formats')
 
     def __init__(self, body = None, cself = None):
         if body != None:
@@ -66,13 +62,11 @@ class SdpMedia(object):
 
     def __str__(self):
         rval = '%s %d %s' % (self.stype, self.port, self.transport)
+        if len(self.formats) == 0:
+            return rval
         if self.type in (MTAudio, MTVideo):
-            for format in self.formats:
-                rval += ' %d' % format
-        else:
-            for format in self.formats:
-                rval += ' %s' % format
-        return rval
+            return rval + ' ' + ' '.join(['%d' % x for x in self.formats])
+        return rval + ' ' + ' '.join(self.formats)
 
     def localStr(self, local_addr = None, local_port = None):
         return str(self)
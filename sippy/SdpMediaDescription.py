@@ -32,8 +32,7 @@ f_types = {'m':SdpMedia, 'i':SdpGeneric, 'c':SdpConnecton, 'b':SdpGeneric, \
   'k':SdpGeneric}
 
 class a_header(object):
-    name = None
-    value = None
+    __slots__ = ('name', 'value')
 
     def __init__(self, s):
         if isinstance(s, a_header):
@@ -44,6 +43,8 @@ class a_header(object):
         self.name = parts[0]
         if len(parts) > 1:
             self.value = parts[1]
+        else:
+            self.value = None
 
     def __str__(self):
         if self.value is None:
@@ -54,47 +55,72 @@ class a_header(object):
         return a_header(self)
 
 class SdpMediaDescription(object):
-    m_header = None
-    i_header = None
-    c_header = None
-    b_header = None
-    k_header = None
-    a_headers = None
+    # "a=" lines are kept as raw strings in the a_lines until someone
+    # asks for the a_headers, most of the time they just pass through
+    __slots__ = ('m_header', 'i_header', 'c_header', 'b_header', 'k_header', \
+      'a_lines', '__a_headers', 'needs_update')
     all_headers = ('m', 'i', 'c', 'b', 'k')
-    needs_update = True
+    all_hfs = tuple([(x + '=', x + '_header') for x in all_headers])
+    # name -> (attribute name, type), used by the addHeader()
+    hf_types = dict([(x, (x + '_header', f_types[x])) for x in all_headers])
 
     def __init__(self, cself = None):
+        self.needs_update = True
         if cself != None:
-            for header_name in [x + '_header' for x in self.all_headers]:
-                try:
-                    setattr(self, header_name, getattr(cself, header_name).getCopy())
-                except AttributeError:
-                    pass
-            self.a_headers = [x.getCopy() for x in cself.a_headers]
+            for hname in ('m_header', 'c_header'):
+                header = getattr(cself, hname)
+                if header != None:
+                    header = header.getCopy()
+                setattr(self, hname, header)
+            # SdpGeneric is immutable
+            self.i_header = cself.i_header
+            self.b_header = cself.b_header
+            self.k_header = cself.k_header
+            if cself.__a_headers != None:
+                self.__a_headers = [x.getCopy() for x in cself.__a_headers]
+                self.a_lines = None
+            else:
+                self.__a_headers = None
+                self.a_lines = cself.a_lines[:]
             return
-        self.a_headers = []
+        self.m_header = self.i_header = self.c_header = self.b_header = \
+          self.k_header = None
+        self.a_lines = []
+        self.__a_headers = None
+
+    @property
+    def a_headers(self):
+        if self.__a_headers == None:
+            self.__a_headers = [a_header(x) for x in self.a_lines]
+            self.a_lines = None
+        return self.__a_headers
+
+    @a_headers.setter
+    def a_headers(self, a_headers):
+        self.__a_headers = a_headers
+        self.a_lines = None
 
     def __str__(self):
-        s = ''
-        for name in self.all_headers:
-            header = getattr(self, name + '_header')
-            if header != None:
-                s += '%s=%s\r\n' % (name, str(header))
-        for header in self.a_headers:
-            s += 'a=%s\r\n' % str(header)
-        return s
+        return self.localStr()
 
     def localStr(self, local_addr = None, local_port = None, noC = False):
-        s = ''
-        for name in self.all_headers:
-            if noC and name == 'c':
+        l = []; w = l.append
+        for name, hname in self.all_hfs:
+            header = getattr(self, hname)
+            if header == None or (noC and hname == 'c_header'):
                 continue
-            header = getattr(self, name + '_header')
-            if header != None:
-                s += '%s=%s\r\n' % (name, header.localStr(local_addr, local_port))
-        for header in self.a_headers:
-            s += 'a=%s\r\n' % str(header)
-        return s
+            w(name)
+            w(header.localStr(local_addr, local_port))
+            w('\r\n')
+        if self.__a_headers == None:
+            for line in self.a_lines:
+                w('a=')
+                w(line)
+                w('\r\n')
+        else:
+            for header in self.__a_headers:
+                w('a=%s\r\n' % str(header))
+        return ''.join(l)
 
     def __iadd__(self, other):
         self.addHeader(*other.strip().split('=', 1))
@@ -105,9 +131,13 @@ class SdpMediaDescription(object):
 
     def addHeader(self, name, header):
         if name == 'a':
-            self.a_headers.append(a_header(header))
+            if self.__a_headers == None:
+                self.a_lines.append(header)
+            else:
+                self.__a_headers.append(a_header(header))
         else:
-            setattr(self, name + '_header', f_types[name](header))
+            hname, htype = self.hf_types[name]
+            setattr(self, hname, htype(header))
 
     def insertHeader(self, indx, name, header):
         assert(name == 'a')
@@ -29,14 +29,9 @@ from time import time
 from random import random
 
 class SdpOrigin(object):
+    __slots__ = ('username', 'session_id', 'version', 'network_type', 'address_type', \
+      'address')
     _session_id = int(random() * time() * 1000.0)
-    username = None
-    session_id = None
-    version = None
-    network_type = None
-    address_type = None
-    address = None
-    session_id = None
 
     def __init__(self, body = None, cself = None):
         if body != None:
@@ -61,7 +56,7 @@ class SdpOrigin(object):
         return '%s %s %s %s %s %s' % (self.username, self.session_id, self.version, self.network_type, self.address_type, self.address)
 
     def localStr(self, local_addr = None, local_port = None):
-        if local_addr != None and 'my' in dir(self.address):
+        if local_addr != None and hasattr(self.address, 'my'):
             if local_addr.startswith('['):
                 address_type = 'IP6'
                 local_addr = local_addr[1:-1]
@@ -24,7 +24,8 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from sippy.SipURL import SipURL
+from sippy.SipURL import parse_sipurl
+from sippy.ParseCache import ParseCache
 try:
     from string import maketrans
     needquotes = lambda x, y: not x.encode().translate(y).isalnum()
@@ -44,11 +45,7 @@ def findquotes(s, pos = 1):
     return rval
 
 class SipAddress(object):
-    name = None
-    url = None
-    params = None
-    params_order = None
-    hadbrace = None
+    __slots__ = ('name', 'url', 'params', 'params_order', 'hadbrace')
     transtable = maketrans('-.!%*_+`\'~', 'a' * 10)
 
     def __init__(self, address = None, name = None, url = None, params = None,
@@ -56,6 +53,7 @@ class SipAddress(object):
         self.params = {}
         self.params_order = []
         self.hadbrace = True
+        self.name = None
         if address == None:
             self.name = name
             self.url = url
@@ -69,7 +67,7 @@ class SipAddress(object):
         # simple 'sip:foo' case
         if address.lower().startswith('sip:') and address.find('<') == -1:
             parts = address.split(';', 1)
-            self.url = SipURL(parts[0], relaxedparser = relaxedparser)
+            self.url = parse_sipurl(parts[0], relaxedparser)
             if len(parts) == 2:
                 for l in parts[1].split(';'):
                     if not l:
@@ -109,7 +107,7 @@ class SipAddress(object):
             self.name, url = address.split('<', 1)
             self.name = self.name.strip()
         url, paramstring = url.split('>', 1)
-        self.url = SipURL(url, relaxedparser = relaxedparser)
+        self.url = parse_sipurl(url, relaxedparser)
         paramstring = paramstring.strip()
         if paramstring:
             for l in paramstring.split(';'):
@@ -168,3 +166,9 @@ class SipAddress(object):
     def delParam(self, name):
         del self.params[name]
         self.params_order.remove(name)
+
+address_cache = ParseCache('SIP address')
+
+def parse_sipaddress(address, relaxedparser = False):
+    return address_cache.get((address, relaxedparser), \
+      lambda: SipAddress(address, relaxedparser = relaxedparser))
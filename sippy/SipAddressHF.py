@@ -25,15 +25,19 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from sippy.SipGenericHF import SipGenericHF
-from sippy.SipAddress import SipAddress
+from sippy.SipAddress import parse_sipaddress
 from sippy.ESipHeaderCSV import ESipHeaderCSV
 
 class SipAddressHF(SipGenericHF):
-    address = None
+    # shared is set when the parsed self.address is shared with copies
+    # of this header, see getCopy() and detach()
+    __slots__ = ('address', 'shared')
     relaxedparser = False
 
     def __init__(self, body = None, address = None):
         SipGenericHF.__init__(self, body)
+        self.address = None
+        self.shared = False
         if body != None:
             csvs = []
             pidx = 0
@@ -59,14 +63,14 @@ class SipAddressHF(SipGenericHF):
             self.address = address
 
     def parse(self):
-        self.address = SipAddress(self.body, relaxedparser = self.relaxedparser)
+        self.address = parse_sipaddress(self.body, self.relaxedparser)
         self.parsed = True
 
     def __str__(self):
         return self.localStr()
 
     def localStr(self, local_addr = None, local_port = None):
-        if not self.parsed:
+        if not self.modified:
             return self.body
         return self.address.localStr(local_addr, local_port)
 
@@ -74,15 +78,32 @@ class SipAddressHF(SipGenericHF):
         if not self.parsed:
             oret = self.__class__(self.body)
         else:
-            oret = self.__class__(address = self.address.getCopy())
-        oret.relaxedparser = self.relaxedparser
+            # Copy-on-write, the address is only copied once either
+            # of the headers is about to change it.
+            oret = self.__class__(address = self.address)
+            oret.body = self.body
+            oret.modified = self.modified
+            self.shared = oret.shared = True
         return oret
 
+    def detach(self):
+        # Should be called before the self.address is modified
+        if self.shared:
+            self.address = self.address.getCopy()
+            self.shared = False
+        self.modified = True
+
     def setBody(self, body):
         self.address = body
+        self.shared = False
+        self.modified = True
 
+    # The objects returned by the two methods below are mutable, so
+    # we have to assume that the caller is going to modify them.
     def getUri(self):
+        self.detach()
         return self.address
 
     def getUrl(self):
+        self.detach()
         return self.address.url
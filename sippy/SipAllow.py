@@ -29,11 +29,12 @@ from sippy.SipGenericHF import SipGenericHF
 from functools import reduce
 
 class SipAllow(SipGenericHF):
+    __slots__ = ('methods',)
     hf_names = ('allow',)
-    methods = None
 
     def __init__(self, body = None, methods = None):
         SipGenericHF.__init__(self, body)
+        self.methods = None
         if body == None:
             self.parsed = True
             self.methods = methods[:]
@@ -27,4 +27,5 @@
 from sippy.SipAddressHF import SipAddressHF
 
 class SipAlso(SipAddressHF):
+    __slots__ = ()
     hf_names = ('also',)
@@ -53,23 +53,18 @@ _HASH_FUNC = {None:(md5, DGST_MD5), 'MD5':(md5, DGST_MD5), 'MD5-sess':(md5, DGST
   'SHA-512-256':(sha512_256, DGST_SHA512), 'SHA-512-256-sess':(sha512_256, DGST_SHA512SESS)}
 
 class SipAuthorization(SipGenericHF):
+    __slots__ = ('username', 'uri', 'realm', 'nonce', 'response', 'qop', 'cnonce', \
+      'nc', 'algorithm', 'otherparams')
     hf_names = ('authorization',)
-    username = None
-    uri = None
-    realm = None
-    nonce = None
-    response = None
-    qop = None
-    cnonce = None
-    nc = None
-    algorithm = None
-    otherparams = None
     ho = HashOracle()
 
     def __init__(self, body = None, username = None, uri = None, realm = None, nonce = None, response = None, \
                  cself = None):
         SipGenericHF.__init__(self, body)
+        self.qop = self.cnonce = self.nc = self.algorithm = None
         if body != None:
+            self.username = self.uri = self.realm = self.nonce = None
+            self.response = self.otherparams = None
             return
         self.parsed = True
         if cself != None:
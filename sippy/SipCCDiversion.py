@@ -27,6 +27,7 @@
 from sippy.SipAddressHF import SipAddressHF
 
 class SipCCDiversion(SipAddressHF):
+    __slots__ = ()
     hf_names = ('cc-diversion',)
 
     def getCanName(self, name, compact = False):
@@ -27,12 +27,13 @@
 from sippy.SipGenericHF import SipGenericHF
 
 class SipCSeq(SipGenericHF):
+    __slots__ = ('cseq', 'method')
     hf_names = ('cseq',)
-    cseq = None
-    method = None
 
     def __init__(self, body = None, cseq = None, method = None):
         SipGenericHF.__init__(self, body)
+        self.cseq = None
+        self.method = None
         if body == None:
             self.parsed = True
             self.method = method
@@ -47,7 +48,7 @@ class SipCSeq(SipGenericHF):
         self.parsed = True
 
     def __str__(self):
-        if not self.parsed:
+        if not self.modified:
             return self.body
         return str(self.cseq) + ' ' + self.method
 
@@ -70,4 +71,5 @@ class SipCSeq(SipGenericHF):
 
     def incCSeqNum(self):
         self.cseq += 1
+        self.modified = True
         return self.cseq
@@ -45,8 +45,8 @@ def gen_test_cid(lens = DEFAULT_TEST_LEN):
     return r
 
 class SipCallId(SipGenericHF):
+    __slots__ = ()
     hf_names = ('call-id', 'i')
-    body = None
 
     def __init__(self, body = None):
         SipGenericHF.__init__(self, body)
@@ -30,11 +30,12 @@ from time import time
 from sippy.SipGenericHF import SipGenericHF
 
 class SipCiscoGUID(SipGenericHF):
+    __slots__ = ('ciscoGUID',)
     hf_names = ('cisco-guid', 'h323-conf-id')
-    ciscoGUID = None
 
     def __init__(self, body = None, ciscoGUID = None):
         SipGenericHF.__init__(self, body)
+        self.ciscoGUID = None
         if body != None:
             return
         self.parsed = True
@@ -32,14 +32,17 @@ from sippy.SipURL import SipURL
 from sippy.ESipHeaderIgnore import ESipHeaderIgnore
 
 class SipContact(SipAddressHF):
+    __slots__ = ('asterisk',)
     hf_names = ('contact', 'm')
-    asterisk = False
 
     def __init__(self, body = None, address = None):
         if body == '*':
             SipGenericHF.__init__(self, body)
+            self.address = None
+            self.shared = False
             self.asterisk = True
             return
+        self.asterisk = False
         SipAddressHF.__init__(self, body, address)
         if body == None and address == None:
             self.address = SipAddress(name = 'Anonymous', url = SipURL(host = SipConf.my_address, port = SipConf.my_port))
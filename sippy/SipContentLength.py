@@ -27,6 +27,7 @@
 from sippy.SipNumericHF import SipNumericHF
 
 class SipContentLength(SipNumericHF):
+    __slots__ = ()
     hf_names = ('content-length', 'l')
 
     def getCanName(self, name, compact = False):
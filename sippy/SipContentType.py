@@ -27,6 +27,7 @@
 from sippy.SipGenericHF import SipGenericHF
 
 class SipContentType(SipGenericHF):
+    __slots__ = ()
     hf_names = ('content-type', 'c')
 
     def __init__(self, body):
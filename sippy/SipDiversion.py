@@ -27,6 +27,7 @@
 from sippy.SipAddressHF import SipAddressHF
 
 class SipDiversion(SipAddressHF):
+    __slots__ = ()
     hf_names = ('diversion',)
 
     def getCanName(self, name, compact = False):
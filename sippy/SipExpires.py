@@ -27,6 +27,7 @@
 from sippy.SipNumericHF import SipNumericHF
 
 class SipExpires(SipNumericHF):
+    __slots__ = ()
     hf_names = ('expires',)
 
     def __init__(self, body = None, number = 300):
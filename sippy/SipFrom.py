@@ -44,6 +44,7 @@ def gen_test_tag(len = DEFAULT_TTAG_LEN):
     return r
 
 class SipFrom(SipAddressHF):
+    __slots__ = ()
     hf_names = ('from', 'f')
     relaxedparser = True
 
@@ -57,12 +58,15 @@ class SipFrom(SipAddressHF):
 
     def genTag(self):
         salt = str((random() * 1000000000) + time())
+        self.detach()
         self.address.setParam('tag', md5(salt.encode()).hexdigest())
 
     def setTag(self, value):
+        self.detach()
         self.address.setParam('tag', value)
 
     def delTag(self):
+        self.detach()
         self.address.delParam('tag')
 
     def getCanName(self, name, compact = False):
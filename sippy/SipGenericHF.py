@@ -25,14 +25,29 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 class SipGenericHF(object):
-    hf_names = None	# Set this in each subclass!!
-    body = None
-    parsed = False
+    # Each subclass should define its own __slots__ (empty if it has no
+    # instance attributes of its own) and set up all of them in the
+    # __init__(), there are no class-level defaults for those.
+    #
+    # modified is set when the parsed value no longer matches original
+    # text in the self.body, headers that track it are serialized from
+    # the self.body as long as it's not set.
+    __slots__ = ('body', 'parsed', 'modified', '__hf_names')
 
     def __init__(self, body, name = None):
         self.body = body
+        self.parsed = False
+        self.modified = (body == None)
         if name != None:
-            self.hf_names = (name.lower(),)
+            self.__hf_names = (name.lower(),)
+        else:
+            self.__hf_names = None
+
+    # Set this in each subclass!! For the unknown headers the name is
+    # taken from the instance.
+    @property
+    def hf_names(self):
+        return self.__hf_names
 
     def parse(self):
         pass
@@ -66,20 +66,25 @@ _hf_types = (SipCSeq, SipCallId, SipFrom, SipTo, SipMaxForwards, SipVia, SipCont
              SipReplaces, SipPAssertedIdentity, SipReason, SipAllow, SipSupported, SipRSeq, \
              SipRAck, SipWarning, SipDiversion)
 
+# hf_cnames maps any known name of the HF (full or compact) into its
+# canonical name, so that all instances share the same string object.
 hf_types = {}
+hf_cnames = {}
 for hf_type in _hf_types:
     for hf_name in hf_type.hf_names:
         hf_types[hf_name] = hf_type
+        hf_cnames[hf_name] = hf_type.hf_names[0]
 
 class SipHeader(object):
-    name = None
-    body = None
+    __slots__ = ('name', 'body')
 
     def __init__(self, s = None, name = None, body = None, bodys = None, fixname = False):
         if s != None:
             name, bodys = [x.strip() for x in s.split(':', 1)]
         if name != None:
             self.name = name.lower()
+        else:
+            self.name = None
         if body == None:
             try:
                 try:
@@ -39,6 +39,17 @@ SIPLOG_WARN = 2
 SIPLOG_ERR = 3
 SIPLOG_CRIT = 4
 
+if str is bytes:
+    # Python < 3
+    _logstr = str
+else:
+    def _logstr(x):
+        # Raw datagrams are passed in as is, so that they only get
+        # decoded when logging is actually enabled
+        if isinstance(x, (bytes, bytearray)):
+            return x.decode(errors = 'backslashreplace')
+        return str(x)
+
 class AsyncLogger(Thread):
     log = None
     app = None
@@ -210,7 +221,7 @@ class SipLogger(object):
             pid = ''
         return '%s/%s%s%s: %s\n' % (self.ftime(ltime), \
           call_id, self.app, pid, \
-          reduce(lambda x, y: x + y, [str(x) for x in args]))
+          reduce(lambda x, y: x + y, [_logstr(x) for x in args]))
 
     def reopen(self, signum = None):
         self.wi_available.acquire()
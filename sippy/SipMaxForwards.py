@@ -27,6 +27,7 @@
 from sippy.SipNumericHF import SipNumericHF
 
 class SipMaxForwards(SipNumericHF):
+    __slots__ = ()
     hf_names = ('max-forwards',)
 
     def __init__(self, body = None, number = 70):
@@ -24,7 +24,8 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from sippy.SipHeader import SipHeader
+from sippy.SipHeader import SipHeader, hf_types, hf_cnames
+from sippy.SipGenericHF import SipGenericHF
 from sippy.SipContentLength import SipContentLength
 from sippy.SipContentType import SipContentType
 from sippy.MsgBody import MsgBody
@@ -32,6 +33,16 @@ from sippy.ESipHeaderCSV import ESipHeaderCSV
 from sippy.ESipHeaderIgnore import ESipHeaderIgnore
 from sippy.ESipParseException import ESipParseException
 
+_bytes_types = (bytes, bytearray)
+
+if str is bytes:
+    # Python < 3
+    def _b2s(mbuf):
+        return mbuf.tobytes()
+else:
+    def _b2s(mbuf):
+        return str(mbuf, 'utf-8')
+
 class SipMsg(object):
     headers = None
     body = None
@@ -43,61 +54,85 @@ class SipMsg(object):
 
     def __init__(self, buf = None):
         self.headers = []
+        self.__hf_index = {}
         if buf == None:
             return
-        # Locate a body
+        # Locate a body. The parsing is done on the raw bytes received
+        # from the network, only the header part is getting decoded
+        # here, while the body is kept as a view into the original
+        # buffer until init_body() needs it.
         self.__mbody = None
-        for bdel in ('\r\n\r\n', '\r\r', '\n\n'):
+        if isinstance(buf, memoryview):
+            buf = buf.tobytes()
+        elif not isinstance(buf, _bytes_types):
+            buf = buf.encode('utf-8')
+        mbuf = memoryview(buf)
+        for bdel in (b'\r\n\r\n', b'\r\r', b'\n\n'):
             boff = buf.find(bdel)
             if boff != -1:
-                self.__mbody = buf[boff + len(bdel):]
-                buf = buf[:boff]
-                if len(self.__mbody) == 0:
-                    self.__mbody = None
+                if boff + len(bdel) < len(buf):
+                    self.__mbody = mbuf[boff + len(bdel):]
+                mbuf = mbuf[:boff]
                 break
+        buf = _b2s(mbuf)
         # Split message into lines and put aside start line
         lines = buf.splitlines()
         self.setSL(lines[0])
-        i = 2
-        while i < len(lines):
-            if len(lines[i]) == 0 or lines[i][0] in (' ', '\t'):
-                lines[i - 1] += ' ' + lines[i].strip()
-                del lines[i]
-            else:
-                i += 1
-        # Parse headers
+        # Unfold continuation lines in a single forward pass, so that the
+        # cost stays linear no matter how badly the message is folded.
+        hflines = []
+        folds = None
+        for i in range(1, len(lines)):
+            line = lines[i]
+            if line[:1] in (' ', '\t', '') and len(hflines) > 0:
+                if folds == None:
+                    folds = {}
+                folds.setdefault(len(hflines) - 1, [hflines[-1],]).append(line.strip())
+                continue
+            hflines.append(line)
+        if folds != None:
+            for i, parts in folds.items():
+                hflines[i] = ' '.join(parts)
+        # Parse headers, splitting name from value only once and
+        # creating body objects directly for the canonical name.
         self.__content_type = None
         self.__content_length = None
-        header_names = []
-        for line in lines[1:]:
+        headers = self.headers
+        hf_index = self.__hf_index
+        for line in hflines:
+            name, body = line.split(':', 1)
+            name = name.strip().lower()
+            cname = hf_cnames.get(name, None)
             try:
-                header = SipHeader(line, fixname = True)
-                if header.name == 'content-type':
-                    self.__content_type = header
-                elif header.name == 'content-length':
-                    self.__content_length = header
+                if cname != None:
+                    bodys = (hf_types[cname](body.strip()),)
                 else:
-                    self.headers.append(header)
-                    header_names.append(header.name)
+                    cname = name
+                    bodys = (SipGenericHF(body.strip(), name),)
             except ESipHeaderCSV as einst:
-                for body in einst.bodys:
-                    header = SipHeader(name = einst.name, bodys = body)
-                    if header.name == 'content-type':
-                        self.__content_type = header
-                    elif header.name == 'content-length':
-                        self.__content_length = header
-                    else:
-                        self.headers.append(header)
-                        header_names.append(header.name)
+                bodys = [hf_types[cname](x) for x in einst.bodys]
             except ESipHeaderIgnore:
                 continue
-        if 'via' not in header_names:
+            for body in bodys:
+                header = SipHeader(name = cname, body = body)
+                if cname == 'content-type':
+                    self.__content_type = header
+                elif cname == 'content-length':
+                    self.__content_length = header
+                else:
+                    headers.append(header)
+                    hfs = hf_index.get(cname, None)
+                    if hfs == None:
+                        hf_index[cname] = [header,]
+                    else:
+                        hfs.append(header)
+        if 'via' not in hf_index:
             raise Exception('Via HF is missed')
-        if 'to' not in header_names:
+        if 'to' not in hf_index:
             raise Exception('To HF is missed')
-        if 'from' not in header_names:
+        if 'from' not in hf_index:
             raise Exception('From HF is missed')
-        if 'cseq' not in header_names:
+        if 'cseq' not in hf_index:
             raise Exception('CSeq HF is missed')
 
     def init_body(self):
@@ -115,71 +150,70 @@ class SipMsg(object):
                 # happens with request
                 raise ESipParseException('Missed SIP body, %d bytes expected' % blen)
             elif blen > mblen:
-                if blen - mblen < 7 and mblen > 7 and self.__mbody[-4:] == '\r\n\r\n':
+                mbody = self.__mbody.tobytes()
+                if blen - mblen < 7 and mblen > 7 and mbody[-4:] == b'\r\n\r\n':
                     # XXX: we should not really be doing this, but it appears to be
                     # a common off-by-one/two/.../six problem with SDPs generates by
                     # the consumer-grade devices.
                     print('Truncated SIP body, %d bytes expected, %d received, fixing...' % (blen, mblen))
                     blen = mblen
-                elif blen - mblen == 2 and self.__mbody[-2:] == '\r\n':
+                elif blen - mblen == 2 and mbody[-2:] == b'\r\n':
                     # Missed last 2 \r\n is another common problem.
                     print('Truncated SIP body, %d bytes expected, %d received, fixing...' % (blen, mblen))
-                    self.__mbody += '\r\n'
-                elif blen - mblen == 1 and self.__mbody[-3:] == '\r\n\n':
+                    mbody += b'\r\n'
+                elif blen - mblen == 1 and mbody[-3:] == b'\r\n\n':
                     # Another possible mishap
                     print('Truncated SIP body, %d bytes expected, %d received, fixing...' % (blen, mblen))
-                    self.__mbody = self.__mbody[:-3] + '\r\n\r\n'
-                elif blen - mblen == 1 and self.__mbody[-2:] == '\r\n':
+                    mbody = mbody[:-3] + b'\r\n\r\n'
+                elif blen - mblen == 1 and mbody[-2:] == b'\r\n':
                     # One more
                     print('Truncated SIP body, %d bytes expected, %d received, fixing...' % (blen, mblen))
-                    self.__mbody += '\r\n'
+                    mbody += b'\r\n'
                     blen += 1
                     mblen += 2
                 else:
                     # XXX: Should generate 400 Bad Request if such condition
                     # happens with request
                     raise ESipParseException('Truncated SIP body, %d bytes expected, %d received' % (blen, mblen))
+                self.__mbody = memoryview(mbody)
             elif blen < mblen:
                 self.__mbody = self.__mbody[:blen]
                 mblen = blen
         if self.__mbody != None:
+            mbody = _b2s(self.__mbody)
+            self.__mbody = None
             if self.__content_type != None:
-                self.body = MsgBody(self.__mbody, str(self.__content_type.getBody()).lower())
+                self.body = MsgBody(mbody, str(self.__content_type.getBody()).lower())
             else:
-                self.body = MsgBody(self.__mbody)
+                self.body = MsgBody(mbody)
 
     def __str__(self):
-        s = self.getSL() + '\r\n'
-        for header in self.headers:
-            s += str(header) + '\r\n'
-        if self.body != None:
-            mbody = str(self.body)
-            s += 'Content-Type: %s\r\n' % self.body.mtype
-            s += 'Content-Length: %d\r\n\r\n' % len(mbody)
-            s += mbody
-        else:
-            s += 'Content-Length: 0\r\n\r\n'
-        return s
+        return self.localStr()
 
     def localStr(self, local_addr = None, local_port = None, compact = False):
-        s = self.getSL() + '\r\n'
-        for header in self.headers:
-            s += header.localStr(local_addr, local_port, compact) + '\r\n'
-        if self.body != None:
-            mbody = self.body.localStr(local_addr, local_port)
-            if compact:
-                s += 'c: %s\r\n' % self.body.mtype
-                s += 'l: %d\r\n\r\n' % len(mbody)
-            else:
-                s += 'Content-Type: %s\r\n' % self.body.mtype
-                s += 'Content-Length: %d\r\n\r\n' % len(mbody)
-            s += mbody
-        else:
+        l = [self.getSL()]
+        l.extend([x.localStr(local_addr, local_port, compact) for x in self.headers])
+        l.append('')
+        s = '\r\n'.join(l)
+        body = self.getBody()
+        if body == None:
             if compact:
-                s += 'l: 0\r\n\r\n'
-            else:
-                s += 'Content-Length: 0\r\n\r\n'
-        return s
+                return s + 'l: 0\r\n\r\n'
+            return s + 'Content-Length: 0\r\n\r\n'
+        mbody = body.localStr(local_addr, local_port)
+        if compact:
+            return '%sc: %s\r\nl: %d\r\n\r\n%s' % (s, body.mtype, len(mbody), mbody)
+        return '%sContent-Type: %s\r\nContent-Length: %d\r\n\r\n%s' % (s, \
+          body.mtype, len(mbody), mbody)
+
+    def localBytes(self, local_addr = None, local_port = None, compact = False):
+        # Wire form of the message, to be rendered once and then passed
+        # down to the transport as is on every (re)transmission.
+        s = self.localStr(local_addr, local_port, compact)
+        if isinstance(s, _bytes_types):
+            # Python < 3
+            return s
+        return s.encode('utf-8')
 
     def setSL(self, startline):
         self.startline = startline
@@ -187,47 +221,74 @@ class SipMsg(object):
     def getSL(self):
         return self.startline
 
+    # Headers are kept in the wire order in self.headers, with the
+    # self.__hf_index mapping each HF name to the list of its instances
+    # in the same relative order. All modifications should go through
+    # the methods below to keep both in sync.
+    def __reindexHFs(self, name):
+        hfs = [x for x in self.headers if x.name == name]
+        if len(hfs) > 0:
+            self.__hf_index[name] = hfs
+        else:
+            self.__hf_index.pop(name, None)
+
     def getHFs(self, name):
-        return [x for x in self.headers if x.name == name]
+        return list(self.__hf_index.get(name, ()))
 
     def countHFs(self, name):
-        return len([x for x in self.headers if x.name == name])
+        return len(self.__hf_index.get(name, ()))
 
     def delHFs(self, name):
+        if self.__hf_index.pop(name, None) == None:
+            return
         self.headers = [x for x in self.headers if x.name != name]
 
     def getHF(self, name):
-        return [x for x in self.headers if x.name == name][0]
+        return self.__hf_index.get(name, ())[0]
 
     def getHFBodys(self, name):
-        return [x.getBody() for x in self.headers if x.name == name]
+        return [x.getBody() for x in self.__hf_index.get(name, ())]
 
     def getHFBody(self, name, idx = 0):
-        return [x for x in self.headers if x.name == name][idx].getBody()
+        return self.__hf_index.get(name, ())[idx].getBody()
 
     def getHFBCopys(self, name):
-        return [x.getBCopy() for x in self.headers if x.name == name]
+        return [x.getBCopy() for x in self.__hf_index.get(name, ())]
 
     def getHFBCopy(self, name, idx = 0):
-        return [x for x in self.headers if x.name == name][idx].getBCopy()
+        return self.__hf_index.get(name, ())[idx].getBCopy()
 
     def replaceHeader(self, oheader, nheader):
         self.headers[self.headers.index(oheader)] = nheader
+        if oheader.name == nheader.name:
+            hfs = self.__hf_index[oheader.name]
+            hfs[hfs.index(oheader)] = nheader
+            return
+        self.__reindexHFs(oheader.name)
+        self.__reindexHFs(nheader.name)
 
     def removeHeader(self, header):
         self.headers.remove(header)
+        hfs = self.__hf_index[header.name]
+        hfs.remove(header)
+        if len(hfs) == 0:
+            del self.__hf_index[header.name]
 
     def appendHeader(self, header):
         self.headers.append(header)
+        self.__hf_index.setdefault(header.name, []).append(header)
 
     def appendHeaders(self, headers):
-        self.headers.extend(headers)
+        for header in headers:
+            self.appendHeader(header)
 
     def insertHeaderAfter(self, iheader, header):
         self.headers.insert(self.headers.index(iheader) + 1, header)
+        self.__reindexHFs(header.name)
 
     def insertHeaderBefore(self, iheader, header):
         self.headers.insert(self.headers.index(iheader), header)
+        self.__reindexHFs(header.name)
 
     def getBody(self):
         return self.body
@@ -248,9 +309,8 @@ class SipMsg(object):
         self.source = address
 
     def getTId(self, wCSM = False, wBRN = False, wTTG = False):
-        headers_dict = dict([(x.name, x) for x in self.headers if x.name in ('cseq', 'call-id', 'from')])
-        cseq, method = headers_dict['cseq'].getBody().getCSeq()
-        rval = [str(headers_dict['call-id'].getBody()), headers_dict['from'].getBody().getTag(), cseq]
+        cseq, method = self.getHFBody('cseq').getCSeq()
+        rval = [str(self.getHFBody('call-id')), self.getHFBody('from').getTag(), cseq]
         if wCSM:
             rval.append(method)
         if wBRN:
@@ -260,18 +320,19 @@ class SipMsg(object):
         return tuple(rval)
 
     def getTIds(self):
-        headers_dict = dict([(x.name, x) for x in self.headers if x.name in ('cseq', 'call-id', 'from')])
-        call_id = str(headers_dict['call-id'].getBody())
-        ftag = headers_dict['from'].getBody().getTag()
-        cseq, method = headers_dict['cseq'].getBody().getCSeq()
-        return tuple([(call_id, ftag, cseq, method, via.getBranch()) for via in self.getHFBodys('via')])
+        call_id = str(self.getHFBody('call-id'))
+        ftag = self.getHFBody('from').getTag()
+        cseq, method = self.getHFBody('cseq').getCSeq()
+        return tuple([(call_id, ftag, cseq, method, via.getBody().getBranch()) \
+          for via in self.__hf_index.get('via', ())])
 
     def getCopy(self):
         cself = self.__class__()
         for header in self.headers:
             cself.appendHeader(header.getCopy())
-        if self.body != None:
-            cself.body = self.body.getCopy()
+        body = self.getBody()
+        if body != None:
+            cself.body = body.getCopy()
         cself.startline = self.startline
         cself.target = self.target
         cself.source = self.source
@@ -27,10 +27,11 @@
 from sippy.SipGenericHF import SipGenericHF
 
 class SipNumericHF(SipGenericHF):
-    number = None
+    __slots__ = ('number',)
 
     def __init__(self, body = None, number = 0):
         SipGenericHF.__init__(self, body)
+        self.number = None
         if body == None:
             self.parsed = True
             self.number = number
@@ -27,6 +27,7 @@
 from sippy.SipFrom import SipFrom
 
 class SipPAssertedIdentity(SipFrom):
+    __slots__ = ()
     hf_names = ('p-asserted-identity',)
 
     def getCanName(self, name, compact = False):
@@ -28,6 +28,7 @@ from sippy.SipWWWAuthenticate import SipWWWAuthenticate
 from sippy.SipProxyAuthorization import SipProxyAuthorization
 
 class SipProxyAuthenticate(SipWWWAuthenticate):
+    __slots__ = ()
     hf_names = ('proxy-authenticate',)
     aclass = SipProxyAuthorization
 
@@ -27,6 +27,7 @@
 from sippy.SipAuthorization import SipAuthorization
 
 class SipProxyAuthorization(SipAuthorization):
+    __slots__ = ()
     hf_names = ('proxy-authorization',)
 
     def getCanName(self, name, compact = False):
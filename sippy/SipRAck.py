@@ -26,14 +26,15 @@
 from sippy.SipCSeq import SipCSeq
 
 class SipRAck(SipCSeq):
+    __slots__ = ('rseq',)
     hf_names = ('rack',)
-    rseq = None
 
     def __init__(self, body = None, rseq = None, cseq = None, method = None):
         if body == None:
             self.rseq = rseq
             SipCSeq.__init__(self, cseq = cseq, method = method)
             return
+        self.rseq = None
         SipCSeq.__init__(self, body)
 
     def parse(self):
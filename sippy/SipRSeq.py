@@ -26,6 +26,7 @@
 from sippy.SipNumericHF import SipNumericHF
 
 class SipRSeq(SipNumericHF):
+    __slots__ = ()
     hf_names = ('rseq',)
 
     def __init__(self, body = None, number = 1):
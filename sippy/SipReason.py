@@ -30,18 +30,16 @@ class SipReason(SipGenericHF):
     '''
     Class that implements RFC 3326 Reason header field.
     '''
+    __slots__ = ('protocol', 'cause', 'reason')
     hf_names = ('reason',)
-    protocol = None
-    cause = None
-    reason = None
 
     def __init__(self, body = None, protocol = None, cause = None, reason = None):
         SipGenericHF.__init__(self, body)
         if body == None:
             self.parsed = True
-            self.protocol = protocol
-            self.cause = cause
-            self.reason = reason
+        self.protocol = protocol
+        self.cause = cause
+        self.reason = reason
 
     def parse(self):
         protocol, reason_params = self.body.split(';', 1)
@@ -27,6 +27,7 @@
 from sippy.SipFrom import SipFrom
 
 class SipRecordRoute(SipFrom):
+    __slots__ = ()
     hf_names = ('record-route',)
     relaxedparser = False
 
@@ -27,4 +27,5 @@
 from sippy.SipAddressHF import SipAddressHF
 
 class SipReferTo(SipAddressHF):
+    __slots__ = ()
     hf_names = ('refer-to', 'r')
@@ -27,4 +27,5 @@
 from sippy.SipAddressHF import SipAddressHF
 
 class SipReferredBy(SipAddressHF):
+    __slots__ = ()
     hf_names = ('referred-by',)
@@ -27,17 +27,15 @@
 from sippy.SipGenericHF import SipGenericHF
 
 class SipReplaces(SipGenericHF):
+    __slots__ = ('call_id', 'from_tag', 'to_tag', 'early_only', 'params')
     hf_names = ('replaces',)
-    call_id = None
-    from_tag = None
-    to_tag = None
-    early_only = False
-    params = None
 
     def __init__(self, body = None, call_id = None, from_tag = None, to_tag = None, \
       early_only = False, params = None):
         SipGenericHF.__init__(self, body)
         if body != None:
+            self.call_id = self.from_tag = self.to_tag = self.params = None
+            self.early_only = False
             return
         self.parsed = True
         self.params = []
@@ -29,15 +29,16 @@ from sippy.SipHeader import SipHeader
 from sippy.SipCSeq import SipCSeq
 from sippy.SipTo import SipTo
 from sippy.SipResponse import SipResponse
-from sippy.SipURL import SipURL
+from sippy.SipURL import parse_sipurl
 from sippy.SipAddress import SipAddress
 from sippy.SipExpires import SipExpires
 from sippy.ESipParseException import ESipParseException
 
 class SipRequest(SipMsg):
-    method = None
-    ruri = None
-    sipver = None
+    __method = None
+    __ruri = None
+    __rawruri = None
+    __sipver = None
     user_agent = None
 
     def __init__(self, buf = None, method = None, ruri = None, sipver = 'SIP/2.0', to = None, fr0m = None, via = None, cseq = None, \
@@ -92,20 +93,65 @@ class SipRequest(SipMsg):
             self.setBody(body)
 
     def setSL(self, startline):
-        self.method, ruri, self.sipver = startline.split()
-        self.ruri = SipURL(ruri)
+        # Only keep the raw start line here, splitting it and parsing
+        # Request-URI is deferred until something actually needs those.
+        self.startline = startline
+        self.__method = self.__ruri = self.__rawruri = self.__sipver = None
+
+    def __splitSL(self):
+        self.__method, self.__rawruri, self.__sipver = self.startline.split()
+
+    def __detachSL(self):
+        # Raw start line can't be used anymore once any of its parts
+        # could have been modified.
+        if self.startline == None:
+            return
+        if self.__method == None:
+            self.__splitSL()
+        self.startline = None
 
     def getSL(self):
-        return self.method + ' ' + str(self.ruri) + ' ' + self.sipver
+        if self.startline != None:
+            return self.startline
+        if self.__ruri != None:
+            ruri = str(self.__ruri)
+        else:
+            ruri = self.__rawruri
+        return self.__method + ' ' + ruri + ' ' + self.__sipver
 
     def getMethod(self):
-        return self.method
+        if self.__method == None and self.startline != None:
+            self.__splitSL()
+        return self.__method
+
+    def setMethod(self, method):
+        self.__detachSL()
+        self.__method = method
 
     def getRURI(self):
-        return self.ruri
+        self.__detachSL()
+        if self.__ruri == None and self.__rawruri != None:
+            self.__ruri = parse_sipurl(self.__rawruri)
+            self.__rawruri = None
+        return self.__ruri
 
     def setRURI(self, ruri):
-        self.ruri = ruri
+        self.__detachSL()
+        self.__ruri = ruri
+        self.__rawruri = None
+
+    def getSipVer(self):
+        if self.__sipver == None and self.startline != None:
+            self.__splitSL()
+        return self.__sipver
+
+    def setSipVer(self, sipver):
+        self.__detachSL()
+        self.__sipver = sipver
+
+    method = property(getMethod, setMethod)
+    ruri = property(getRURI, setRURI)
+    sipver = property(getSipVer, setSipVer)
 
     def genResponse(self, scode, reason, body = None, server = None):
         # Should be done at the transaction level
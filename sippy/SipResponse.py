@@ -28,17 +28,19 @@ from sippy.SipMsg import SipMsg
 from sippy.SipHeader import SipHeader
 
 class SipResponse(SipMsg):
-    scode = None
-    reason = None
-    sipver = None
+    __scode = None
+    __reason = None
+    __sipver = None
+    __body_pending = False
     lossemul = 0
 
     def __init__(self, buf = None, scode = None, reason = None, sipver = None, to = None, fr0m = None, callid = None, vias = None,
                  cseq = None, body = None, rrs = (), server = None):
         SipMsg.__init__(self, buf)
         if buf != None:
-            if self.scode > 100 and self.scode < 400:
-                SipMsg.init_body(self)
+            # Whether the body needs to be looked at depends on the
+            # status code, so it's deferred until the getBody()
+            self.__body_pending = True
             return
         self.scode, self.reason, self.sipver = scode, reason, sipver
         if vias != None:
@@ -54,24 +56,80 @@ class SipResponse(SipMsg):
             self.setBody(body)
 
     def setSL(self, startline):
-        sstartline = startline.split(None, 2)
+        # Status line is parsed lazily, see __parseSL()
+        self.startline = startline
+        self.__scode = self.__reason = self.__sipver = None
+
+    def __parseSL(self):
+        sstartline = self.startline.split(None, 2)
         if len(sstartline) == 2:
             # Some brain-damaged UAs don't include reason in some cases
-            self.sipver, scode = sstartline
-            self.reason = 'Unspecified'
+            self.__sipver, scode = sstartline
+            self.__reason = 'Unspecified'
         else:
-            self.sipver, scode, self.reason = startline.split(None, 2)
-        self.scode = int(scode)
+            self.__sipver, scode, self.__reason = sstartline
+        self.__scode = int(scode)
+
+    def __detachSL(self):
+        if self.startline == None:
+            return
+        if self.__scode == None:
+            self.__parseSL()
+        self.startline = None
 
     def setSCode(self, scode, reason):
-        self.scode = scode
-        self.reason = reason
+        self.__detachSL()
+        self.__scode = scode
+        self.__reason = reason
 
     def getSL(self):
-        return self.sipver + ' ' + str(self.scode) + ' ' + self.reason
+        if self.startline != None:
+            return self.startline
+        return self.__sipver + ' ' + str(self.__scode) + ' ' + self.__reason
 
     def getSCode(self):
-        return (self.scode, self.reason)
+        if self.__scode == None and self.startline != None:
+            self.__parseSL()
+        return (self.__scode, self.__reason)
+
+    def __getSCode(self):
+        return self.getSCode()[0]
+
+    def __setSCode(self, scode):
+        self.__detachSL()
+        self.__scode = scode
+
+    def __getReason(self):
+        return self.getSCode()[1]
+
+    def __setReason(self, reason):
+        self.__detachSL()
+        self.__reason = reason
+
+    def getBody(self):
+        if self.__body_pending:
+            scode = self.getSCode()[0]
+            if scode > 100 and scode < 400:
+                SipMsg.init_body(self)
+            self.__body_pending = False
+        return self.body
+
+    def setBody(self, body):
+        self.__body_pending = False
+        self.body = body
+
+    def getSipVer(self):
+        if self.__scode == None and self.startline != None:
+            self.__parseSL()
+        return self.__sipver
+
+    def setSipVer(self, sipver):
+        self.__detachSL()
+        self.__sipver = sipver
+
+    scode = property(__getSCode, __setSCode)
+    reason = property(__getReason, __setReason)
+    sipver = property(getSipVer, setSipVer)
 
     def getCopy(self):
         cself = SipMsg.getCopy(self)
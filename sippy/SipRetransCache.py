@@ -0,0 +1,158 @@
+# Copyright (c) 2006-2014 Sippy Software, Inc. All rights reserved.
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from collections import OrderedDict
+
+def fingerprint(data):
+    '''
+    Cheap fingerprint of the received datagram. Python's hash() of bytes
+    is keyed with a random per-process seed (SipHash), so it is not
+    possible to craft collisions from the outside, while being much
+    faster than md5 and producing a small int instead of 16-byte string.
+    '''
+    return hash(data)
+
+class _Drop(object):
+    # Shared "drop only" marker
+    __slots__ = ()
+    data = None
+
+class SipRetransCache(object):
+    '''
+    Cache of the received datagrams mapped to the data that has to be
+    sent back if the same datagram is received again. Entries are kept
+    for two generations, the rotate() is to be called periodically to
+    age them out. Both the number of entries and the total size of
+    the data kept are capped, once either cap is reached the oldest
+    entries are evicted in the insertion order.
+
+    Datagrams that should be silently dropped when seen again are stored
+    with the DROP marker, which holds no per-entry data.
+    '''
+    DROP = _Drop()
+    maxsize = None
+    maxbytes = None
+    nbytes = 0
+    hits = 0
+    misses = 0
+    evictions = 0
+    l1 = None
+    l2 = None
+
+    def __init__(self, maxsize = 100000, maxbytes = 64 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.l1 = OrderedDict()
+        self.l2 = OrderedDict()
+
+    def get(self, key):
+        retrans = self.l1.get(key, None)
+        if retrans == None:
+            retrans = self.l2.get(key, None)
+            if retrans == None:
+                self.misses += 1
+                return None
+        self.hits += 1
+        return retrans
+
+    def put(self, key, retrans):
+        # Re-inserted entries move to the end of the eviction queue
+        self.remove(key)
+        self.l1[key] = retrans
+        if retrans.data != None:
+            self.nbytes += len(retrans.data)
+        while len(self.l1) + len(self.l2) > self.maxsize or self.nbytes > self.maxbytes:
+            if len(self.l2) > 0:
+                self.__evict(self.l2)
+            elif len(self.l1) > 0:
+                self.__evict(self.l1)
+            else:
+                break
+
+    def drop(self, key):
+        self.put(key, self.DROP)
+
+    def remove(self, key):
+        for cache in (self.l1, self.l2):
+            retrans = cache.pop(key, None)
+            if retrans != None:
+                self.__discount(retrans)
+
+    def __evict(self, cache):
+        key, retrans = cache.popitem(last = False)
+        self.__discount(retrans)
+        self.evictions += 1
+
+    def __discount(self, retrans):
+        if retrans.data != None:
+            self.nbytes -= len(retrans.data)
+
+    def rotate(self):
+        for retrans in self.l2.values():
+            self.__discount(retrans)
+        self.l2 = self.l1
+        self.l1 = OrderedDict()
+
+    def __len__(self):
+        return len(self.l1) + len(self.l2)
+
+    def clear(self):
+        self.l1 = OrderedDict()
+        self.l2 = OrderedDict()
+        self.nbytes = 0
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __str__(self):
+        return 'retransmit cache: size %d/%d, bytes %d/%d, hits %d, misses %d, ' \
+          'evictions %d' % (len(self), self.maxsize, self.nbytes, self.maxbytes, \
+          self.hits, self.misses, self.evictions)
+
+if __name__ == '__main__':
+    class Retrans(object):
+        def __init__(self, data):
+            self.data = data
+
+    rc = SipRetransCache(maxsize = 3, maxbytes = 10)
+    rc.drop(fingerprint(b'a'))
+    rc.put(fingerprint(b'b'), Retrans('12345'))
+    rc.rotate()
+    assert rc.get(fingerprint(b'a')) is rc.DROP
+    rc.put(fingerprint(b'c'), Retrans('123456'))
+    # Byte cap reached, "b" is the oldest one with data, but "a" goes first
+    assert rc.get(fingerprint(b'b')) == None and rc.nbytes == 6
+    rc.put(fingerprint(b'c'), Retrans('1234'))
+    rc.drop(fingerprint(b'd'))
+    rc.drop(fingerprint(b'e'))
+    rc.drop(fingerprint(b'f'))
+    assert len(rc) == 3 and rc.nbytes == 0 and rc.get(fingerprint(b'c')) == None
+    rc.rotate()
+    rc.rotate()
+    assert len(rc) == 0
+    assert (rc.hits, rc.misses, rc.evictions) == (1, 2, 3)
+    print(rc)
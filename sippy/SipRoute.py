@@ -27,6 +27,7 @@
 from sippy.SipFrom import SipFrom
 
 class SipRoute(SipFrom):
+    __slots__ = ()
     hf_names = ('route',)
     relaxedparser = False
 
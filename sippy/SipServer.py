@@ -28,8 +28,8 @@ from sippy.SipGenericHF import SipGenericHF
 from sippy.SipConf import SipConf
 
 class SipServer(SipGenericHF):
+    __slots__ = ('name',)
     hf_names = ('server',)
-    name = None
 
     def __init__(self, body = None, name = None):
         SipGenericHF.__init__(self, body)
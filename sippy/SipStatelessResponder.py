@@ -0,0 +1,162 @@
+# Copyright (c) 2006-2014 Sippy Software, Inc. All rights reserved.
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from sippy.SipHeader import hf_cnames
+from sippy.SipVia import SipVia
+
+class SipStatelessResponder(object):
+    '''
+    Answers trivial out-of-dialog requests (OPTIONS pings, keepalive
+    NOTIFYs and such) straight from the raw datagram, without building
+    the SipRequest or creating any transaction state. The response is
+    rendered from the pre-built template, only Via, From, To, Call-ID
+    and CSeq are copied over from the request. To be registered with the
+    SipTransactionManager.regResponder() for each method it serves.
+
+    If the rate is set, each source IP is allowed that many responses
+    per second on average with bursts of up to the burst, requests over
+    the limit are silently dropped.
+    '''
+    scode = None
+    reason = None
+    rate = 0
+    burst = 0
+    maxsources = None
+    answered = 0
+    dropped = 0
+    buckets = None
+    tmpl_head = None
+    tmpl_tail = None
+
+    def __init__(self, scode = 200, reason = 'OK', extra_headers = (), rate = 0, \
+      burst = None, maxsources = 10000):
+        self.scode = scode
+        self.reason = reason
+        self.rate = float(rate)
+        if burst == None:
+            burst = max(rate, 1)
+        self.burst = float(burst)
+        self.maxsources = maxsources
+        self.buckets = {}
+        self.tmpl_head = 'SIP/2.0 %d %s\r\n' % (scode, reason)
+        self.tmpl_tail = ''.join(['%s\r\n' % str(x) for x in extra_headers]) + \
+          'Content-Length: 0\r\n\r\n'
+
+    def allow(self, source, now):
+        if self.rate <= 0:
+            return True
+        bucket = self.buckets.get(source, None)
+        if bucket == None:
+            if len(self.buckets) >= self.maxsources:
+                self.__expire(now)
+            self.buckets[source] = [self.burst - 1.0, now]
+            return True
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1.0:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1.0
+        return True
+
+    def __expire(self, now):
+        # Forget sources whose buckets have been refilled up already,
+        # start from scratch if that is not enough (i.e. under flood
+        # from a lot of addresses).
+        for source, (tokens, ts) in list(self.buckets.items()):
+            if tokens + (now - ts) * self.rate >= self.burst:
+                del self.buckets[source]
+        if len(self.buckets) >= self.maxsources:
+            self.buckets.clear()
+
+    def respond(self, tkey, address, rtime, fixupVia):
+        '''
+        Returns (data, address) to be sent back or None if the request
+        should be dropped. The fixupVia is invoked on the topmost Via
+        to add received/rport, just like for the fully parsed requests.
+        '''
+        if not self.allow(address[0], rtime.monot):
+            self.dropped += 1
+            return None
+        vias = []
+        hfs = {}
+        for line in tkey.lines[1:]:
+            name, body = line.split(':', 1)
+            cname = hf_cnames.get(name.strip().lower(), None)
+            if cname == 'via':
+                vias.append((name, body))
+            elif cname in ('from', 'to', 'call-id', 'cseq') and not cname in hfs:
+                hfs[cname] = line.rstrip()
+        name, body = vias[0]
+        vbodys = body.strip().split(',')
+        via0 = SipVia(vbodys[0])
+        via0.parse()
+        fixupVia(via0, address)
+        vias[0] = (name, ' ' + ','.join([str(via0)] + vbodys[1:]))
+        tag = '%x' % (hash((tkey.call_id, tkey.ftag, tkey.branches[0])) & 0xffffffffffff)
+        data = self.tmpl_head + ''.join(['%s:%s\r\n' % x for x in vias]) + hfs['from'] + \
+          '\r\n' + hfs['to'] + ';tag=' + tag + '\r\n' + hfs['call-id'] + '\r\n' + \
+          hfs['cseq'] + '\r\n' + self.tmpl_tail
+        self.answered += 1
+        return (data.encode('utf-8'), via0.getTAddr())
+
+    def __str__(self):
+        return 'stateless %d %s: answered %d, dropped %d, sources %d' % (self.scode, \
+          self.reason, self.answered, self.dropped, len(self.buckets))
+
+if __name__ == '__main__':
+    from sippy.SipTransactionKey import preparse_tkey
+    from sippy.SipResponse import SipResponse
+    from sippy.SipHeader import SipHeader
+    from sippy.Time.MonoTime import MonoTime
+
+    options = 'OPTIONS sip:192.0.2.1 SIP/2.0\r\n' \
+      'v: SIP/2.0/UDP 192.0.2.2:5060;branch=z9hG4bK-ping1;rport,SIP/2.0/UDP 192.0.2.3\r\n' \
+      'From: <sip:ping@192.0.2.2>;tag=1234\r\n' \
+      'To: <sip:192.0.2.1>\r\n' \
+      'Call-ID: ping-1@192.0.2.2\r\n' \
+      'CSeq: 7 OPTIONS\r\n' \
+      'Max-Forwards: 70\r\n' \
+      'Content-Length: 0\r\n\r\n'
+    def fixupVia(via0, address):
+        via0.setParam('received', address[0])
+        via0.setParam('rport', str(address[1]))
+    sr = SipStatelessResponder(extra_headers = (SipHeader(name = 'allow', \
+      bodys = 'INVITE, ACK, CANCEL, BYE, OPTIONS'),), rate = 1, burst = 2)
+    tkey = preparse_tkey(options.encode())
+    rtime = MonoTime()
+    data, address = sr.respond(tkey, ('203.0.113.1', 1234), rtime, fixupVia)
+    assert address == ('203.0.113.1', 1234)
+    resp = SipResponse(data)
+    assert resp.getSCode() == (200, 'OK')
+    assert resp.getTId(True, True) == tkey.getTId(True, True)
+    assert len(resp.getHFs('via')) == 2 and resp.getHFBody('to').getTag() != None
+    assert resp.getHFBody('allow') != None
+    # Burst of 2 from the same source, then the limit kicks in
+    assert sr.respond(tkey, ('203.0.113.1', 1234), rtime, fixupVia) != None
+    assert sr.respond(tkey, ('203.0.113.1', 1234), rtime, fixupVia) == None
+    assert sr.respond(tkey, ('203.0.113.2', 1234), rtime, fixupVia) != None
+    print(sr)
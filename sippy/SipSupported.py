@@ -29,11 +29,12 @@ from sippy.SipGenericHF import SipGenericHF
 from functools import reduce
 
 class SipSupported(SipGenericHF):
+    __slots__ = ('caps',)
     hf_names = ('supported',)
-    caps = None
 
     def __init__(self, body = None, caps = None):
         SipGenericHF.__init__(self, body)
+        self.caps = None
         if body == None:
             self.parsed = True
             self.caps = caps[:]
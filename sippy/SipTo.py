@@ -27,6 +27,7 @@
 from sippy.SipFrom import SipFrom
 
 class SipTo(SipFrom):
+    __slots__ = ()
     hf_names = ('to', 't')
     relaxedparser = True
 
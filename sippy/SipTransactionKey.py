@@ -0,0 +1,186 @@
+# Copyright (c) 2006-2014 Sippy Software, Inc. All rights reserved.
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from sippy.SipHeader import hf_cnames
+from sippy.SipAddress import findquotes
+
+class SipTransactionKey(object):
+    '''
+    Transaction matching keys of the message, pulled out of the raw
+    datagram without building the SipRequest/SipResponse, see the
+    preparse_tkey(). The getTId()/getTIds() return exactly the same
+    values as their SipMsg counterparts.
+    '''
+    __slots__ = ('method', 'scode', 'call_id', 'ftag', 'ttag', 'cseq', 'cseq_method', \
+      'branches', 'lines')
+
+    def __init__(self):
+        self.method = None
+        self.scode = None
+        self.call_id = None
+        self.ftag = None
+        self.ttag = None
+        self.cseq = None
+        self.cseq_method = None
+        self.branches = []
+        self.lines = None
+
+    def getTId(self, wCSM = False, wBRN = False, wTTG = False):
+        rval = [self.call_id, self.ftag, self.cseq]
+        if wCSM:
+            rval.append(self.cseq_method)
+        if wBRN:
+            rval.append(self.branches[0])
+        if wTTG:
+            rval.append(self.ttag)
+        return tuple(rval)
+
+    def getTIds(self):
+        return tuple([(self.call_id, self.ftag, self.cseq, self.cseq_method, x) \
+          for x in self.branches])
+
+# The helpers below mirror what SipVia and SipAddress do, but raise
+# ValueError on anything that only the full parser could get right.
+
+def _via_branch(body):
+    hostname = body.split(None, 1)[1]
+    branch = None
+    for param in hostname.split(';')[1:]:
+        sparam = param.strip().split('=', 1)
+        if sparam[0] == 'branch':
+            branch = sparam[1] if len(sparam) == 2 else None
+    return branch
+
+def _address_tag(address):
+    if address.find(',') != -1:
+        raise ValueError('possibly multiple addresses')
+    if address.lower().startswith('sip:') and address.find('<') == -1:
+        parts = address.split(';', 1)
+        if len(parts) == 1:
+            return None
+        paramstring = parts[1]
+    elif address.startswith('"'):
+        qpos = findquotes(address)
+        if len(qpos) != 1:
+            raise ValueError('quotes in display name')
+        url = address[qpos[0] + 1:].strip()
+        if url.startswith('<'):
+            url = url[1:]
+        paramstring = url.split('>', 1)[1].strip()
+    else:
+        paramstring = address.split('<', 1)[1].split('>', 1)[1].strip()
+    tag = None
+    for l in paramstring.split(';'):
+        k_v = l.split('=', 1)
+        if k_v[0] == 'tag':
+            tag = k_v[1] if len(k_v) == 2 else None
+    return tag
+
+# First letters of the full and compact names of the headers we need,
+# lines that start with anything else are not looked at
+_key_initials = frozenset([y for x, cname in hf_cnames.items() \
+  if cname in ('via', 'call-id', 'cseq', 'from', 'to') for y in (x[0], x[0].upper())])
+
+def preparse_tkey(buf):
+    '''
+    Extract Call-ID, CSeq, From/To tags and Via branches from the raw
+    message. Returns SipTransactionKey or None if the message has
+    anything unusual in it (folded lines, quoted display names etc), in
+    which case the caller should fall back to the full parse.
+    '''
+    try:
+        for bdel in (b'\r\n\r\n', b'\r\r', b'\n\n'):
+            boff = buf.find(bdel)
+            if boff != -1:
+                buf = buf[:boff]
+                break
+        lines = buf.decode('utf-8').splitlines()
+        tkey = SipTransactionKey()
+        tkey.lines = lines
+        sline = lines[0]
+        if sline.startswith('SIP/2.0 '):
+            tkey.scode = int(sline.split(None, 2)[1])
+        else:
+            tkey.method, ruri, sipver = sline.split()
+        cseq = fbody = tbody = None
+        for i in range(1, len(lines)):
+            line = lines[i]
+            if line[:1] not in _key_initials:
+                if line[:1] in (' ', '\t', ''):
+                    return None
+                continue
+            name, body = line.split(':', 1)
+            cname = hf_cnames.get(name.strip().lower(), None)
+            if cname == 'via':
+                tkey.branches.extend([_via_branch(x) for x in body.strip().split(',')])
+            elif cname == 'call-id':
+                if tkey.call_id == None:
+                    tkey.call_id = body.strip()
+            elif cname == 'cseq':
+                if cseq == None:
+                    cseq = body.split()
+            elif cname == 'from':
+                if fbody == None:
+                    fbody = body.strip()
+            elif cname == 'to':
+                if tbody == None:
+                    tbody = body.strip()
+        if tkey.call_id == None or len(tkey.branches) == 0:
+            return None
+        cseq, tkey.cseq_method = cseq
+        tkey.cseq = int(cseq)
+        tkey.ftag = _address_tag(fbody)
+        tkey.ttag = _address_tag(tbody)
+    except (ValueError, IndexError, TypeError, AttributeError):
+        return None
+    return tkey
+
+if __name__ == '__main__':
+    from sippy.SipRequest import SipRequest
+    from sippy.SipResponse import SipResponse
+
+    invite = 'INVITE sip:bob@biloxi.example.com SIP/2.0\r\n' \
+      'Via: SIP/2.0/UDP 192.0.2.2:5060;branch=z9hG4bK-proxy1\r\n' \
+      'v: SIP/2.0/UDP 192.0.2.3:5060 ; branch=z9hG4bK-proxy2,SIP/2.0/UDP pc33;rport\r\n' \
+      'To: Bob <sip:bob@biloxi.example.com>\r\n' \
+      'f: <sip:alice@atlanta.example.com;tag=uri>;tag=1928301774\r\n' \
+      'i: a84b4c76e66710@pc33.example.com\r\n' \
+      'CSeq: 101 INVITE\r\n' \
+      'Content-Length: 0\r\n\r\n'
+    resp = 'SIP/2.0 180 Ringing\r\n' + invite.split('\r\n', 1)[1] \
+      .replace('To: Bob <sip:bob@biloxi.example.com>', 'To: sip:bob@biloxi.example.com;tag=xyz') \
+      .replace('f: <', 'f: "A. \\"Smith\\" ;tag=no"<')
+    for data, mclass in ((invite, SipRequest), (resp, SipResponse)):
+        tkey = preparse_tkey(data.encode())
+        msg = mclass(data)
+        for args in ((True, True), (False, False, True), (False, True)):
+            assert tkey.getTId(*args) == msg.getTId(*args)
+        assert tkey.getTIds() == msg.getTIds()
+    assert tkey.scode == 180 and tkey.ttag == 'xyz'
+    # Anything unusual is left to the full parser
+    for s in ('"Bob "B"" <', 'Bob <sip:bob@biloxi.example.com>\r\n <'):
+        assert preparse_tkey(invite.replace('Bob <', s, 1).encode()) == None
+    assert preparse_tkey(b'garbage') == None
+    print('passed')
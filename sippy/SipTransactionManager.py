@@ -25,20 +25,24 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from sippy.Core.Exceptions import dump_exception
+from sippy.Core.PriorityLanes import PriorityLanes
 from sippy.Time.MonoTime import MonoTime
 from sippy.Time.Timeout import Timeout
 from sippy.SipHeader import SipHeader
 from sippy.SipResponse import SipResponse
 from sippy.SipRequest import SipRequest
+from sippy.SipTransactionKey import preparse_tkey
+from sippy.SipRetransCache import SipRetransCache, fingerprint
 from sippy.SipAddress import SipAddress
 from sippy.SipRoute import SipRoute
 from sippy.SipHeader import SipHeader
 from sippy.ESipParseException import ESipParseException
 from datetime import datetime
-from hashlib import md5
 from traceback import print_exc
 from functools import reduce
-import sys, socket
+from itertools import islice
+from collections import OrderedDict
+import sys, socket, re
 
 class NETS_1918(object):
     nets = (('10.0.0.0', 0xffffffff << 24), ('172.16.0.0',  0xffffffff << 20), ('192.168.0.0', 0xffffffff << 16))
@@ -66,16 +70,20 @@ class SipTransactionConsumer(object):
         self.cobj = None
 
 class SipTransaction(object):
-    tout = None
-    tid = None
-    address = None
-    data = None
-    checksum = None
-    cb_ifver = None
-    uack = False
-    compact = False
-    req_out_cb = None
-    res_out_cb = None
+    __slots__ = ('tout', 'tid', 'address', 'data', 'checksum', 'cb_ifver', 'uack', \
+      'compact', 'req_out_cb', 'res_out_cb', 'state', 'method', 'rtime', 'userv', \
+      'fcode', 'expires', 'needack', 'branch', 'ack', 'ack_checksum', 'ack_rAddr', \
+      'cancel', 'cancelPending', 'user_agent', 'r487', 'resp_cb', 'ack_cb', 'noack_cb', \
+      'cancel_cb', 'teA', 'teB', 'teC', 'teD', 'teE', 'teF', 'teG', 'ruri', 'sipver', \
+      'fr0m', 'to', 'via', 'callid', 'cseq', 'routes', 'maxforwards')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+        self.uack = False
+        self.compact = False
+        self.needack = False
+        self.cancelPending = False
 
     def cleanup(self):
         self.ack = None
@@ -89,7 +97,6 @@ class SipTransaction(object):
         self.teA = self.teB = self.teC = self.teD = self.teE = self.teF = self.teG = None
         self.tid = None
         self.userv = None
-        self.r408 = None
         self.req_out_cb = None
         self.res_out_cb = None
 
@@ -115,6 +122,31 @@ class UACK(SipTransactionState):
     # UAC wants to generate ACK at its own discretion
     pass
 
+# With the priority_lanes on, inbound datagrams are dispatched in the
+# priority lanes: responses and in-dialog requests go first, so that the
+# established calls are kept healthy when there are more new calls than
+# we can handle. CANCEL goes along with the initial requests, so it never
+# overtakes its INVITE.
+SIP_LANE_RESPONSE = 0
+SIP_LANE_INDIALOG = 1
+SIP_LANE_INITIAL = 2
+SIP_LANE_OPTIONS = 3
+SIP_LANE_WEIGHTS = (4, 4, 2, 1)
+
+_to_tag = re.compile(br'\n(?:to|t)[ \t]*:[^\r\n]*;[ \t]*tag[ \t]*=', re.IGNORECASE)
+# Transport of the topmost Via
+_via_transport = re.compile(br'(\n(?:via|v)[ \t]*:[ \t]*SIP[ \t]*/[ \t]*2\.0[ \t]*/[ \t]*)' \
+  br'[A-Za-z]+', re.IGNORECASE)
+
+def sip_lane(data):
+    if data.startswith(b'SIP/2.0 '):
+        return SIP_LANE_RESPONSE
+    if _to_tag.search(data) != None:
+        return SIP_LANE_INDIALOG
+    if data.startswith(b'OPTIONS '):
+        return SIP_LANE_OPTIONS
+    return SIP_LANE_INITIAL
+
 class local4remote(object):
     global_config = None
     cache_r2l = None
@@ -126,17 +158,29 @@ class local4remote(object):
     ploss_out_rate = 0.0
     pdelay_out_max = 0.0
     nworkers_udp = None
+    lanes = None
+    pktinfo = False
+    tcp = False
+    cache_l2t = None
 
-    def __init__(self, global_config, handleIncoming, nworkers_udp = None):
+    def __init__(self, global_config, handleIncoming, nworkers_udp = None, lanes = None, \
+      pktinfo = False, tcp = False):
         if not '_xmpp_mode' in global_config or not global_config['_xmpp_mode']:
-            from sippy.Udp_server import Udp_server, Udp_server_opts
+            from sippy.Udp_server import Udp_server, Udp_server_opts, PKTINFO_SUPPORTED
             self.Udp_server_opts = Udp_server_opts
             self.udp_server_class = Udp_server
+            if pktinfo and not PKTINFO_SUPPORTED:
+                print(datetime.now(), 'local4remote: IP_PKTINFO is not supported on this ' \
+                  'platform, falling back to probing')
+                sys.stdout.flush()
+                pktinfo = False
         else:
+            pktinfo = False
             from sippy.XMPP_server import XMPP_server, XMPP_server_opts
             self.Udp_server_opts = XMPP_server_opts
             self.udp_server_class = XMPP_server
         self.nworkers_udp = nworkers_udp
+        self.lanes = lanes
         self.global_config = global_config
         self.cache_r2l = {}
         self.cache_r2l_old = {}
@@ -158,21 +202,59 @@ class local4remote(object):
         else:
             laddresses = ((global_config['_sip_address'], global_config['_sip_port']),)
             self.fixed = True
+            pktinfo = False
+        # With the IP_PKTINFO the wildcard sockets tell us local address
+        # each datagram has been received at and can send from any local
+        # address, so there is no need for per-address sockets.
+        self.pktinfo = pktinfo
+        self.tcp = tcp
+        self.cache_l2t = {}
         for laddress in laddresses:
             self.initServer(laddress)
+            if tcp:
+                self.initTcpServer(laddress)
 
     def initServer(self, laddress):
         sopts = self.Udp_server_opts(laddress, self.handleIncoming)
         sopts.ploss_out_rate = self.ploss_out_rate
         sopts.pdelay_out_max = self.pdelay_out_max
         sopts.nworkers = self.nworkers_udp
+        sopts.pktinfo = self.pktinfo
+        if self.lanes != None:
+            sopts.lanes = self.lanes
+            sopts.classify = sip_lane
         server = self.udp_server_class(self.global_config, sopts)
         self.cache_l2s[laddress] = server
         return server
 
+    def initTcpServer(self, laddress):
+        from sippy.Tcp_server import Tcp_server, Tcp_server_opts
+        sopts = Tcp_server_opts(laddress, self.handleIncoming)
+        if self.lanes != None:
+            sopts.lanes = self.lanes
+            sopts.classify = sip_lane
+        server = Tcp_server(self.global_config, sopts)
+        self.cache_l2t[laddress] = server
+        return server
+
+    def getTcpServer(self, userv):
+        # TCP counterpart of the UDP server, sending from the same local
+        # address
+        if self.fixed:
+            server = list(self.cache_l2t.values())[0]
+        else:
+            laddress = userv.uopts.getSIPaddr()
+            if laddress[0].startswith('['):
+                server = self.cache_l2t.get(('[::]', laddress[1]), None)
+            else:
+                server = self.cache_l2t.get(('0.0.0.0', laddress[1]), None)
+            if server == None:
+                return userv
+        return server.getView(userv.uopts.laddress[0])
+
     def getServer(self, address, is_local = False):
         if self.fixed:
-            return self.cache_l2s.items()[0][1]
+            return list(self.cache_l2s.values())[0]
         if not is_local:
             laddress = self.cache_r2l.get(address[0], None)
             if laddress == None:
@@ -181,6 +263,8 @@ class local4remote(object):
                     self.cache_r2l[address[0]] = laddress
             if laddress != None:
                 #print 'local4remot-1: local address for %s is %s' % (address[0], laddress[0])
+                if self.pktinfo:
+                    return self.getView(laddress)
                 return self.cache_l2s[laddress]
             if address[0].startswith('['):
                 family = socket.AF_INET6
@@ -202,22 +286,36 @@ class local4remote(object):
             self.cache_r2l[address[0]] = laddress
         else:
             laddress = address
+        if self.pktinfo:
+            return self.getView(laddress)
         server = self.cache_l2s.get(laddress, None)
         if server == None:
             server = self.initServer(laddress)
         #print 'local4remot-2: local address for %s is %s' % (address[0], laddress[0])
         return server
 
+    def getView(self, laddress):
+        # Wildcard server sending from the specified local address
+        if laddress[0].startswith('['):
+            wladdress, host = ('[::]', laddress[1]), laddress[0][1:-1]
+        else:
+            wladdress, host = ('0.0.0.0', laddress[1]), laddress[0]
+        wserver = self.cache_l2s.get(wladdress, None)
+        if wserver == None:
+            wserver = self.initServer(wladdress)
+        return wserver.getView(host)
+
+    def learn(self, address, server):
+        # Remember the local address the peer has reached us at, so that
+        # requests to it can be sent without probing.
+        self.cache_r2l[address[0]] = server.uopts.getSIPaddr()
+
     def rotateCache(self):
         self.cache_r2l_old = self.cache_r2l
         self.cache_r2l = {}
 
 class SipTMRetransmitO(object):
-    userv = None
-    data = None
-    address = None
-    call_id = None
-    lossemul = None
+    __slots__ = ('userv', 'data', 'address', 'call_id', 'lossemul')
 
     def __init__(self, userv = None, data = None, address = None,
       call_id = None, lossemul = None):
@@ -233,62 +331,102 @@ class SipTransactionManager(object):
     tclient = None
     tserver = None
     req_cb = None
-    l1rcache = None
-    l2rcache = None
+    rcache = None
     nat_traversal = False
     req_consumers = None
+    responders = None
     provisional_retr = 0
     ploss_out_rate = 0.0
     pdelay_out_max = 0.0
     nworkers_udp = None
+    priority_lanes = False
+    lanes = None
+    pktinfo = False
+    tcp_transport = False
+    tcp_threshold = 1300
+    # Caps on the number of client and server transactions and on the
+    # number of call-ids with registered consumers, 0 means no limit.
+    # When full, the oldest finished transaction is expired early: the
+    # client one that is waiting for the timer C after the 408 has been
+    # reported, or the server INVITE one that is waiting for the ACK, in
+    # which case the upper level gets its noack_cb() just like when the
+    # timer D fires. If there is none among the first evict_scan ones new
+    # transaction is rejected.
+    max_tclient = 0
+    max_tserver = 0
+    max_consumers = 0
+    evict_scan = 32
+    hwm_tclient = 0
+    hwm_tserver = 0
+    hwm_consumers = 0
+    nevicted = 0
+    nrejected = 0
 
     def __init__(self, global_config, req_cb = None):
         self.global_config = global_config
-        self.l4r = local4remote(global_config, self.handleIncoming, self.nworkers_udp)
+        if self.priority_lanes:
+            self.lanes = PriorityLanes(SIP_LANE_WEIGHTS)
+        self.l4r = local4remote(global_config, self.handleIncoming, self.nworkers_udp, \
+          self.lanes, self.pktinfo, self.tcp_transport)
         self.l4r.ploss_out_rate = self.ploss_out_rate
         self.l4r.pdelay_out_max = self.pdelay_out_max
-        self.tclient = {}
-        self.tserver = {}
+        self.tclient = OrderedDict()
+        self.tserver = OrderedDict()
         self.req_cb = req_cb
-        self.l1rcache = {}
-        self.l2rcache = {}
+        self.rcache = SipRetransCache()
         self.req_consumers = {}
+        self.responders = {}
         Timeout(self.rCachePurge, 32, -1)
 
     def handleIncoming(self, data_in, address, server, rtime):
         if len(data_in) < 32:
             return
         self.global_config['_sip_logger'].write('RECEIVED message from %s:%d:\n' % address, \
-          data_in.decode(errors = 'backslashreplace'), ltime = rtime.realt)
-        data = data_in.decode()
-        checksum = md5(data_in).digest()
-        retrans = self.l1rcache.get(checksum, None)
-        if retrans == None:
-            retrans = self.l2rcache.get(checksum, None)
+          data_in, ltime = rtime.realt)
+        checksum = fingerprint(data_in)
+        retrans = self.rcache.get(checksum)
         if retrans != None:
             if retrans.data == None:
                 return
             self.transmitData(retrans.userv, retrans.data, retrans.address, \
               lossemul = retrans.lossemul)
             return
-        if data.startswith('SIP/2.0 '):
+        # Pick transaction keys out of the raw data first, so that the
+        # retransmissions and strays can be dealt with without doing
+        # the full parse.
+        tkey = preparse_tkey(data_in)
+        if data_in.startswith(b'SIP/2.0 '):
+            if tkey != None and tkey.scode >= 100 and tkey.scode <= 999 and \
+              not tkey.getTId(True, True) in self.tclient:
+                self.rcache.drop(checksum)
+                return
             try:
-                resp = SipResponse(data)
+                resp = SipResponse(data_in)
                 tid = resp.getTId(True, True)
             except Exception as exception:
-                dump_exception('can\'t parse SIP response from %s:%d' % (address[0], address[1]), extra = data)
-                self.l1rcache[checksum] = SipTMRetransmitO()
+                dump_exception('can\'t parse SIP response from %s:%d' % (address[0], address[1]), \
+                  extra = data_in.decode(errors = 'backslashreplace'))
+                self.rcache.drop(checksum)
                 return
             if resp.getSCode()[0] < 100 or resp.getSCode()[0] > 999:
                 print(datetime.now(), 'invalid status code in SIP response from %s:%d:' % address)
-                print(data)
+                print(data_in.decode(errors = 'backslashreplace'))
                 sys.stdout.flush()
-                self.l1rcache[checksum] = SipTMRetransmitO()
+                self.rcache.drop(checksum)
                 return
             resp.rtime = rtime
             if not tid in self.tclient:
                 #print 'no transaction with tid of %s in progress' % str(tid)
-                self.l1rcache[checksum] = SipTMRetransmitO()
+                self.rcache.drop(checksum)
+                return
+            try:
+                # Body is parsed lazily, make sure it's sane before passing
+                # response up
+                resp.getBody()
+            except Exception as exception:
+                dump_exception('can\'t parse SIP response from %s:%d' % (address[0], address[1]), \
+                  extra = data_in.decode(errors = 'backslashreplace'))
+                self.rcache.drop(checksum)
                 return
             t = self.tclient[tid]
             if self.nat_traversal and resp.countHFs('contact') > 0 and not check1918(t.address[0]):
@@ -300,31 +438,30 @@ class SipTransactionManager(object):
             resp.setSource(address)
             self.incomingResponse(resp, t, checksum)
         else:
+            if tkey != None and self.matchRequest(tkey, checksum, address, server, rtime):
+                return
             try:
-                req = SipRequest(data)
+                req = SipRequest(data_in)
+                # Start line is parsed lazily, make sure it's sane
+                req.getMethod()
                 tids = req.getTIds()
             except Exception as exception:
                 if isinstance(exception, ESipParseException) and exception.sip_response != None:
                     self.transmitMsg(server, exception.sip_response, address, checksum)
-                dump_exception('can\'t parse SIP request from %s:%d' % (address[0], address[1]), extra = data)
-                self.l1rcache[checksum] = SipTMRetransmitO()
+                dump_exception('can\'t parse SIP request from %s:%d' % (address[0], address[1]), \
+                  extra = data_in.decode(errors = 'backslashreplace'))
+                self.rcache.drop(checksum)
                 return
             req.rtime = rtime
-            via0 = req.getHFBody('via')
-            ahost, aport = via0.getAddr()
-            rhost, rport = address
-            if self.nat_traversal and rport != aport and check1918(ahost):
+            if self.fixupVia(req.getHFBody('via'), address):
                 req.nated = True
-            if ahost != rhost:
-                via0.params['received'] = rhost
-            if 'rport' in via0.params or req.nated:
-                via0.params['rport'] = str(rport)
             if self.nat_traversal and req.countHFs('contact') > 0 and req.countHFs('via') == 1:
                 try:
                     cbody = req.getHFBody('contact')
                 except Exception as exception:
-                    dump_exception('can\'t parse SIP request from %s:%d: %s:' % (address[0], address[1]), extra = data)
-                    self.l1rcache[checksum] = SipTMRetransmitO()
+                    dump_exception('can\'t parse SIP request from %s:%d: %s:' % (address[0], address[1]), \
+                      extra = data_in.decode(errors = 'backslashreplace'))
+                    self.rcache.drop(checksum)
                     return
                 if not cbody.asterisk:
                     curl = cbody.getUrl()
@@ -334,6 +471,67 @@ class SipTransactionManager(object):
             req.setSource(address)
             self.incomingRequest(req, checksum, tids, server)
 
+    def isReliable(self, userv):
+        return self.l4r.tcp and userv.uopts.transport == 'TCP'
+
+    def getRespAddr(self, server, resp, source):
+        # Responses to the requests received over stream transport go back
+        # over the same connection (RFC 3261 18.2.2)
+        if self.isReliable(server):
+            return source
+        return resp.getHFBody('via').getTAddr()
+
+    def fixupVia(self, via0, address):
+        # Record actual source address of the request in the topmost Via,
+        # returns True if the sender appears to be behind NAT.
+        ahost, aport = via0.getAddr()
+        rhost, rport = address
+        nated = self.nat_traversal and rport != aport and check1918(ahost)
+        if ahost != rhost:
+            via0.setParam('received', rhost)
+        if 'rport' in via0.params or nated:
+            via0.setParam('rport', str(rport))
+        return nated
+
+    def matchRequest(self, tkey, checksum, address, server, rtime):
+        # Handle duplicates of the server transactions and stray ACKs the
+        # same way the incomingRequest() does, but using just the keys.
+        # Out-of-dialog requests that have stateless responder registered
+        # are answered right here. Returns False if the request needs the
+        # full processing.
+        for tid in tkey.getTIds():
+            if tid in self.tclient:
+                return False
+        if tkey.method != 'ACK':
+            t = self.tserver.get(tkey.getTId(wBRN = True), None)
+        else:
+            t = self.tserver.get(tkey.getTId(wTTG = True), None)
+        if t != None:
+            if tkey.method != t.method:
+                return False
+            if t.data != None:
+                self.transmitData(t.userv, t.data, t.address, checksum)
+            return True
+        if tkey.method == 'ACK':
+            print(datetime.now(), 'unmatched ACK transaction - ignoring')
+            sys.stdout.flush()
+            self.rcache.drop(checksum)
+            return True
+        responder = self.responders.get(tkey.method, None)
+        if responder != None and tkey.ttag == None and not tkey.call_id in self.req_consumers:
+            try:
+                rval = responder.respond(tkey, address, rtime, self.fixupVia)
+            except Exception as exception:
+                # Let the full parser deal with it
+                return False
+            if rval != None:
+                data, taddress = rval
+                if self.isReliable(server):
+                    taddress = address
+                self.transmitData(server, data, taddress)
+            return True
+        return False
+
     # 1. Client transaction methods
     def newTransaction(self, msg, resp_cb = None, laddress = None, userv = None, \
       cb_ifver = 1, compact = False, t = None):
@@ -356,7 +554,34 @@ class SipTransactionManager(object):
                 t.userv = self.l4r.getServer(laddress, is_local = True)
         else:
             t.userv = userv
-        t.data = msg.localStr(*t.userv.uopts.getSIPaddr(), compact = t.compact)
+        if self.l4r.tcp:
+            via0 = msg.getHFBody('via')
+            if via0.getTransport() != t.userv.uopts.transport:
+                via0.setTransport(t.userv.uopts.transport)
+        t.data = msg.localBytes(*t.userv.uopts.getSIPaddr(), compact = t.compact)
+        if self.l4r.tcp and userv == None and len(t.data) > self.tcp_threshold:
+            # Too large for UDP, see RFC 3261 18.1.1
+            tuserv = self.l4r.getTcpServer(t.userv)
+            if tuserv is not t.userv:
+                via0.setTransport(tuserv.uopts.transport)
+                if tuserv.uopts.getSIPaddr() == t.userv.uopts.getSIPaddr():
+                    # Only the transport in the topmost Via differs, no
+                    # need to render the whole message once again
+                    t.data = _via_transport.sub(br'\g<1>' + \
+                      tuserv.uopts.transport.encode(), t.data, 1)
+                else:
+                    t.data = msg.localBytes(*tuserv.uopts.getSIPaddr(), compact = t.compact)
+                t.userv = tuserv
+        t.user_agent = msg.user_agent
+        self.saveRequest(t, msg)
+        if not self.tableAdmit(self.tclient, self.max_tclient, TERMINATED, \
+          self.expireClient):
+            # Fail it locally, resp_cb is not expected to be called before
+            # we return
+            t.state = TERMINATED
+            t.resp_cb = resp_cb
+            t.teB = Timeout(self.timerL, 0.0, 1, t)
+            return t
         if t.method == 'INVITE':
             try:
                 t.expires = msg.getHFBody('expires').getNum()
@@ -365,22 +590,28 @@ class SipTransactionManager(object):
             except IndexError:
                 t.expires = 300
             t.needack = True
+            # Every INVITE that gets final response needs ACK, while
+            # CANCEL is generated on demand, see getCANCEL()
             t.ack = msg.genACK()
-            t.cancel = msg.genCANCEL()
         else:
             t.expires = 32
             t.needack = False
             t.ack = None
-            t.cancel = None
+        t.cancel = None
         t.cancelPending = False
         t.resp_cb = resp_cb
-        t.teA = Timeout(self.timerA, t.tout, 1, t)
-        if resp_cb != None:
-            t.r408 = msg.genResponse(408, 'Request Timeout')
+        if not self.isReliable(t.userv):
+            t.teA = Timeout(self.timerA, t.tout, 1, t)
+            # Re-armed from the timerA()
+            t.teA.rearm = True
+        else:
+            t.teA = None
         t.teB = Timeout(self.timerB, 32.0, 1, t)
         t.teC = None
         t.state = TRYING
         self.tclient[t.tid] = t
+        if len(self.tclient) > self.hwm_tclient:
+            self.hwm_tclient = len(self.tclient)
         self.transmitData(t.userv, t.data, t.address)
         if t.req_out_cb != None:
             t.req_out_cb(msg)
@@ -392,9 +623,42 @@ class SipTransactionManager(object):
         if t.state != RINGING:
             t.cancelPending = True
         else:
+            cancel = self.getCANCEL(t)
             if reason != None:
-                t.cancel.appendHeader(SipHeader(body = reason))
-            self.newTransaction(t.cancel, userv = t.userv)
+                cancel.appendHeader(SipHeader(body = reason))
+            self.newTransaction(cancel, userv = t.userv)
+
+    def saveRequest(self, t, msg):
+        # Keep copies of the few headers that CANCEL and locally generated
+        # responses are built from, the caller is free to modify the
+        # original message once it has been sent out
+        t.ruri = msg.ruri.getCopy()
+        t.sipver = msg.sipver
+        t.fr0m = msg.getHFBCopy('from')
+        t.to = msg.getHFBCopy('to')
+        t.via = msg.getHFBCopy('via')
+        t.callid = msg.getHFBCopy('call-id')
+        t.cseq = msg.getHFBody('cseq').getCSeqNum()
+        t.routes = msg.getHFBCopys('route')
+        maxforwards = msg.getHFBodys('max-forwards')
+        if len(maxforwards) > 0:
+            t.maxforwards = maxforwards[0].getCopy()
+        else:
+            t.maxforwards = None
+
+    def getRequest(self, t):
+        # Re-create headers-only version of the original request of the
+        # client transaction, genCANCEL() and genResponse() take copies
+        # of whatever they need from it
+        return SipRequest(method = t.method, ruri = t.ruri, sipver = t.sipver, \
+          fr0m = t.fr0m, to = t.to, via = t.via, callid = t.callid, cseq = t.cseq, \
+          maxforwards = t.maxforwards, routes = t.routes, target = t.address, \
+          user_agent = t.user_agent)
+
+    def getCANCEL(self, t):
+        if t.cancel == None:
+            t.cancel = self.getRequest(t).genCANCEL()
+        return t.cancel
 
     def incomingResponse(self, msg, t, checksum):
         # In those two states upper level already notified, only do ACK retransmit
@@ -409,20 +673,19 @@ class SipTransactionManager(object):
                 t.teA = None
 
         if t.state in (TRYING, RINGING):
-            if t.teB != None:
-                t.teB.cancel()
-                t.teB = None
-
             if msg.getSCode()[0] < 200:
                 # Privisional response - leave everything as is, except that
                 # change state and reload timeout timer
                 if t.state == TRYING:
                     t.state = RINGING
                     if t.cancelPending:
-                        self.newTransaction(t.cancel, userv = t.userv)
+                        self.newTransaction(self.getCANCEL(t), userv = t.userv)
                         t.cancelPending = False
-                t.teB = Timeout(self.timerB, t.expires, 1, t)
-                self.l1rcache[checksum] = SipTMRetransmitO()
+                if t.teB != None:
+                    t.teB.reschedule(t.expires)
+                else:
+                    t.teB = Timeout(self.timerB, t.expires, 1, t)
+                self.rcache.drop(checksum)
                 if t.resp_cb != None:
                     if t.cb_ifver == 1:
                         t.resp_cb(msg)
@@ -430,6 +693,9 @@ class SipTransactionManager(object):
                         t.resp_cb(msg, t)
             else:
                 # Final response - notify upper layer and remove transaction
+                if t.teB != None:
+                    t.teB.cancel()
+                    t.teB = None
                 if t.needack:
                     # Prepare and send ACK if necessary
                     fcode = msg.getSCode()[0]
@@ -473,10 +739,10 @@ class SipTransactionManager(object):
                         t.state = UACK
                         t.ack_rAddr = rAddr
                         t.ack_checksum = checksum
-                        self.l1rcache[checksum] = SipTMRetransmitO()
+                        self.rcache.drop(checksum)
                         t.teG = Timeout(self.timerG, 64, 1, t)
                 else:
-                    self.l1rcache[checksum] = SipTMRetransmitO()
+                    self.rcache.drop(checksum)
                 if t.resp_cb != None:
                     if t.cb_ifver == 1:
                         t.resp_cb(msg)
@@ -491,7 +757,7 @@ class SipTransactionManager(object):
         #print 'timerA', t
         self.transmitData(t.userv, t.data, t.address)
         t.tout *= 2
-        t.teA = Timeout(self.timerA, t.tout, 1, t)
+        t.teA.reschedule(t.tout)
 
     def timerB(self, t):
         #print 'timerB', t
@@ -504,11 +770,12 @@ class SipTransactionManager(object):
         t.teC = Timeout(self.timerC, 32.0, 1, t)
         if t.resp_cb == None:
             return
-        t.r408.rtime = MonoTime()
+        r408 = self.getRequest(t).genResponse(408, 'Request Timeout')
+        r408.rtime = MonoTime()
         if t.cb_ifver == 1:
-            t.resp_cb(t.r408)
+            t.resp_cb(r408)
         else:
-            t.resp_cb(t.r408, t)
+            t.resp_cb(r408, t)
         #try:
         #    t.resp_cb(SipRequest(t.data).genResponse(408, 'Request Timeout'))
         #except:
@@ -521,6 +788,18 @@ class SipTransactionManager(object):
         del self.tclient[t.tid]
         t.cleanup()
 
+    def timerL(self, t):
+        # Transaction has been rejected locally due to the tclient being full
+        t.teB = None
+        if t.resp_cb != None:
+            r503 = self.getRequest(t).genResponse(503, 'Service Unavailable')
+            r503.rtime = MonoTime()
+            if t.cb_ifver == 1:
+                t.resp_cb(r503)
+            else:
+                t.resp_cb(r503, t)
+        t.cleanup()
+
     # 2. Server transaction methods
     def incomingRequest(self, msg, checksum, tids, server):
         for tid in tids:
@@ -562,17 +841,25 @@ class SipTransactionManager(object):
                 if t.ack_cb != None:
                     t.ack_cb(msg)
                 t.cleanup()
-                self.l1rcache[checksum] = SipTMRetransmitO()
+                self.rcache.drop(checksum)
         elif msg.getMethod() == 'ACK':
             # Some ACK that doesn't match any existing transaction.
             # Drop and forget it - upper layer is unlikely to be interested
             # to seeing this anyway.
             print(datetime.now(), 'unmatched ACK transaction - ignoring')
             sys.stdout.flush()
-            self.l1rcache[checksum] = SipTMRetransmitO()
+            self.rcache.drop(checksum)
         elif msg.getMethod() == 'CANCEL':
             resp = msg.genResponse(481, 'Call Leg/Transaction Does Not Exist')
-            self.transmitMsg(server, resp, resp.getHFBody('via').getTAddr(), checksum)
+            self.transmitMsg(server, resp, self.getRespAddr(server, resp, msg.getSource()), \
+              checksum)
+        elif (msg.getMethod() == 'INVITE' and self.max_consumers > 0 and \
+          len(self.req_consumers) >= self.max_consumers and \
+          not tid[0] in self.req_consumers) or \
+          not self.tableAdmit(self.tserver, self.max_tserver, COMPLETED, self.expireServer):
+            resp = msg.genResponse(503, 'Service Unavailable')
+            self.transmitMsg(server, resp, self.getRespAddr(server, resp, msg.getSource()), \
+              checksum)
         else:
             #print 'new transaction', msg.getMethod()
             t = SipTransaction()
@@ -593,6 +880,10 @@ class SipTransactionManager(object):
             t.checksum = checksum
             if not server.uopts.isWildCard():
                 t.userv = server
+                if self.l4r.pktinfo:
+                    self.l4r.learn(msg.getSource(), server)
+                if self.isReliable(server):
+                    t.address = msg.getSource()
             else:
                 # For messages received on the wildcard interface find
                 # or create more specific server.
@@ -613,6 +904,8 @@ class SipTransactionManager(object):
                 t.needack = False
                 t.branch = None
             self.tserver[t.tid] = t
+            if len(self.tserver) > self.hwm_tserver:
+                self.hwm_tserver = len(self.tserver)
             for consumer in self.req_consumers.get(t.tid[0], ()):
                 cobj = consumer.cobj.isYours(msg)
                 if cobj != None:
@@ -621,7 +914,7 @@ class SipTransactionManager(object):
                     break
             else:
                 if self.req_cb == None:
-                    self.l1rcache[checksum] = SipTMRetransmitO()
+                    self.rcache.drop(checksum)
                     return
                 rval = self.req_cb(msg, t)
             if rval == None:
@@ -638,6 +931,8 @@ class SipTransactionManager(object):
     def regConsumer(self, consumer, call_id, compact = False):
         cons = SipTransactionConsumer(consumer, compact)
         self.req_consumers.setdefault(call_id, []).append(cons)
+        if len(self.req_consumers) > self.hwm_consumers:
+            self.hwm_consumers = len(self.req_consumers)
 
     def unregConsumer(self, consumer, call_id):
         # Usually there will be only one consumer per call_id, so that
@@ -656,6 +951,54 @@ class SipTransactionManager(object):
             raise IndexError('unregConsumer: consumer %s for call-id %s is not registered' % \
               (str(consumer), call_id))
 
+    def tableAdmit(self, table, maxsize, state, expire):
+        # Make room for one more transaction in the table if it's capped,
+        # the table is ordered so that the oldest ones are looked at first
+        if maxsize <= 0:
+            return True
+        while len(table) >= maxsize:
+            for t in islice(table.values(), self.evict_scan):
+                if t.state == state:
+                    break
+            else:
+                self.nrejected += 1
+                return False
+            expire(t)
+            self.nevicted += 1
+        return True
+
+    def expireClient(self, t):
+        # Same as the timer C firing early
+        t.teC.cancel()
+        self.timerC(t)
+
+    def expireServer(self, t):
+        # Same as the timer D firing early
+        t.teD.cancel()
+        self.timerD(t)
+
+    def resetTableStats(self):
+        self.hwm_tclient = len(self.tclient)
+        self.hwm_tserver = len(self.tserver)
+        self.hwm_consumers = len(self.req_consumers)
+        self.nevicted = 0
+        self.nrejected = 0
+
+    def getTableStats(self):
+        return 'client transactions: size %d/%d, high-water %d\n' \
+          'server transactions: size %d/%d, high-water %d\n' \
+          'request consumers: size %d/%d, high-water %d\n' \
+          'evicted %d, rejected %d\n%s' % (len(self.tclient), self.max_tclient, \
+          self.hwm_tclient, len(self.tserver), self.max_tserver, self.hwm_tserver, \
+          len(self.req_consumers), self.max_consumers, self.hwm_consumers, \
+          self.nevicted, self.nrejected, str(self.rcache))
+
+    def regResponder(self, method, responder):
+        self.responders[method] = responder
+
+    def unregResponder(self, method):
+        del self.responders[method]
+
     def sendResponse(self, resp, t = None, retrans = False, ack_cb = None,
       lossemul = 0):
         #print self.tserver
@@ -668,8 +1011,9 @@ class SipTransactionManager(object):
         toHF = resp.getHFBody('to')
         if scode > 100 and toHF.getTag() == None:
             toHF.genTag()
-        t.data = resp.localStr(*t.userv.uopts.getSIPaddr(), compact = t.compact)
-        t.address = resp.getHFBody('via').getTAddr()
+        t.data = resp.localBytes(*t.userv.uopts.getSIPaddr(), compact = t.compact)
+        if not self.isReliable(t.userv):
+            t.address = resp.getHFBody('via').getTAddr()
         self.transmitData(t.userv, t.data, t.address, t.checksum, lossemul)
         if t.res_out_cb != None:
             t.res_out_cb(resp)
@@ -677,8 +1021,10 @@ class SipTransactionManager(object):
             t.state = RINGING
             if self.provisional_retr > 0 and scode > 100:
                 if t.teF != None:
-                    t.teF.cancel()
-                t.teF = Timeout(self.timerF, self.provisional_retr, 1, t)
+                    t.teF.reschedule(self.provisional_retr)
+                else:
+                    t.teF = Timeout(self.timerF, self.provisional_retr, 1, t)
+                    t.teF.rearm = True
         else:
             t.state = COMPLETED
             if t.teE != None:
@@ -704,6 +1050,7 @@ class SipTransactionManager(object):
                 # Install retransmit timer if necessary
                 t.tout = 0.5
                 t.teA = Timeout(self.timerA, t.tout, 1, t)
+                t.teA.rearm = True
             else:
                 # We have done with the transaction
                 del self.tserver[t.tid]
@@ -743,10 +1090,11 @@ class SipTransactionManager(object):
     # 2 seconds
     def timerF(self, t):
         #print 'timerF', t.state
-        t.teF = None
         if t.state == RINGING and self.provisional_retr > 0:
             self.transmitData(t.userv, t.data, t.address)
-            t.teF = Timeout(self.timerF, self.provisional_retr, 1, t)
+            t.teF.reschedule(self.provisional_retr)
+        else:
+            t.teF = None
 
     def timerG(self, t):
         #print 'timerG', t.state
@@ -755,12 +1103,11 @@ class SipTransactionManager(object):
             print(datetime.now(), 'INVITE transaction stuck in the UACK state, possible UAC bug')
 
     def rCachePurge(self):
-        self.l2rcache = self.l1rcache
-        self.l1rcache = {}
+        self.rcache.rotate()
         self.l4r.rotateCache()
 
     def transmitMsg(self, userv, msg, address, cachesum, compact = False):
-        data = msg.localStr(*userv.uopts.getSIPaddr(), compact = compact)
+        data = msg.localBytes(*userv.uopts.getSIPaddr(), compact = compact)
         self.transmitData(userv, data, address, cachesum)
 
     def transmitData(self, userv, data, address, cachesum = None, \
@@ -775,8 +1122,8 @@ class SipTransactionManager(object):
         if cachesum != None:
             if lossemul > 0:
                 lossemul -= 1
-            self.l1rcache[cachesum] = SipTMRetransmitO(userv, data, address, \
-              None, lossemul)
+            self.rcache.put(cachesum, SipTMRetransmitO(userv, data, address, \
+              None, lossemul))
 
     def sendACK(self, t):
         #print 'sendACK', t.state
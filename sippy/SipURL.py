@@ -25,6 +25,7 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from sippy.SipConf import SipConf
+from sippy.ParseCache import ParseCache
 try:
     from urllib import quote, unquote
 except ImportError:
@@ -39,21 +40,9 @@ RFC3261_MARK = '-_.!~*\'()'
 USERNAME_SAFE = RFC3261_USER_UNRESERVED + RFC3261_MARK
 
 class SipURL(object):
-    scheme = None
-    username = None
-    userparams = None
-    password = None
-    host = None
-    port = None
-    headers = None
-    usertype = None
-    transport = None
-    ttl = None
-    maddr = None
-    method = None
-    tag = None
-    other = None
-    lr = False
+    __slots__ = ('scheme', 'username', 'userparams', 'password', 'host', 'port', \
+      'headers', 'usertype', 'transport', 'ttl', 'maddr', 'method', 'tag', 'other', \
+      'lr', 'original_uri')
 
     def __init__(self, url = None, username = None, password = None, host = None, port = None, headers = None, \
       usertype = None, transport = None, ttl = None, maddr = None, method = None, tag = None, other = None, \
@@ -61,7 +50,13 @@ class SipURL(object):
         self.original_uri = url
         self.other = []
         self.userparams = []
-        if url == None:
+        if url != None:
+            # Filled in by the parser
+            self.scheme = self.username = self.password = self.host = None
+            self.port = self.headers = self.usertype = self.transport = None
+            self.ttl = self.maddr = self.method = self.tag = None
+            self.lr = False
+        else:
             self.scheme = scheme
             self.username = username
             if userparams != None:
@@ -244,12 +239,12 @@ class SipURL(object):
             if self.password != None:
                 w(':%s' % self.password)
             w('@')
-        if local_addr != None and 'my' in dir(self.host):
+        if local_addr != None and hasattr(self.host, 'my'):
             w(local_addr)
         else:
             w(str(self.host))
         if self.port != None:
-            if local_port != None and 'my' in dir(self.port):
+            if local_port != None and hasattr(self.port, 'my'):
                 w(':%d' % local_port)
             else:
                 w(':%d' % self.port)
@@ -275,10 +270,14 @@ class SipURL(object):
         return res
 
     def getCopy(self):
+        if self.headers != None:
+            headers = self.headers.copy()
+        else:
+            headers = None
         return SipURL(username = self.username, password = self.password, host = self.host, port = self.port, \
-          headers = self.headers, usertype = self.usertype, transport = self.transport, ttl = self.ttl, \
+          headers = headers, usertype = self.usertype, transport = self.transport, ttl = self.ttl, \
           maddr = self.maddr, method = self.method, tag = self.tag, other = list(self.other), \
-          userparams = list(self.userparams), lr = self.lr)
+          userparams = list(self.userparams), lr = self.lr, scheme = self.scheme)
 
     def getHost(self):
         return self.host
@@ -298,6 +297,11 @@ class SipURL(object):
     def setAddr(self, addr):
         self.host, self.port = addr
 
+url_cache = ParseCache('SIP URI')
+
+def parse_sipurl(url, relaxedparser = False):
+    return url_cache.get((url, relaxedparser), lambda: SipURL(url, relaxedparser = relaxedparser))
+
 if __name__ == '__main__':
     import sys
 
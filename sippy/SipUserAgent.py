@@ -27,6 +27,7 @@
 from sippy.SipServer import SipServer
 
 class SipUserAgent(SipServer):
+    __slots__ = ()
     hf_names = ('user-agent',)
 
     def getCanName(self, name, compact = False):
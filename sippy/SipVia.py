@@ -32,18 +32,19 @@ from sippy.SipConf import SipConf
 from sippy.ESipHeaderCSV import ESipHeaderCSV
 
 class SipVia(SipGenericHF):
+    # shared is set when the self.params is shared with copies of this
+    # header, see getCopy() and __detach()
+    __slots__ = ('sipver', 'hostname', 'port', 'params', 'shared')
     hf_names = ('via', 'v')
 
-    sipver = None
-    hostname = None
-    port = None
-    params = None
-
     def __init__(self, body = None, sipver = None, hostname = None, port = None, params = None):
         if body != None and body.find(',') > -1:
             raise ESipHeaderCSV(None, body.split(','))
         SipGenericHF.__init__(self, body)
-        if body == None:
+        self.shared = False
+        if body != None:
+            self.sipver = self.hostname = self.port = self.params = None
+        else:
             self.parsed = True
             self.params = {}
             if sipver == None:
@@ -96,14 +97,14 @@ class SipVia(SipGenericHF):
         return self.localStr()
 
     def localStr(self, local_addr = None, local_port = None):
-        if not self.parsed:
+        if not self.modified:
             return self.body
-        if local_addr != None and 'my' in dir(self.hostname):
+        if local_addr != None and hasattr(self.hostname, 'my'):
             s = self.sipver + ' ' + local_addr
         else:
             s = self.sipver + ' ' + str(self.hostname)
         if self.port != None:
-            if local_port != None and 'my' in dir(self.port):
+            if local_port != None and hasattr(self.port, 'my'):
                 s += ':' + str(local_port)
             else:
                 s += ':' + str(self.port)
@@ -116,16 +117,37 @@ class SipVia(SipGenericHF):
     def getCopy(self):
         if not self.parsed:
             return SipVia(self.body)
-        return SipVia(sipver = self.sipver, hostname = self.hostname, port = self.port, params = self.params.copy())
+        # Copy-on-write, params are only copied once either of the
+        # headers is about to change them.
+        cself = SipVia(sipver = self.sipver, hostname = self.hostname, port = self.port, params = self.params)
+        cself.body = self.body
+        cself.modified = self.modified
+        self.shared = cself.shared = True
+        return cself
+
+    def __detach(self):
+        if self.shared:
+            self.params = self.params.copy()
+            self.shared = False
+        self.modified = True
 
     def genBranch(self):
         salt = str((random() * 1000000000) + time())
+        self.__detach()
         self.params['branch'] = 'z9hG4bK' + md5(salt.encode()).hexdigest()
 
+    def getTransport(self):
+        return self.sipver.rsplit('/', 1)[-1].upper()
+
+    def setTransport(self, transport):
+        self.__detach()
+        self.sipver = 'SIP/2.0/' + transport
+
     def getBranch(self):
         return self.params.get('branch', None)
 
     def setParam(self, name, value = None):
+        self.__detach()
         self.params[name] = value
 
     def getAddr(self):
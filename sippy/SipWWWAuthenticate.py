@@ -33,14 +33,9 @@ from sippy.Security.SipNonce import HashOracle
 from Crypto import Random
 
 class SipWWWAuthenticate(SipGenericHF):
+    __slots__ = ('realm', 'nonce', 'qop', 'algorithm', 'opaque', 'otherparams')
     hf_names = ('www-authenticate',)
     aclass = SipAuthorization
-    realm = None
-    nonce = None
-    qop = None
-    algorithm = None
-    opaque = None
-    otherparams = None
     ho = HashOracle()
     rng = Random.new()
     try:
@@ -54,7 +49,9 @@ class SipWWWAuthenticate(SipGenericHF):
       algorithm = None):
         self.otherparams = []
         SipGenericHF.__init__(self, body)
+        self.qop = self.algorithm = self.opaque = None
         if body != None:
+            self.realm = self.nonce = None
             return
         self.parsed = True
         if algorithm != None:
@@ -98,7 +95,7 @@ class SipWWWAuthenticate(SipGenericHF):
     def localStr(self, local_addr = None, local_port = None):
         if not self.parsed:
             return self.body
-        if local_addr == None or 'my' not in dir(self.realm):
+        if local_addr == None or not hasattr(self.realm, 'my'):
             local_addr = self.realm
         rval = 'Digest realm="%s",nonce="%s"' % (local_addr, self.nonce)
         if self.qop != None:
@@ -29,13 +29,14 @@ from sippy.SipGenericHF import SipGenericHF
 import socket
 
 class SipWarning(SipGenericHF):
+    __slots__ = ('code', 'agent', 'text')
     hf_names = ('warning',)
-    code = 399
-    agent = socket.gethostname()
-    text = None
 
     def __init__(self, body = None, cself = None, code = None, text = None):
         SipGenericHF.__init__(self, body)
+        self.code = 399
+        self.agent = None
+        self.text = None
         if body != None:
             return
         self.parsed = True
@@ -0,0 +1,455 @@
+# Copyright (c) 2006-2014 Sippy Software, Inc. All rights reserved.
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import print_function
+
+from errno import EINPROGRESS, EWOULDBLOCK, EAGAIN, EINTR
+from collections import deque
+from threading import Thread, Lock
+from time import time
+import selectors, socket, re
+
+from sippy.Core.EventDispatcher import ED2
+from sippy.Core.Exceptions import dump_exception
+from sippy.Time.MonoTime import MonoTime
+from sippy.Time.Timeout import Timeout
+from sippy.Udp_server import Udp_server_opts
+
+_clen_re = re.compile(br'^(?:content-length|l)[ \t]*:[ \t]*([0-9]+)[ \t]*\r?$', \
+  re.IGNORECASE | re.MULTILINE)
+
+class SipStreamFramer(object):
+    '''
+    Splits the byte stream into the SIP messages using Content-Length,
+    which is mandatory for the stream transports. CRLF keep-alives
+    between the messages are skipped.
+    '''
+    buf = None
+    maxsize = None
+
+    def __init__(self, maxsize = 65536):
+        self.buf = b''
+        self.maxsize = maxsize
+
+    def feed(self, data):
+        buf = self.buf + data
+        msgs = []
+        while True:
+            buf = buf.lstrip(b'\r\n')
+            hend = buf.find(b'\r\n\r\n')
+            if hend == -1:
+                if len(buf) > self.maxsize:
+                    raise ValueError('message is too long')
+                break
+            clen = _clen_re.search(buf, 0, hend + 2)
+            if clen == None:
+                raise ValueError('Content-Length is missing')
+            mend = hend + 4 + int(clen.group(1))
+            if mend > self.maxsize:
+                raise ValueError('message is too long')
+            if len(buf) < mend:
+                break
+            msgs.append(buf[:mend])
+            buf = buf[mend:]
+        self.buf = buf
+        return msgs
+
+class Tcp_server_opts(Udp_server_opts):
+    transport = 'TCP'
+    idle_timeout = 120.0
+    max_connections = 4096
+    max_msg_size = 65536
+
+    def __init__(self, laddress, data_callback, family = None, o = None):
+        Udp_server_opts.__init__(self, laddress, data_callback, family, o)
+        if o != None:
+            self.idle_timeout, self.max_connections, self.max_msg_size = \
+              o.idle_timeout, o.max_connections, o.max_msg_size
+
+class Tcp_server_view(object):
+    '''
+    Tcp_server as seen from one of the local addresses, see the
+    Udp_server_view.
+    '''
+    userv = None
+    uopts = None
+
+    def __init__(self, userv, laddress):
+        self.userv = userv
+        self.uopts = userv.uopts.getCopy()
+        self.uopts.laddress = (laddress, userv.uopts.laddress[1])
+
+    def send_to(self, data, address, delayed = False):
+        self.userv.send_to(data, address)
+
+class TcpConnection(object):
+    __slots__ = ('skt', 'address', 'laddress', 'framer', 'outbuf', 'connected', 'atime', \
+      'writing')
+
+    def __init__(self, skt, address, laddress, framer, connected):
+        self.skt = skt
+        self.address = address
+        self.laddress = laddress
+        self.framer = framer
+        self.outbuf = b''
+        self.connected = connected
+        self.atime = time()
+        self.writing = False
+
+class Tcp_server(object):
+    '''
+    SIP over TCP. Connections are pooled by remote address and reused
+    in both directions, idle ones are closed after the idle_timeout.
+
+    If the ED2 can poll the sockets by itself (see the selector_io),
+    the listening socket and all connections are served straight from
+    the ED2 loop, same way as Udp_server does. Otherwise they are all
+    served by a single I/O thread with its own selector, and complete
+    messages are passed to the main loop via ED2.callFromThread() (or
+    the priority lanes), so there is still no thread per connection.
+    '''
+    skt = None
+    uopts = None
+    selector = None
+    connections = None
+    views = None
+    wi = None
+    wi_lock = None
+    wakeup = None
+    worker = None
+    stopping = False
+    stats = None
+    expire_to = None
+
+    def __init__(self, global_config, uopts):
+        self.uopts = uopts.getCopy()
+        self.connections = {}
+        self.views = {}
+        self.stats = [0, 0, 0]
+        if not ED2.selector_io:
+            self.selector = selectors.DefaultSelector()
+            self.wi = deque()
+            self.wi_lock = Lock()
+        if self.uopts.laddress != None:
+            self.skt = socket.socket(self.uopts.family, socket.SOCK_STREAM)
+            self.skt.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.uopts.family == socket.AF_INET6:
+                # Leave IPv4 to its own wildcard socket
+                self.skt.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+            ai = socket.getaddrinfo(self.uopts.laddress[0], None, self.uopts.family)
+            if self.uopts.family == socket.AF_INET:
+                address = (ai[0][4][0], self.uopts.laddress[1])
+            else:
+                address = (ai[0][4][0], self.uopts.laddress[1], ai[0][4][2], ai[0][4][3])
+            self.skt.bind(address)
+            if self.uopts.laddress[1] == 0:
+                self.uopts.laddress = self.skt.getsockname()[:2]
+            self.skt.listen(128)
+            self.skt.setblocking(False)
+            if self.selector == None:
+                ED2.regReader(self.skt, self.accept)
+            else:
+                self.selector.register(self.skt, selectors.EVENT_READ)
+        if self.selector == None:
+            self.expire_to = Timeout(self.expire, 1.0, -1)
+            return
+        self.wakeup = socket.socketpair()
+        self.wakeup[0].setblocking(False)
+        self.selector.register(self.wakeup[0], selectors.EVENT_READ)
+        self.worker = Thread(target = self.run)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def getView(self, laddress):
+        view = self.views.get(laddress, None)
+        if view == None:
+            view = Tcp_server_view(self, laddress)
+            self.views[laddress] = view
+        return view
+
+    def send_to(self, data, address, delayed = False):
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        if self.selector == None:
+            self.queue(data, address)
+            return
+        self.wi_lock.acquire()
+        self.wi.append((data, address))
+        self.wi_lock.release()
+        self.wakeup[1].send(b'\0')
+
+    def handle_read(self, data, address, laddress, rtime):
+        if self.uopts.data_callback == None:
+            return
+        self.stats[2] += 1
+        try:
+            self.uopts.data_callback(data, address, self.getView(laddress), rtime)
+        except Exception as ex:
+            if isinstance(ex, SystemExit):
+                raise
+            dump_exception('Tcp_server: unhandled exception when processing incoming data')
+
+    def shutdown(self):
+        self.stopping = True
+        self.uopts.data_callback = None
+        if self.selector == None:
+            self.expire_to.cancel()
+            self.expire_to = None
+            if self.skt != None:
+                ED2.unregReader(self.skt)
+        else:
+            self.wakeup[1].send(b'\0')
+            self.worker.join()
+        for conn in list(self.connections.values()):
+            self.close(conn)
+        if self.skt != None:
+            self.skt.close()
+        if self.selector != None:
+            self.selector.close()
+            for skt in self.wakeup:
+                skt.close()
+
+    # Everything below runs in the I/O thread, or in the ED2 loop if
+    # there is no I/O thread
+    def run(self):
+        lastexpire = time()
+        while not self.stopping:
+            try:
+                events = self.selector.select(1.0)
+            except (OSError, IOError) as why:
+                if why.errno == EINTR:
+                    continue
+                raise
+            for key, mask in events:
+                if key.fileobj is self.skt:
+                    self.accept()
+                elif key.fileobj is self.wakeup[0]:
+                    try:
+                        while self.wakeup[0].recv(4096):
+                            pass
+                    except (OSError, IOError):
+                        pass
+                else:
+                    conn = key.data
+                    if mask & selectors.EVENT_WRITE:
+                        self.write(conn)
+                    if mask & selectors.EVENT_READ and conn.skt != None:
+                        self.read(conn)
+            self.processQueue()
+            ctime = time()
+            if ctime - lastexpire >= 1.0:
+                self.expire(ctime)
+                lastexpire = ctime
+
+    def addressOf(self, skt_address):
+        if self.uopts.family == socket.AF_INET6:
+            return ('[%s]' % skt_address[0], skt_address[1])
+        return tuple(skt_address[:2])
+
+    def register(self, skt, address, connected):
+        laddress = skt.getsockname()[0]
+        conn = TcpConnection(skt, address, laddress, SipStreamFramer(self.uopts.max_msg_size), \
+          connected)
+        self.connections[address] = conn
+        if self.selector == None:
+            ED2.regReader(skt, self.read, conn)
+        else:
+            self.selector.register(skt, selectors.EVENT_READ, conn)
+        if not connected:
+            self.setWriting(conn, True)
+        return conn
+
+    def setWriting(self, conn, writing):
+        # Whether to be told once the connection is writable
+        if conn.writing == writing:
+            return
+        conn.writing = writing
+        if self.selector == None:
+            if writing:
+                ED2.regWriter(conn.skt, self.write, conn)
+            else:
+                ED2.unregWriter(conn.skt)
+            return
+        events = selectors.EVENT_READ
+        if writing:
+            events |= selectors.EVENT_WRITE
+        self.selector.modify(conn.skt, events, conn)
+
+    def accept(self):
+        try:
+            skt, address = self.skt.accept()
+        except (OSError, IOError):
+            return
+        if len(self.connections) >= self.uopts.max_connections:
+            skt.close()
+            return
+        skt.setblocking(False)
+        address = self.addressOf(address)
+        oconn = self.connections.get(address, None)
+        if oconn != None:
+            self.close(oconn)
+        self.register(skt, address, True)
+
+    def connect(self, address):
+        host = address[0]
+        if host.startswith('['):
+            host = host[1:-1]
+        try:
+            ai = socket.getaddrinfo(host, address[1], self.uopts.family, socket.SOCK_STREAM)
+            skt = socket.socket(self.uopts.family, socket.SOCK_STREAM)
+            skt.setblocking(False)
+            err = skt.connect_ex(ai[0][4])
+        except Exception:
+            dump_exception('Tcp_server: cannot connect to %s:%d' % address)
+            return None
+        if err not in (0, EINPROGRESS, EWOULDBLOCK, EAGAIN):
+            skt.close()
+            return None
+        return self.register(skt, address, err == 0)
+
+    def processQueue(self):
+        self.wi_lock.acquire()
+        wi = self.wi
+        self.wi = deque()
+        self.wi_lock.release()
+        for data, address in wi:
+            self.queue(data, address)
+
+    def queue(self, data, address):
+        conn = self.connections.get(address, None)
+        if conn == None:
+            conn = self.connect(address)
+            if conn == None:
+                return
+        conn.outbuf += data
+        self.stats[1] += 1
+        if conn.connected:
+            self.write(conn)
+
+    def read(self, conn):
+        try:
+            data = conn.skt.recv(65536)
+        except (OSError, IOError) as why:
+            if why.errno in (EWOULDBLOCK, EAGAIN, EINTR):
+                return
+            data = b''
+        if len(data) == 0:
+            self.close(conn)
+            return
+        conn.atime = time()
+        try:
+            msgs = conn.framer.feed(data)
+        except ValueError as why:
+            print('Tcp_server: closing connection from %s:%d: %s' % (conn.address[0], \
+              conn.address[1], str(why)))
+            self.close(conn)
+            return
+        if len(msgs) == 0:
+            return
+        rtime = MonoTime()
+        lanes = self.uopts.lanes
+        for msg in msgs:
+            if lanes != None:
+                lanes.callFromThread(self.uopts.classify(msg), self.handle_read, msg, \
+                  conn.address, conn.laddress, rtime)
+            elif self.selector == None:
+                self.handle_read(msg, conn.address, conn.laddress, rtime)
+            else:
+                ED2.callFromThread(self.handle_read, msg, conn.address, conn.laddress, rtime)
+
+    def write(self, conn):
+        if not conn.connected:
+            err = conn.skt.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err != 0:
+                self.close(conn)
+                return
+            conn.connected = True
+            conn.laddress = conn.skt.getsockname()[0]
+        if len(conn.outbuf) > 0:
+            try:
+                sent = conn.skt.send(conn.outbuf)
+            except (OSError, IOError) as why:
+                if why.errno not in (EWOULDBLOCK, EAGAIN, EINTR):
+                    self.close(conn)
+                    return
+                sent = 0
+            conn.outbuf = conn.outbuf[sent:]
+            conn.atime = time()
+        self.setWriting(conn, len(conn.outbuf) > 0)
+
+    def close(self, conn):
+        if conn.skt == None:
+            return
+        if self.selector == None:
+            ED2.unregReader(conn.skt)
+            if conn.writing:
+                ED2.unregWriter(conn.skt)
+        else:
+            self.selector.unregister(conn.skt)
+        conn.skt.close()
+        conn.skt = None
+        if self.connections.get(conn.address, None) is conn:
+            del self.connections[conn.address]
+
+    def expire(self, ctime = None):
+        if ctime == None:
+            ctime = time()
+        for conn in list(self.connections.values()):
+            if ctime - conn.atime > self.uopts.idle_timeout and len(conn.outbuf) == 0:
+                self.close(conn)
+
+if __name__ == '__main__':
+    sf = SipStreamFramer()
+    msg1 = b'OPTIONS sip:x SIP/2.0\r\nl: 4\r\n\r\nbody'
+    msg2 = b'SIP/2.0 200 OK\r\nContent-Length: 0\r\n\r\n'
+    data = b'\r\n\r\n' + msg1 + msg2 + msg1
+    assert sf.feed(data[:10]) == []
+    assert sf.feed(data[10:-3]) == [msg1, msg2]
+    assert sf.feed(data[-3:]) == [msg1] and sf.buf == b''
+    try:
+        sf.feed(b'INVITE sip:x SIP/2.0\r\nVia: foo\r\n\r\n')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('missing Content-Length has not been detected')
+
+    got = []
+    def ping_received(data, address, server, rtime):
+        got.append(data)
+        server.send_to(msg2, address)
+    def pong_received(data, address, server, rtime):
+        got.append(data)
+        ED2.breakLoop()
+    pong = Tcp_server({}, Tcp_server_opts(('127.0.0.1', 0), pong_received))
+    ping = Tcp_server({}, Tcp_server_opts(('127.0.0.1', 0), ping_received))
+    # Response should come back over the very same connection
+    pong.send_to(msg1, ping.uopts.laddress)
+    ED2.loop(2)
+    assert got == [msg1, msg2], got
+    assert len(ping.connections) == 1 and len(pong.connections) == 1
+    pong.shutdown()
+    ping.shutdown()
+    print('passed')
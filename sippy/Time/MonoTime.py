@@ -46,8 +46,7 @@ class MonoGlobals(local):
         self.realt_flt = recfilter(0.99, realt - self.monot_max)
 
 class MonoTime(object):
-    monot = None
-    realt = None
+    __slots__ = ('monot', 'realt')
     globals = MonoGlobals()
 
     def __init__(self, s = None, monot = None, realt = None, trust_realt = False):
@@ -79,6 +79,42 @@ def testTimeout():
     ED2.loop()
     assert(arguments['test'] == 'bar')
 
+def testTimeoutRearm():
+    def test1(arguments, testnum):
+        print(testnum)
+        arguments['fired'].append(testnum)
+        if len(arguments['fired']) < 3:
+            # Re-arm from its own callback
+            arguments['timer'].reschedule(0.01 * len(arguments['fired']))
+        else:
+            ED2.breakLoop()
+
+    arguments = {'fired':[], 'timer':None}
+    timeout_1 = Timeout(test1, 10.0, 1, arguments, 'test1')
+    timeout_1.rearm = True
+    arguments['timer'] = timeout_1
+    etime = timeout_1.etime
+    timeout_1.reschedule(0.01)
+    ED2.loop()
+    assert(arguments['fired'] == ['test1',] * 3)
+    assert(timeout_1.etime is etime)
+    # Fired timer can be restarted with the last interval
+    arguments['fired'] = ['test1',] * 2
+    timeout_1.restart()
+    ED2.loop()
+    assert(len(arguments['fired']) == 3)
+    assert(len(ED2.timers) == 0)
+    # Without the rearm listener is cleaned up once it fires
+    timeout_1 = Timeout(test1, 0, 1, arguments, 'test2')
+    ED2.loop()
+    assert(timeout_1.cb_func == None and timeout_1.cb_params == None)
+    try:
+        timeout_1.restart()
+    except Exception:
+        pass
+    else:
+        assert(False)
+
 def testTimeoutAbsMono():
     def test1(arguments, testnum, mtm):
         arguments['delay'] = mtm.offsetFromNow()
@@ -110,4 +146,5 @@ def testTimeoutAbsMono():
 
 if __name__ == '__main__':
     testTimeout()
+    testTimeoutRearm()
     testTimeoutAbsMono()
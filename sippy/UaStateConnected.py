@@ -39,6 +39,7 @@ class UaStateConnected(UaStateGeneric):
     triedauth = None
     keepalives = None
     ka_tr = None
+    ka_timer = None
     connected = True
 
     def __init__(self, ua):
@@ -47,7 +48,9 @@ class UaStateConnected(UaStateGeneric):
         UaStateGeneric.__init__(self, ua)
         self.ua.branch = None
         if self.ua.kaInterval > 0:
-            Timeout(self.keepAlive, self.ua.kaInterval)
+            self.ka_timer = Timeout(self.keepAlive, self.ua.kaInterval)
+            # Restarted after every keepalive response
+            self.ka_timer.rearm = True
 
     def recvRequest(self, req):
         if req.getMethod() == 'REFER':
@@ -281,9 +284,12 @@ class UaStateConnected(UaStateGeneric):
             print('%s: Received %d response to keep alive from %s:%d, disconnecting the call' % (self.ua.cId, code, self.ua.rAddr[0], self.ua.rAddr[1]))
             self.ua.disconnect()
             return
-        Timeout(self.keepAlive, self.ua.kaInterval)
+        self.ka_timer.restart()
 
     def onStateChange(self, newstate):
+        if self.ka_timer != None:
+            self.ka_timer.cancel()
+            self.ka_timer = None
         if self.ka_tr != None:
             self.ua.global_config['_sip_tm'].cancelTransaction(self.ka_tr)
             self.ka_tr = None
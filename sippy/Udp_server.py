@@ -37,13 +37,45 @@ from datetime import datetime
 from time import sleep, time
 from threading import Thread, Condition
 from random import random
-import socket
+import socket, struct, sys
 
 from sippy.Core.EventDispatcher import ED2
 from sippy.Core.Exceptions import dump_exception
 from sippy.Time.Timeout import Timeout
 from sippy.Time.MonoTime import MonoTime
 
+# IP_PKTINFO is only exported by the socket module starting with Python
+# 3.13, the value is fixed on Linux though.
+if hasattr(socket, 'IP_PKTINFO'):
+    _IP_PKTINFO = socket.IP_PKTINFO
+elif sys.platform.startswith('linux'):
+    _IP_PKTINFO = 8
+else:
+    _IP_PKTINFO = None
+PKTINFO_SUPPORTED = _IP_PKTINFO != None and hasattr(socket.socket, 'sendmsg') and \
+  hasattr(socket, 'IPV6_RECVPKTINFO')
+_PKTINFO_BUFSIZE = 64
+
+def _pktinfo_laddr(family, ancdata):
+    # Destination address of the received datagram
+    for level, ctype, cdata in ancdata:
+        if family == socket.AF_INET and level == socket.IPPROTO_IP and ctype == _IP_PKTINFO:
+            # struct in_pktinfo {ipi_ifindex; ipi_spec_dst; ipi_addr}
+            return socket.inet_ntop(family, cdata[8:12])
+        if family == socket.AF_INET6 and level == socket.IPPROTO_IPV6 and \
+          ctype == socket.IPV6_PKTINFO:
+            # struct in6_pktinfo {ipi6_addr; ipi6_ifindex}
+            return socket.inet_ntop(family, cdata[:16])
+    return None
+
+def _pktinfo_cmsg(family, laddress):
+    # Ancillary data to send datagram from the specified local address
+    if family == socket.AF_INET:
+        return [(socket.IPPROTO_IP, _IP_PKTINFO, struct.pack('=I4s4s', 0, \
+          socket.inet_pton(family, laddress), b'\0' * 4))]
+    return [(socket.IPPROTO_IPV6, socket.IPV6_PKTINFO, struct.pack('=16sI', \
+      socket.inet_pton(family, laddress), 0))]
+
 class AsyncSender(Thread):
     userv = None
 
@@ -66,7 +98,7 @@ class AsyncSender(Thread):
             self.userv.wi_available.release()
             if wi == None:
                 break
-            data, address = wi
+            data, address, cmsg = wi
             try:
                 ai = socket.getaddrinfo(address[0], None, self.userv.uopts.family)
             except:
@@ -77,7 +109,11 @@ class AsyncSender(Thread):
                 address = (ai[0][4][0], address[1], ai[0][4][2], ai[0][4][3])
             for i in range(0, 20):
                 try:
-                    if self.userv.skt.sendto(data, address) == len(data):
+                    if cmsg == None:
+                        sent = self.userv.skt.sendto(data, address)
+                    else:
+                        sent = self.userv.skt.sendmsg((data,), cmsg, 0, address)
+                    if sent == len(data):
                         break
                 except socket.error as why:
                     if isinstance(why, BrokenPipeError):
@@ -99,9 +135,17 @@ class AsyncReceiver(Thread):
 
     def run(self):
         maxemptydata = 100
+        family = self.userv.uopts.family
+        pktinfo = self.userv.uopts.pktinfo
+        laddress = None
         while True:
             try:
-                data, address = self.userv.skt.recvfrom(8192)
+                if not pktinfo:
+                    data, address = self.userv.skt.recvfrom(8192)
+                else:
+                    data, ancdata, flags, address = self.userv.skt.recvmsg(8192, \
+                      _PKTINFO_BUFSIZE)
+                    laddress = _pktinfo_laddr(family, ancdata)
                 if not data and address == None:
                     # Ugly hack to detect socket being closed under us on Linux.
                     # The problem is that even call on non-closed socket can
@@ -123,9 +167,60 @@ class AsyncReceiver(Thread):
                     dump_exception('Udp_server: unhandled exception when receiving incoming data')
                     sleep(1)
                     continue
-            if self.userv.uopts.family == socket.AF_INET6:
+            if family == socket.AF_INET6:
+                address = ('[%s]' % address[0], address[1])
+            lanes = self.userv.uopts.lanes
+            if lanes == None:
+                ED2.callFromThread(self.userv.handle_read, data, address, rtime, False, \
+                  laddress)
+            else:
+                lanes.callFromThread(self.userv.uopts.classify(data), self.userv.handle_read, \
+                  data, address, rtime, False, laddress)
+        self.userv = None
+
+class SelectorReceiver(object):
+    '''
+    Receives datagrams straight from the ED2 loop when it can poll the
+    sockets by itself (see EventDispatcher2.selector_io), instead of
+    running the AsyncReceiver threads.
+    '''
+    userv = None
+    # Max datagrams to read per wakeup, so that the timers and other
+    # sockets are not starved under the flood
+    maxbatch = 64
+
+    def __init__(self, userv):
+        self.userv = userv
+        ED2.regReader(self.userv.skt, self.run)
+
+    def run(self):
+        family = self.userv.uopts.family
+        pktinfo = self.userv.uopts.pktinfo
+        lanes = self.userv.uopts.lanes
+        laddress = None
+        for i in range(0, self.maxbatch):
+            try:
+                if not pktinfo:
+                    data, address = self.userv.skt.recvfrom(8192)
+                else:
+                    data, ancdata, flags, address = self.userv.skt.recvmsg(8192, \
+                      _PKTINFO_BUFSIZE)
+                    laddress = _pktinfo_laddr(family, ancdata)
+            except socket.error as why:
+                if why.errno not in (EWOULDBLOCK, EAGAIN, EINTR, ECONNRESET):
+                    dump_exception('Udp_server: unhandled exception when receiving incoming data')
+                return
+            rtime = MonoTime()
+            if family == socket.AF_INET6:
                 address = ('[%s]' % address[0], address[1])
-            ED2.callFromThread(self.userv.handle_read, data, address, rtime)
+            if lanes == None:
+                self.userv.handle_read(data, address, rtime, False, laddress)
+            else:
+                lanes.callFromThread(self.userv.uopts.classify(data), self.userv.handle_read, \
+                  data, address, rtime, False, laddress)
+
+    def shutdown(self):
+        ED2.unregReader(self.userv.skt)
         self.userv = None
 
 _DEFAULT_FLAGS = socket.SO_REUSEADDR
@@ -134,6 +229,7 @@ if hasattr(socket, 'SO_REUSEPORT'):
 _DEFAULT_NWORKERS = 30
 
 class Udp_server_opts(object):
+    transport = 'UDP'
     laddress = None
     data_callback = None
     family = None
@@ -143,6 +239,9 @@ class Udp_server_opts(object):
     pdelay_out_max = 0.0
     ploss_in_rate = 0.0
     pdelay_in_max = 0.0
+    lanes = None
+    classify = None
+    pktinfo = False
 
     def __init__(self, laddress, data_callback, family = None, o = None):
         if o == None:
@@ -158,9 +257,10 @@ class Udp_server_opts(object):
         else:
             self.laddress, self.data_callback, self.family, self.nworkers, self.flags, \
               self.ploss_out_rate, self.pdelay_out_max, self.ploss_in_rate, \
-              self.pdelay_in_max = o.laddress, o.data_callback, o.family, \
-              o.nworkers, o.flags, o.ploss_out_rate, o.pdelay_out_max, o.ploss_in_rate, \
-              o.pdelay_in_max
+              self.pdelay_in_max, self.lanes, self.classify, self.pktinfo = o.laddress, \
+              o.data_callback, o.family, o.nworkers, o.flags, o.ploss_out_rate, \
+              o.pdelay_out_max, o.ploss_in_rate, o.pdelay_in_max, o.lanes, o.classify, \
+              o.pktinfo
 
     def getCopy(self):
         return self.__class__(None, None, o = self)
@@ -176,6 +276,29 @@ class Udp_server_opts(object):
             return True
         return False
 
+class Udp_server_view(object):
+    '''
+    Wildcard Udp_server as seen from one of the local addresses. It is
+    passed up as the server for datagrams received on that address, and
+    everything sent through it goes out from that address, see the
+    Udp_server_opts.pktinfo.
+    '''
+    userv = None
+    uopts = None
+    cmsg = None
+
+    def __init__(self, userv, laddress):
+        self.userv = userv
+        self.uopts = userv.uopts.getCopy()
+        self.uopts.laddress = (laddress, userv.uopts.laddress[1])
+        self.cmsg = _pktinfo_cmsg(self.uopts.family, laddress)
+
+    def getView(self, laddress):
+        return self.userv.getView(laddress)
+
+    def send_to(self, data, address, delayed = False):
+        self.userv.send_to(data, address, delayed, self.cmsg)
+
 class Udp_server(object):
     skt = None
     uopts = None
@@ -185,10 +308,18 @@ class Udp_server(object):
     wi = None
     asenders = None
     areceivers = None
+    sreceiver = None
+    views = None
 
     def __init__(self, global_config, uopts):
         self.uopts = uopts.getCopy()
         self.skt = socket.socket(self.uopts.family, socket.SOCK_DGRAM)
+        if self.uopts.pktinfo:
+            if self.uopts.family == socket.AF_INET:
+                self.skt.setsockopt(socket.IPPROTO_IP, _IP_PKTINFO, 1)
+            else:
+                self.skt.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_RECVPKTINFO, 1)
+            self.views = {}
         if self.uopts.laddress != None:
             ai = socket.getaddrinfo(self.uopts.laddress[0], None, self.uopts.family)
             if self.uopts.family == socket.AF_INET:
@@ -213,11 +344,23 @@ class Udp_server(object):
             nworkers = _DEFAULT_NWORKERS
         else:
             nworkers = self.uopts.nworkers
+        if ED2.selector_io:
+            # AsyncSender copes with EWOULDBLOCK by itself
+            self.skt.setblocking(False)
+            self.sreceiver = SelectorReceiver(self)
         for i in range(0, nworkers):
             self.asenders.append(AsyncSender(self))
-            self.areceivers.append(AsyncReceiver(self))
+            if self.sreceiver == None:
+                self.areceivers.append(AsyncReceiver(self))
 
-    def send_to(self, data, address, delayed = False):
+    def getView(self, laddress):
+        view = self.views.get(laddress, None)
+        if view == None:
+            view = Udp_server_view(self, laddress)
+            self.views[laddress] = view
+        return view
+
+    def send_to(self, data, address, delayed = False, cmsg = None):
         if not isinstance(address, tuple):
             raise Exception('Invalid address, not a tuple: %s' % str(address))
         if not isinstance(data, bytes):
@@ -227,7 +370,7 @@ class Udp_server(object):
                 return
         if self.uopts.pdelay_out_max > 0.0 and not delayed:
             pdelay = self.uopts.pdelay_out_max * random()
-            Timeout(self.send_to, pdelay, 1, data, address, True)
+            Timeout(self.send_to, pdelay, 1, data, address, True, cmsg)
             return
         addr, port = address
         if self.uopts.family == socket.AF_INET6:
@@ -235,11 +378,11 @@ class Udp_server(object):
                 raise Exception('Invalid IPv6 address: %s' % addr)
             address = (addr[1:-1], port)
         self.wi_available.acquire()
-        self.wi.append((data, address))
+        self.wi.append((data, address, cmsg))
         self.wi_available.notify()
         self.wi_available.release()
  
-    def handle_read(self, data, address, rtime, delayed = False):
+    def handle_read(self, data, address, rtime, delayed = False, laddress = None):
         if len(data) > 0 and self.uopts.data_callback != None:
             self.stats[2] += 1
             if self.uopts.ploss_in_rate > 0.0 and not delayed:
@@ -247,16 +390,24 @@ class Udp_server(object):
                     return
             if self.uopts.pdelay_in_max > 0.0 and not delayed:
                 pdelay = self.uopts.pdelay_in_max * random()
-                Timeout(self.handle_read, pdelay, 1, data, address, rtime.getOffsetCopy(pdelay), True)
+                Timeout(self.handle_read, pdelay, 1, data, address, rtime.getOffsetCopy(pdelay), \
+                  True, laddress)
                 return
+            if laddress != None:
+                server = self.getView(laddress)
+            else:
+                server = self
             try:
-                self.uopts.data_callback(data, address, self, rtime)
+                self.uopts.data_callback(data, address, server, rtime)
             except Exception as ex:
                 if isinstance(ex, SystemExit):
                     raise 
                 dump_exception('Udp_server: unhandled exception when processing incoming data')
 
     def shutdown(self):
+        if self.sreceiver != None:
+            self.sreceiver.shutdown()
+            self.sreceiver = None
         try:
             self.skt.shutdown(socket.SHUT_RDWR)
         except Exception as e:
@@ -31,6 +31,7 @@ from os.path import dirname, join as p_join
 sys.path.append(p_join(dirname(sys.argv[0]), '..'))
 
 from sippy.Core.EventDispatcher import ED2
+from sippy.Core.TimerQueue import TimerWheel
 from sippy.Time.MonoTime import MonoTime
 from sippy.Time.Timeout import Timeout
 from sippy.Signal import Signal
@@ -52,10 +53,14 @@ from sippy.Rtp_proxy_client import Rtp_proxy_client
 from signal import SIGHUP, SIGPROF, SIGUSR1, SIGUSR2, SIGTERM
 from sippy.CLIManager import CLIConnectionManager
 from sippy.SipTransactionManager import SipTransactionManager
+from sippy.SipStatelessResponder import SipStatelessResponder
+from sippy.OverloadControl import OverloadControl
 from sippy.SipCallId import SipCallId
 from sippy.StatefulProxy import StatefulProxy
 from sippy.misc import daemonize
 from sippy.B2BRoute import B2BRoute
+from sippy.SipURL import url_cache
+from sippy.SipAddress import address_cache
 
 import gc, getopt, os
 from re import sub
@@ -399,6 +404,7 @@ class CallMap(object):
     safe_restart = False
     global_config = None
     proxy = None
+    overload = None
     #rc1 = None
     #rc2 = None
 
@@ -432,6 +438,8 @@ class CallMap(object):
             return (req.genResponse(481, 'Call Leg/Transaction Does Not Exist'), None, None)
         if req.getMethod() == 'INVITE':
             # New dialog
+            if self.overload != None and not self.overload.admit():
+                return (self.overload.reject(req), None, None)
             if req.countHFs('via') > 1:
                 via = req.getHFBody('via', 1)
             else:
@@ -640,6 +648,66 @@ class CallMap(object):
                     continue
             clim.send('OK\n')
             return False
+        if cmd == 'pc':
+            if len(args) > 1 or (len(args) == 1 and args[0] != 'reset'):
+                clim.send('ERROR: syntax error: pc [reset]\n')
+                return False
+            res = ''
+            for pcache in (url_cache, address_cache):
+                res += '%s\n' % str(pcache)
+                if len(args) == 1:
+                    pcache.clear()
+            clim.send(res)
+            return False
+        if cmd == 'rc':
+            if len(args) > 1 or (len(args) == 1 and args[0] != 'reset'):
+                clim.send('ERROR: syntax error: rc [reset]\n')
+                return False
+            rcache = self.global_config['_sip_tm'].rcache
+            clim.send('%s\n' % str(rcache))
+            if len(args) == 1:
+                rcache.resetStats()
+            return False
+        if cmd == 'tt':
+            if len(args) > 1 or (len(args) == 1 and args[0] != 'reset'):
+                clim.send('ERROR: syntax error: tt [reset]\n')
+                return False
+            tm = self.global_config['_sip_tm']
+            clim.send('%s\n' % tm.getTableStats())
+            if len(args) == 1:
+                tm.resetTableStats()
+            return False
+        if cmd == 'ed':
+            if len(args) > 1 or (len(args) == 1 and args[0] != 'reset'):
+                clim.send('ERROR: syntax error: ed [reset]\n')
+                return False
+            lanes = self.global_config['_sip_tm'].lanes
+            clim.send('timers: %d\n%s\n' % (len(ED2.timers), ED2.getCftStats()))
+            if lanes != None:
+                clim.send('%s\n' % str(lanes))
+            if len(args) == 1:
+                ED2.resetCftStats()
+                if lanes != None:
+                    lanes.resetStats()
+            return False
+        if cmd == 'oc':
+            overload = self.overload
+            if overload == None:
+                clim.send('ERROR: overload control is not enabled\n')
+                return False
+            if len(args) == 1 and args[0] == 'reset':
+                overload.resetStats()
+            elif len(args) == 2:
+                try:
+                    overload.set(args[0], args[1])
+                except (KeyError, ValueError) as exception:
+                    clim.send('ERROR: %s\n' % str(exception))
+                    return False
+            elif len(args) != 0:
+                clim.send('ERROR: syntax error: oc [reset | <param> <value>]\n')
+                return False
+            clim.send('%s\n' % str(overload))
+            return False
         clim.send('ERROR: unknown command\n')
         return False
 
@@ -819,8 +887,35 @@ def main_func():
 
     if global_config.getdefault('xmpp_b2bua_id', None) != None:
         global_config['_xmpp_mode'] = True
+    if global_config.getdefault('timer_wheel_tick', 0) > 0:
+        ED2.setTimerQueue(TimerWheel(global_config['timer_wheel_tick'] / 1000.0))
+    SipTransactionManager.priority_lanes = global_config.getdefault('sip_priority_lanes', False)
+    SipTransactionManager.pktinfo = global_config.getdefault('pktinfo', False)
+    SipTransactionManager.tcp_transport = global_config.getdefault('sip_tcp', False)
     global_config['_sip_tm'] = SipTransactionManager(global_config, global_config['_cmap'].recvRequest)
     global_config['_sip_tm'].nat_traversal = global_config.getdefault('nat_traversal', False)
+    if 'parse_cache_size' in global_config:
+        url_cache.maxsize = global_config['parse_cache_size']
+        address_cache.maxsize = global_config['parse_cache_size']
+    if 'rcache_size' in global_config:
+        global_config['_sip_tm'].rcache.maxsize = global_config['rcache_size']
+    if 'rcache_bytes' in global_config:
+        global_config['_sip_tm'].rcache.maxbytes = global_config['rcache_bytes']
+    global_config['_sip_tm'].max_tclient = global_config.getdefault('max_client_transactions', 0)
+    global_config['_sip_tm'].max_tserver = global_config.getdefault('max_server_transactions', 0)
+    global_config['_sip_tm'].max_consumers = global_config.getdefault('max_dialogs', 0)
+    if '_stateless_methods' in global_config:
+        responder = SipStatelessResponder(rate = global_config.getdefault('stateless_rate', 0))
+        for method in global_config['_stateless_methods']:
+            global_config['_sip_tm'].regResponder(method, responder)
+    olimits = [(x, global_config.getdefault('overload_' + x, 0)) for x in \
+      ('max_lag', 'max_cft', 'max_timers', 'max_transactions')]
+    if len([x for x in olimits if x[1] > 0]) > 0:
+        overload = OverloadControl(global_config['_sip_tm'])
+        overload.retry_after = global_config.getdefault('overload_retry_after', overload.retry_after)
+        for name, value in olimits:
+            overload.set(name, value)
+        global_config['_cmap'].overload = overload
 
     cmdfile = global_config['b2bua_socket']
     if cmdfile.startswith('unix:'):
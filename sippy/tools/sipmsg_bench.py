@@ -0,0 +1,254 @@
+#!/usr/bin/env python2
+# Copyright (c) 2015-2018 Sippy Software, Inc. All rights reserved.
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import print_function
+
+import getopt, sys
+import os.path
+from timeit import default_timer
+
+def usage():
+    sys.stderr.write('Usage: %s [-l] [-S sippy_path] [-n iterations] [-b benchmark]\n' % \
+      (os.path.basename(sys.argv[0])))
+    sys.exit(1)
+
+INVITE_TMPL = 'INVITE sip:%(cld)s@192.0.2.1:5060 SIP/2.0\r\n' \
+  '%(vias)s' \
+  'Max-Forwards: 70\r\n' \
+  'From: "%(cli)s" <sip:%(cli)s@192.0.2.2>;tag=as6f1d8a2b\r\n' \
+  'To: <sip:%(cld)s@192.0.2.1>\r\n' \
+  'Contact: <sip:%(cli)s@192.0.2.2:5060>\r\n' \
+  'Call-ID: 3c26700857e4-ah4pcg0rwxhb@192.0.2.2\r\n' \
+  'CSeq: 102 INVITE\r\n' \
+  '%(rrs)s' \
+  'User-Agent: Bench UA 1.0\r\n' \
+  'Allow: INVITE, ACK, CANCEL, OPTIONS, BYE, REFER, NOTIFY\r\n' \
+  'Supported: replaces, timer\r\n' \
+  '%(extra)s' \
+  'Content-Type: application/sdp\r\n' \
+  'Content-Length: %(blen)d\r\n' \
+  '\r\n' \
+  '%(body)s'
+
+SDP_BODY = 'v=0\r\n' \
+  'o=- 1234567890 1234567890 IN IP4 192.0.2.2\r\n' \
+  's=-\r\n' \
+  'c=IN IP4 192.0.2.2\r\n' \
+  't=0 0\r\n' \
+  'm=audio 16384 RTP/AVP 0 8 18 101\r\n' \
+  'a=rtpmap:0 PCMU/8000\r\n' \
+  'a=rtpmap:8 PCMA/8000\r\n' \
+  'a=rtpmap:18 G729/8000\r\n' \
+  'a=fmtp:18 annexb=no\r\n' \
+  'a=rtpmap:101 telephone-event/8000\r\n' \
+  'a=fmtp:101 0-15\r\n' \
+  'a=ptime:20\r\n' \
+  'a=sendrecv\r\n'
+
+def gen_invite(nheaders):
+    # 9 fixed headers, the rest is split between Via, Record-Route
+    # and some extension headers to mimic typical carrier traffic.
+    nvar = max(nheaders - 9, 3)
+    nvias = nrrs = nvar // 3
+    nextra = nvar - nvias - nrrs
+    vias = ''.join(['Via: SIP/2.0/UDP 192.0.2.%d:5060;branch=z9hG4bK%.8x;rport\r\n' % \
+      (i + 10, i) for i in range(0, nvias)])
+    rrs = ''.join(['Record-Route: <sip:192.0.2.%d;lr>\r\n' % (i + 10) for i in range(0, nrrs)])
+    extra = ''.join(['X-Bench-%d: value-%d\r\n' % (i, i) for i in range(0, nextra)])
+    return INVITE_TMPL % {'cld':'12125551212', 'cli':'12065551212', 'vias':vias, \
+      'rrs':rrs, 'extra':extra, 'blen':len(SDP_BODY), 'body':SDP_BODY}
+
+def run_timed(func, niters):
+    stime = default_timer()
+    for i in range(0, niters):
+        func()
+    return (default_timer() - stime) / niters
+
+def report(name, nheaders, t_base, t_new):
+    print('%-24s %3d HFs: %8.2f usec -> %8.2f usec (x%.2f)' % (name, nheaders, \
+      t_base * 1e6, t_new * 1e6, t_base / t_new))
+
+def bench_hf_lookup(niters):
+    from sippy.SipRequest import SipRequest
+
+    def scan_lookups(req):
+        # Reference implementation: linear scans over all headers, as
+        # done by the SipMsg before name index has been introduced
+        hfs = req.headers
+        [x for x in hfs if x.name == 'via'][0].getBody()
+        [x for x in hfs if x.name == 'via'][0].getBody()
+        [x for x in hfs if x.name == 'to'][0].getBody()
+        [x for x in hfs if x.name == 'from'][0].getBody()
+        len([x for x in hfs if x.name == 'contact'])
+        len([x for x in hfs if x.name == 'via'])
+        [x.getBody() for x in hfs if x.name == 'record-route']
+        [x for x in hfs if x.name == 'expires']
+        dict([(x.name, x) for x in hfs if x.name in ('cseq', 'call-id', 'from')])
+        dict([(x.name, x) for x in hfs if x.name in ('cseq', 'call-id', 'from')])
+
+    def index_lookups(req):
+        req.getHFBody('via')
+        req.getHFBody('via')
+        req.getHFBody('to')
+        req.getHFBody('from')
+        req.countHFs('contact')
+        req.countHFs('via')
+        req.getHFBodys('record-route')
+        req.getHFs('expires')
+        req.getTId(True, True)
+        req.getTIds()
+
+    for nheaders in (20, 30, 40):
+        req = SipRequest(gen_invite(nheaders))
+        nhfs = len(req.headers)
+        t_base = run_timed(lambda: scan_lookups(req), niters)
+        t_new = run_timed(lambda: index_lookups(req), niters)
+        report('hf_lookup', nhfs, t_base, t_new)
+
+def gen_folded(nfolds):
+    # Single header folded over many lines, the worst case for the parser
+    folded = 'X-Folded: start\r\n' + ''.join([' line-%d\r\n' % i for i in range(0, nfolds)])
+    return gen_invite(20).replace('Max-Forwards: 70\r\n', 'Max-Forwards: 70\r\n' + folded)
+
+def bench_parse(niters):
+    from sippy.SipRequest import SipRequest
+
+    for nheaders in (20, 30, 40):
+        data = gen_invite(nheaders).encode()
+        t = run_timed(lambda: SipRequest(data), niters)
+        print('%-24s %3d HFs: %8.2f usec' % ('parse', nheaders, t * 1e6))
+    for nfolds in (100, 1000, 10000):
+        data = gen_folded(nfolds).encode()
+        t = run_timed(lambda: SipRequest(data), max(niters // nfolds, 10))
+        print('%-24s %5d folds: %8.2f usec' % ('parse_folded', nfolds, t * 1e6))
+
+def bench_serialize(niters):
+    from sippy.SipRequest import SipRequest
+
+    def prepare(msg):
+        # Make sure everything is parsed, so that the cost of the lazy
+        # parsing is not mixed into the serialization one
+        for header in msg.headers:
+            header.getBody()
+        msg.getBody().parse()
+        return msg
+
+    for nheaders in (20, 30, 40):
+        req = prepare(SipRequest(gen_invite(nheaders)))
+        body = req.getBody().getCopy()
+        resp = prepare(req.genResponse(200, 'OK', body = body))
+        nhfs = len(req.headers)
+        for name, msg in (('serialize_invite', req), ('serialize_200ok', resp)):
+            t = run_timed(lambda: msg.localStr('192.0.2.1', 5060), niters)
+            print('%-24s %3d HFs: %8.2f usec' % (name, nhfs, t * 1e6))
+        t = run_timed(lambda: str(body), niters)
+        print('%-24s %3d HFs: %8.2f usec' % ('serialize_sdp', nhfs, t * 1e6))
+
+def bench_sdp(niters):
+    from sippy.SdpBody import SdpBody
+
+    for nsects in (1, 2, 4):
+        data = SDP_BODY + ''.join([SDP_BODY[SDP_BODY.index('m='):] for i in range(1, nsects)])
+        sdp = SdpBody(data)
+        for name, func in (('sdp_parse', lambda: SdpBody(data)), ('sdp_copy', sdp.getCopy), \
+          ('sdp_serialize', lambda: sdp.localStr('192.0.2.1', 5060))):
+            t = run_timed(func, niters)
+            print('%-24s %3d sections: %8.2f usec' % (name, nsects, t * 1e6))
+
+def bench_memory(niters):
+    # Requires Python 3.4+
+    import tracemalloc
+    from sippy.SipRequest import SipRequest
+    from sippy.SipResponse import SipResponse
+    from sippy.SipTransactionManager import SipTransaction
+    from sippy.Time.MonoTime import MonoTime
+
+    def sim_call(data):
+        # Messages and transactions that a B2BUA typically holds on to
+        # for the duration of the single call, all headers parsed
+        req = SipRequest(data)
+        msgs = [req, req.genResponse(100, 'Trying'), req.genResponse(180, 'Ringing'), \
+          req.genResponse(200, 'OK'), req.genACK(), req.genCANCEL()]
+        msgs.append(SipResponse(msgs[3].localStr('192.0.2.1', 5060)))
+        for msg in msgs:
+            for header in msg.headers:
+                body = header.getBody()
+                if hasattr(body, 'getUrl'):
+                    body.getUrl()
+        t = SipTransaction()
+        t.tid = req.getTId(True, True)
+        t.rtime = MonoTime()
+        t.data = req.localBytes('192.0.2.1', 5060)
+        return (msgs, t)
+
+    ncalls = max(niters // 10, 100)
+    for nheaders in (20, 30, 40):
+        data = gen_invite(nheaders)
+        sim_call(data)
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        calls = [sim_call(data) for i in range(0, ncalls)]
+        used = tracemalloc.get_traced_memory()[0] - base
+        tracemalloc.stop()
+        del calls
+        print('%-24s %3d HFs: %8d bytes/call' % ('memory', nheaders, used // ncalls))
+
+BENCHMARKS = {'hf_lookup':bench_hf_lookup, 'parse':bench_parse, \
+  'serialize':bench_serialize, 'sdp':bench_sdp, 'memory':bench_memory}
+
+if __name__ == '__main__':
+    sippy_path = None
+    niters = 10000
+    benchmarks = []
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'lS:n:b:')
+    except getopt.GetoptError:
+        usage()
+
+    for o, a in opts:
+        if o == '-S':
+            sippy_path = a.strip()
+            continue
+        if o == '-n':
+            niters = int(a)
+            continue
+        if o == '-b':
+            if a.strip() not in BENCHMARKS:
+                usage()
+            benchmarks.append(a.strip())
+            continue
+        if o == '-l':
+            print('\n'.join(sorted(BENCHMARKS.keys())))
+            sys.exit(0)
+
+    if sippy_path != None:
+        sys.path.insert(0, sippy_path)
+
+    if len(benchmarks) == 0:
+        benchmarks = sorted(BENCHMARKS.keys())
+    for bname in benchmarks:
+        BENCHMARKS[bname](niters)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python2
+# Copyright (c) 2015-2018 Sippy Software, Inc. All rights reserved.
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import print_function
+
+import getopt, sys
+import os.path
+from random import Random
+from timeit import default_timer
+
+def usage():
+    sys.stderr.write('Usage: %s [-l] [-S sippy_path] [-n iterations] [-t tick] [-b benchmark]\n' % \
+      (os.path.basename(sys.argv[0])))
+    sys.exit(1)
+
+# Per-call timers of the established call: credit time, session
+# keepalive, RADIUS Alive and no-reply, all of them long.
+CALL_TIMERS = (7200.0, 60.0, 300.0, 120.0)
+# Transaction timers A..H, all get cancelled once the response arrives
+TRANS_TIMERS = (0.5, 32.0, 32.0, 300.0)
+
+def get_queues(tick):
+    from sippy.Core.TimerQueue import TimerHeap, TimerWheel
+    from sippy.Time.MonoTime import MonoTime
+
+    base = MonoTime(monot = 1000.0)
+    return (base, (('heap', lambda: TimerHeap()), \
+      ('wheel', lambda: TimerWheel(tick, base))))
+
+def new_timer(now, ival):
+    from sippy.Core.EventDispatcher import EventListener
+
+    el = EventListener()
+    el.cb_func = new_timer
+    el.etime = now.getOffsetCopy(ival)
+    return el
+
+def cancel_timer(tq, el):
+    # Same as the EventListener.cancel()
+    tq.remove(el)
+    el.cleanup()
+
+def populate(tq, base, ncalls, rnd):
+    for i in range(0, ncalls):
+        for ival in CALL_TIMERS:
+            tq.insert(new_timer(base, ival * (0.5 + rnd.random())))
+
+def run_loop(tq, now, step, niters, func):
+    # Advance the clock by step after every iteration and dispatch
+    # whatever has expired, the way the EventDispatcher2 does. Returns
+    # average and worst time per iteration.
+    tmax = 0.0
+    stime = itime = default_timer()
+    for i in range(0, niters):
+        func(now)
+        now.offset(step)
+        while tq.getExpired(now) != None:
+            pass
+        etime = default_timer()
+        tmax = max(tmax, etime - itime)
+        itime = etime
+    return ((itime - stime) / niters, tmax)
+
+def report(name, ncalls, results):
+    t_base = results[0][1][0]
+    print('%-16s %6d calls: %s' % (name, ncalls, ', '.join(['%s %6.2f usec (x%.2f) ' \
+      'max %8.2f usec' % (qname, t * 1e6, t_base / t, tmax * 1e6) for qname, (t, tmax) \
+      in results])))
+
+def bench_churn(niters, tick):
+    # Schedule-then-cancel churn: every transaction arms its timers and
+    # has all of them cancelled shortly after, while the long per-call
+    # timers just sit in the queue.
+    for ncalls in (1000, 10000, 50000):
+        results = []
+        base, queues = get_queues(tick)
+        for qname, qfactory in queues:
+            tq = qfactory()
+            populate(tq, base, ncalls, Random(ncalls))
+            pending = []
+
+            def transaction(now):
+                els = [new_timer(now, ival) for ival in TRANS_TIMERS]
+                for el in els:
+                    tq.insert(el)
+                pending.append(els)
+                if len(pending) > 100:
+                    for el in pending.pop(0):
+                        cancel_timer(tq, el)
+
+            t = run_loop(tq, base.getCopy(), 0.0002, niters, transaction)
+            results.append((qname, t))
+        report('churn', ncalls, results)
+
+def bench_expire(niters, tick):
+    # Short timers that do fire, i.e. retransmits and small delays
+    for ncalls in (1000, 10000, 50000):
+        results = []
+        base, queues = get_queues(tick)
+        for qname, qfactory in queues:
+            tq = qfactory()
+            rnd = Random(ncalls)
+            populate(tq, base, ncalls, rnd)
+
+            def retransmit(now):
+                tq.insert(new_timer(now, 0.5 * (0.5 + rnd.random())))
+
+            t = run_loop(tq, base.getCopy(), 0.001, niters, retransmit)
+            results.append((qname, t))
+        report('expire', ncalls, results)
+
+BENCHMARKS = {'churn':bench_churn, 'expire':bench_expire}
+
+if __name__ == '__main__':
+    sippy_path = None
+    niters = 100000
+    tick = 0.01
+    benchmarks = []
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'lS:n:t:b:')
+    except getopt.GetoptError:
+        usage()
+
+    for o, a in opts:
+        if o == '-S':
+            sippy_path = a.strip()
+            continue
+        if o == '-n':
+            niters = int(a)
+            continue
+        if o == '-t':
+            tick = float(a)
+            continue
+        if o == '-b':
+            if a.strip() not in BENCHMARKS:
+                usage()
+            benchmarks.append(a.strip())
+            continue
+        if o == '-l':
+            print('\n'.join(sorted(BENCHMARKS.keys())))
+            sys.exit(0)
+
+    if sippy_path != None:
+        sys.path.insert(0, sippy_path)
+
+    if len(benchmarks) == 0:
+        benchmarks = sorted(BENCHMARKS.keys())
+    for bname in benchmarks:
+        BENCHMARKS[bname](niters, tick)
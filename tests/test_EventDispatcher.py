@@ -0,0 +1,92 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import unittest
+from threading import Thread, current_thread, main_thread
+from time import sleep, time
+
+def in_thread(func, *args):
+    def run():
+        sleep(0.05)
+        func(*args)
+    t = Thread(target = run)
+    t.start()
+    return t
+
+def run_checks():
+    # ED2 is picked once at the import time, see SIPPY_ED2_BACKEND
+    from sippy.Core.EventDispatcher import ED2
+    from sippy.Time.Timeout import Timeout
+    from sippy.Udp_server import Udp_server, Udp_server_opts
+    from sippy.Tcp_server import Tcp_server, Tcp_server_opts
+
+    events = []
+    def event(name, brk = False):
+        events.append((name, current_thread() is main_thread()))
+        if brk:
+            ED2.breakLoop()
+
+    # Timers and calls from other threads, the loop is only woken up
+    # by the latter
+    Timeout(event, 0.01, 1, 'timeout')
+    t = in_thread(ED2.callFromThread, event, 'cft', True)
+    stime = time()
+    ED2.loop(5)
+    t.join()
+    assert events == [('timeout', True), ('cft', True)], events
+    assert time() - stime < 1.0
+
+    # Signal delivered to some other thread while the loop is idle
+    del events[:]
+    sl = ED2.regSignal(signal.SIGUSR1, event, 'signal', True)
+    t = in_thread(lambda: signal.pthread_kill(current_thread().ident, signal.SIGUSR1))
+    stime = time()
+    ED2.loop(5)
+    t.join()
+    ED2.unregSignal(sl)
+    assert events == [('signal', True)], events
+    assert time() - stime < 1.0
+
+    # Datagrams
+    del events[:]
+    def received(data, address, server, rtime):
+        event(data, True)
+    userv = Udp_server({}, Udp_server_opts(('127.0.0.1', 0), received))
+    skt = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    in_thread(skt.sendto, b'ping', userv.uopts.laddress).join()
+    ED2.loop(5)
+    # No receiver threads if the loop polls the socket itself
+    assert (len(userv.areceivers) == 0) == ED2.selector_io
+    userv.shutdown()
+    skt.close()
+    assert events == [(b'ping', True)], events
+
+    # Stream connections
+    del events[:]
+    tserv = Tcp_server({}, Tcp_server_opts(('127.0.0.1', 0), received))
+    skt = socket.create_connection(tserv.uopts.laddress, 2.0)
+    in_thread(skt.sendall, b'OPTIONS sip:x SIP/2.0\r\nl: 0\r\n\r\n').join()
+    ED2.loop(5)
+    assert (tserv.worker == None) == ED2.selector_io
+    tserv.shutdown()
+    skt.close()
+    assert events == [(b'OPTIONS sip:x SIP/2.0\r\nl: 0\r\n\r\n', True)], events
+
+class TestEventDispatcher2(unittest.TestCase):
+
+    def test_loop(self):
+        run_checks()
+
+    def test_loop_asyncio(self):
+        env = dict(os.environ, SIPPY_ED2_BACKEND = 'asyncio')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = 'from tests.test_EventDispatcher import run_checks; run_checks(); ' \
+          'from sippy.Core.EventDispatcher import ED2; print(ED2.__class__.__name__)'
+        out = subprocess.check_output([sys.executable, '-c', code], env = env, \
+          cwd = root, timeout = 30)
+        self.assertEqual(out.split(), [b'EventDispatcher2Asyncio'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -27,6 +27,22 @@ class TestSdpBodyFunctions(unittest.TestCase):
         want = sdp_single_audio.replace('\n','\r\n')
         self.assertEquals(want, str(got))
 
+    def test_copy_and_modify(self):
+        orig = SdpBody(sdp_multi_stream)
+        want = sdp_multi_stream.replace('\n','\r\n')
+        got = orig.getCopy()
+        sect = got.sections[0]
+        sect.m_header.formats = [0, 8, 101]
+        sect.optimize_a()
+        sect.c_header.addr = '192.0.2.1'
+        got += 'a=nated:yes'
+        self.assertEquals([x.name for x in sect.a_headers], ['rtpmap'] * 3)
+        self.assertEquals(got.sections[-1].a_headers[-1].value, 'yes')
+        self.assertIn('m=audio 60022 RTP/AVP 0 8 101\r\nc=IN IP4 192.0.2.1\r\n' \
+          'a=rtpmap:0 PCMU/8000\r\n', str(got))
+        self.assertEquals(want, str(orig))
+        self.assertEquals(str(got), str(got.getCopy()))
+
 if __name__ == '__main__':
     unittest.main()
 
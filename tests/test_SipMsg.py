@@ -0,0 +1,231 @@
+import unittest
+
+from sippy.SipRequest import SipRequest
+from sippy.SipResponse import SipResponse
+from sippy.SipHeader import SipHeader
+from sippy.SipAddress import address_cache
+from sippy.SipTransactionKey import preparse_tkey
+
+class TestSipMsgHeaders(unittest.TestCase):
+
+    def test_lookups(self):
+        req = SipRequest(invite_with_sdp)
+        self.assertEqual(req.countHFs('via'), 3)
+        self.assertEqual(req.countHFs('record-route'), 0)
+        self.assertEqual(req.getHFBody('via', 1).getBranch(), 'z9hG4bK-proxy2')
+        self.assertEqual(req.getHFBody('cseq').getCSeq(), (101, 'INVITE'))
+        self.assertRaises(IndexError, req.getHFBody, 'expires')
+        self.assertEqual(req.getTId(True, True), ('a84b4c76e66710@pc33.example.com', \
+          '1928301774', 101, 'INVITE', 'z9hG4bK-proxy1'))
+        self.assertEqual(len(req.getTIds()), 3)
+
+    def test_modifications_keep_order(self):
+        req = SipRequest(invite_with_sdp)
+        via0 = req.getHF('via')
+        rr = SipHeader(name = 'record-route', bodys = '<sip:p1.example.com;lr>')
+        req.insertHeaderBefore(via0, rr)
+        self.assertEqual(req.headers[0], rr)
+        self.assertEqual(req.getHF('record-route'), rr)
+        nvia = SipHeader(name = 'via', bodys = 'SIP/2.0/UDP 192.0.2.9;branch=z9hG4bK-new')
+        req.insertHeaderAfter(rr, nvia)
+        self.assertEqual(req.getHFBody('via').getBranch(), 'z9hG4bK-new')
+        self.assertEqual(req.countHFs('via'), 4)
+        req.removeHeader(rr)
+        self.assertEqual(req.countHFs('record-route'), 0)
+        req.replaceHeader(nvia, rr)
+        self.assertEqual(req.countHFs('via'), 3)
+        self.assertEqual(req.getHFs('record-route'), [rr])
+        req.delHFs('via')
+        self.assertEqual(req.countHFs('via'), 0)
+        names = [x.name for x in req.headers]
+        self.assertEqual(names[0], 'record-route')
+        self.assertNotIn('via', names)
+
+    def test_response_roundtrip(self):
+        req = SipRequest(invite_with_sdp)
+        resp = req.genResponse(180, 'Ringing')
+        resp = SipResponse(resp.localStr())
+        self.assertEqual(resp.getSCode(), (180, 'Ringing'))
+        self.assertEqual(resp.countHFs('via'), 3)
+        self.assertEqual(resp.getHFBody('via', 2).getBranch(), 'z9hG4bK-uac')
+
+    def test_bytes_input(self):
+        for buf in (invite_with_sdp.encode(), memoryview(invite_with_sdp.encode())):
+            req = SipRequest(buf)
+            self.assertEqual(req.getMethod(), 'INVITE')
+            self.assertEqual(req.getHFBody('call-id').body, 'a84b4c76e66710@pc33.example.com')
+            req.getBody().parse()
+            self.assertEqual(str(req.getBody()), invite_with_sdp.split('\r\n\r\n', 1)[1])
+        # Content-Length counts octets, not characters
+        ibody = 's=\xd0\x9f\xd1\x80\xd0\xb8\r\n'
+        buf = invite_with_sdp.replace('s=-\r\n', ibody).encode('latin-1')
+        buf = buf.replace(b'Content-Length: 141', b'Content-Length: %d' % (141 + 6))
+        req = SipRequest(buf)
+        self.assertIn(u's=\u041f\u0440\u0438\r\n', str(req.getBody()))
+
+    def test_lazy_startline(self):
+        req = SipRequest(invite_with_sdp.replace('sip:bob@', 'sip:%62ob@', 1))
+        self.assertEqual(req.getMethod(), 'INVITE')
+        # Start line is passed through unchanged until R-URI is touched
+        self.assertEqual(req.getSL(), 'INVITE sip:%62ob@biloxi.example.com SIP/2.0')
+        req.setMethod('OPTIONS')
+        self.assertEqual(req.getSL(), 'OPTIONS sip:%62ob@biloxi.example.com SIP/2.0')
+        self.assertEqual(req.getRURI().username, 'bob')
+        req.getRURI().port = 5062
+        self.assertEqual(req.getSL(), 'OPTIONS sip:bob@biloxi.example.com:5062 SIP/2.0')
+        resp = SipResponse(req.genResponse(183, 'Session Progress').localStr())
+        self.assertEqual(resp.scode, 183)
+        resp.reason = 'Early Media'
+        self.assertEqual(resp.getSL(), 'SIP/2.0 183 Early Media')
+        self.assertEqual(resp.getSCode(), (183, 'Early Media'))
+        # Neither status line nor body are looked at until asked for
+        sdp = invite_with_sdp.split('\r\n\r\n', 1)[1]
+        data = req.genResponse(200, 'OK', body = req.getBody()).localStr()
+        resp = SipResponse(data)
+        self.assertEqual(resp._SipResponse__scode, None)
+        self.assertEqual(str(resp.getBody()), sdp)
+        self.assertEqual(resp.getSCode(), (200, 'OK'))
+        resp = SipResponse(data.replace('200 OK', '486 Busy Here', 1))
+        self.assertEqual(resp.getBody(), None)
+        self.assertEqual(resp.localStr().split('\r\n\r\n', 1)[1], '')
+        resp = SipResponse(data.replace('Content-Length: ', 'Content-Length: 1', 1))
+        self.assertRaises(Exception, resp.getBody)
+
+    def test_folding_and_compact(self):
+        buf = invite_with_sdp.replace('Max-Forwards: 68\r\n', \
+          'Max-Forwards: 68\r\nX-Folded: a,\r\n\tb,\r\n  c\r\n' \
+          'v: SIP/2.0/UDP 192.0.2.4;branch=z9hG4bK-c1, SIP/2.0/UDP 192.0.2.5;branch=z9hG4bK-c2\r\n')
+        req = SipRequest(buf)
+        self.assertEqual(req.getHFBody('x-folded').body, 'a, b, c')
+        self.assertEqual(req.countHFs('via'), 5)
+        self.assertEqual(req.getHFBody('via', 4).getBranch(), 'z9hG4bK-c2')
+        self.assertEqual([x.name for x in req.headers][:5], ['via', 'via', 'via', \
+          'max-forwards', 'x-folded'])
+
+    def test_passthrough(self):
+        via_s = 'SIP/2.0/UDP  192.0.2.2:5060 ;rport;branch=z9hG4bK-proxy1'
+        from_s = '"Alice A." <sip:alice@atlanta.example.com> ;tag=1928301774'
+        buf = invite_with_sdp.replace('SIP/2.0/UDP 192.0.2.2:5060;branch=z9hG4bK-proxy1', \
+          via_s).replace('"Alice A." <sip:alice@atlanta.example.com>;tag=1928301774', from_s)
+        req = SipRequest(buf)
+        via0 = req.getHFBody('via')
+        fr0m = req.getHFBody('from')
+        cseq = req.getHFBody('cseq')
+        # Parsed but not modified: original text is preserved
+        self.assertEqual(via0.getBranch(), 'z9hG4bK-proxy1')
+        self.assertEqual(fr0m.getTag(), '1928301774')
+        self.assertEqual(cseq.getCSeqNum(), 101)
+        self.assertIn('Via: ' + via_s + '\r\n', str(req))
+        self.assertIn('From: ' + from_s + '\r\n', str(req))
+        # Modified: regenerated from the parsed value
+        via0.setParam('received', '203.0.113.1')
+        fr0m.setTag('abcd')
+        cseq.incCSeqNum()
+        self.assertNotIn(via_s, str(req))
+        self.assertIn('received=203.0.113.1', str(via0))
+        self.assertIn('Via: SIP/2.0/UDP 192.0.2.2:5060;', str(req))
+        self.assertIn('From: "Alice A." <sip:alice@atlanta.example.com>;tag=abcd\r\n', str(req))
+        self.assertIn('CSeq: 102 INVITE\r\n', str(req))
+
+    def test_serialize_after_changes(self):
+        req = SipRequest(invite_with_sdp)
+        resp = req.genResponse(180, 'Ringing')
+        s1 = resp.localStr('192.0.2.1', 5060)
+        self.assertEqual(resp.localStr('192.0.2.1', 5060), s1)
+        self.assertEqual(resp.localStr('192.0.2.1', 5060, compact = True).split('\r\n')[0], \
+          'SIP/2.0 180 Ringing')
+        resp.setSCode(183, 'Session Progress')
+        s2 = resp.localStr('192.0.2.1', 5060)
+        self.assertTrue(s2.startswith('SIP/2.0 183 Session Progress\r\n'))
+        resp.appendHeader(SipHeader(name = 'x-foo', bodys = 'bar'))
+        self.assertIn('\r\nX-foo: bar\r\n', resp.localStr('192.0.2.1', 5060))
+        # Header bodies handed out earlier can be modified at any time
+        to = resp.getHFBody('to')
+        self.assertEqual(str(resp), resp.localStr())
+        to.setTag('xyz')
+        self.assertIn(';tag=xyz\r\n', str(resp))
+        # SDP is modified by reference
+        req.getBody().parse()
+        sdp = req.getBody().content
+        s1 = str(req)
+        sdp.sections[0].m_header.port = 12345
+        self.assertNotEqual(str(req), s1)
+        self.assertIn('m=audio 12345 RTP/AVP 0\r\n', str(req))
+
+    def test_copy_on_write(self):
+        req = SipRequest(invite_with_sdp)
+        rvia, rto = req.getHFBody('via'), req.getHFBody('to')
+        resp = req.genResponse(200, 'OK')
+        via, to = resp.getHFBody('via'), resp.getHFBody('to')
+        # Parsed state is shared until either side changes it
+        self.assertIs(via.params, rvia.params)
+        self.assertIs(to.address, rto.address)
+        to.setTag('resp-tag')
+        via.setParam('received', '203.0.113.1')
+        self.assertEqual(rto.getTag(), None)
+        self.assertNotIn('received', rvia.params)
+        self.assertEqual(str(req.getHFBody('to')), 'Bob <sip:bob@biloxi.example.com>')
+        rvia.genBranch()
+        self.assertEqual(via.getBranch(), 'z9hG4bK-proxy1')
+        ack = req.genACK(to.getCopy())
+        ack.getHFBody('to').getUrl().username = 'alice'
+        self.assertEqual(to.getUrl().username, 'bob')
+
+    def test_parse_cache(self):
+        address_cache.clear()
+        for i in range(0, 3):
+            req = SipRequest(invite_with_sdp)
+            fr0m = req.getHFBody('from')
+            self.assertEqual(fr0m.getTag(), '1928301774')
+            self.assertEqual(fr0m.getUrl().host, 'atlanta.example.com')
+            # Clones must not share state with the cached template
+            fr0m.setTag('xxx')
+            fr0m.getUrl().host = 'example.net'
+        self.assertEqual((address_cache.hits, address_cache.misses), (2, 1))
+        maxsize, address_cache.maxsize = address_cache.maxsize, 0
+        try:
+            address_cache.clear()
+            req.getHFBody('to').getUrl()
+            self.assertEqual(len(address_cache.cache), 0)
+        finally:
+            address_cache.maxsize = maxsize
+
+    def test_preparse_tkey(self):
+        # Folded Via has to be left to the full parser
+        self.assertEqual(preparse_tkey(invite_with_sdp.encode()), None)
+        buf = invite_with_sdp.replace(',\r\n ', ', ')
+        req = SipRequest(buf)
+        resp = req.genResponse(200, 'OK')
+        resp.getHFBody('to').setTag('abc')
+        for msg in (req, resp):
+            tkey = preparse_tkey(msg.localStr().encode())
+            self.assertEqual(tkey.getTIds(), msg.getTIds())
+            self.assertEqual(tkey.getTId(True, True), msg.getTId(True, True))
+            self.assertEqual(tkey.getTId(wTTG = True), msg.getTId(wTTG = True))
+        self.assertEqual((tkey.scode, tkey.ttag), (200, 'abc'))
+
+if __name__ == '__main__':
+    unittest.main()
+
+# Test data...
+invite_with_sdp = 'INVITE sip:bob@biloxi.example.com SIP/2.0\r\n' \
+  'Via: SIP/2.0/UDP 192.0.2.2:5060;branch=z9hG4bK-proxy1\r\n' \
+  'Via: SIP/2.0/UDP 192.0.2.3:5060;branch=z9hG4bK-proxy2,\r\n' \
+  ' SIP/2.0/UDP pc33.example.com;branch=z9hG4bK-uac\r\n' \
+  'Max-Forwards: 68\r\n' \
+  'To: Bob <sip:bob@biloxi.example.com>\r\n' \
+  'From: "Alice A." <sip:alice@atlanta.example.com>;tag=1928301774\r\n' \
+  'Call-ID: a84b4c76e66710@pc33.example.com\r\n' \
+  'CSeq: 101 INVITE\r\n' \
+  'Contact: <sip:alice@pc33.example.com>\r\n' \
+  'User-Agent: Test UA\r\n' \
+  'Content-Type: application/sdp\r\n' \
+  'Content-Length: 141\r\n' \
+  '\r\n' \
+  'v=0\r\n' \
+  'o=alice 2890844526 2890844526 IN IP4 pc33.example.com\r\n' \
+  's=-\r\n' \
+  'c=IN IP4 192.0.2.101\r\n' \
+  't=0 0\r\n' \
+  'm=audio 49172 RTP/AVP 0\r\n' \
+  'a=rtpmap:0 PCMU/8000\r\n'
@@ -0,0 +1,79 @@
+import unittest
+
+from sippy.SipRetransCache import SipRetransCache, fingerprint
+
+class Retrans(object):
+    def __init__(self, data):
+        self.data = data
+
+class TestSipRetransCache(unittest.TestCase):
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint(b'INVITE'), fingerprint(b'INVITE'))
+        self.assertNotEqual(fingerprint(b'INVITE'), fingerprint(b'INVITE '))
+
+    def test_hits_misses(self):
+        rc = SipRetransCache()
+        r = Retrans(b'12345')
+        self.assertEqual(rc.get('a'), None)
+        rc.put('a', r)
+        rc.drop('b')
+        self.assertIs(rc.get('a'), r)
+        self.assertIs(rc.get('b'), rc.DROP)
+        self.assertEqual((rc.hits, rc.misses, rc.nbytes, len(rc)), (2, 1, 5, 2))
+        rc.resetStats()
+        self.assertEqual((rc.hits, rc.misses, rc.evictions), (0, 0, 0))
+
+    def test_size_cap(self):
+        rc = SipRetransCache(maxsize = 3)
+        for key in 'abc':
+            rc.drop(key)
+        # Re-inserted entry moves to the end of the eviction queue
+        rc.drop('a')
+        rc.drop('d')
+        self.assertEqual(len(rc), 3)
+        self.assertEqual([rc.get(x) for x in 'abcd'], [rc.DROP, None, rc.DROP, rc.DROP])
+        self.assertEqual(rc.evictions, 1)
+
+    def test_bytes_cap(self):
+        rc = SipRetransCache(maxsize = 3, maxbytes = 10)
+        rc.drop('a')
+        rc.put('b', Retrans(b'12345'))
+        rc.rotate()
+        self.assertIs(rc.get('a'), rc.DROP)
+        rc.put('c', Retrans(b'123456'))
+        # Byte cap reached, older generation goes first in the insertion
+        # order, even though "a" has no data
+        self.assertEqual((rc.get('a'), rc.get('b')), (None, None))
+        self.assertEqual((rc.nbytes, rc.evictions), (6, 2))
+        # Replacing the entry doesn't count its old data twice
+        rc.put('c', Retrans(b'1234'))
+        self.assertEqual(rc.nbytes, 4)
+        # Data over the byte cap is never kept
+        rc.put('d', Retrans(b'12345678901'))
+        self.assertEqual((len(rc), rc.nbytes, rc.get('d')), (0, 0, None))
+
+    def test_rotate(self):
+        rc = SipRetransCache()
+        rc.put('a', Retrans(b'12345'))
+        rc.rotate()
+        rc.put('b', Retrans(b'123'))
+        self.assertEqual((len(rc), rc.nbytes), (2, 8))
+        rc.rotate()
+        self.assertEqual((len(rc), rc.nbytes), (1, 3))
+        self.assertEqual((rc.get('a') == None, rc.get('b') == None), (True, False))
+        rc.rotate()
+        self.assertEqual((len(rc), rc.nbytes), (0, 0))
+        # Aging out is not an eviction
+        self.assertEqual(rc.evictions, 0)
+
+    def test_remove(self):
+        rc = SipRetransCache()
+        rc.put('a', Retrans(b'12345'))
+        rc.rotate()
+        rc.remove('a')
+        rc.remove('b')
+        self.assertEqual((len(rc), rc.nbytes), (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+
+from sippy.SipStatelessResponder import SipStatelessResponder
+from sippy.SipTransactionKey import preparse_tkey
+from sippy.SipResponse import SipResponse
+from sippy.SipHeader import SipHeader
+
+def options(call_id = 'ping-1@192.0.2.2', branch = 'z9hG4bK-ping1'):
+    return ('OPTIONS sip:192.0.2.1 SIP/2.0\r\n' \
+      'v: SIP/2.0/UDP 192.0.2.2:5060;branch=%s;rport,SIP/2.0/UDP 192.0.2.3\r\n' \
+      'From: <sip:ping@192.0.2.2>;tag=1234\r\n' \
+      'To: <sip:192.0.2.1>\r\n' \
+      'Call-ID: %s\r\n' \
+      'CSeq: 7 OPTIONS\r\n' \
+      'Max-Forwards: 70\r\n' \
+      'Content-Length: 0\r\n\r\n' % (branch, call_id)).encode()
+
+class RTime(object):
+    def __init__(self, monot):
+        self.monot = monot
+
+def fixupVia(via0, address):
+    via0.setParam('received', address[0])
+    via0.setParam('rport', str(address[1]))
+
+class TestSipStatelessResponder(unittest.TestCase):
+
+    def respond(self, sr, data, source = '203.0.113.1', now = 0.0):
+        rval = sr.respond(preparse_tkey(data), (source, 1234), RTime(now), fixupVia)
+        if rval == None:
+            return None
+        return (SipResponse(rval[0]), rval[1])
+
+    def test_response(self):
+        sr = SipStatelessResponder(extra_headers = (SipHeader(name = 'allow', \
+          bodys = 'INVITE, ACK, CANCEL, BYE, OPTIONS'),))
+        data = options()
+        resp, address = self.respond(sr, data)
+        self.assertEqual(address, ('203.0.113.1', 1234))
+        self.assertEqual(resp.getSCode(), (200, 'OK'))
+        self.assertEqual(resp.getTId(True, True), preparse_tkey(data).getTId(True, True))
+        vias = resp.getHFBodys('via')
+        self.assertEqual(len(vias), 2)
+        self.assertEqual(vias[0].getTAddr(), ('203.0.113.1', 1234))
+        self.assertEqual(resp.getHFBody('from').getTag(), '1234')
+        self.assertEqual(str(resp.getHFBody('allow')), 'INVITE, ACK, CANCEL, BYE, OPTIONS')
+        self.assertEqual(resp.getBody(), None)
+        self.assertEqual(sr.answered, 1)
+
+    def test_scode(self):
+        sr = SipStatelessResponder(405, 'Method Not Allowed')
+        resp, address = self.respond(sr, options())
+        self.assertEqual(resp.getSCode(), (405, 'Method Not Allowed'))
+        self.assertEqual(str(sr), 'stateless 405 Method Not Allowed: answered 1, ' \
+          'dropped 0, sources 0')
+
+    def test_to_tag(self):
+        sr = SipStatelessResponder()
+        tag = self.respond(sr, options())[0].getHFBody('to').getTag()
+        self.assertNotEqual(tag, None)
+        # Retransmissions get the same To tag, other requests don't
+        self.assertEqual(self.respond(sr, options())[0].getHFBody('to').getTag(), tag)
+        self.assertNotEqual(self.respond(sr, options(call_id = 'ping-2@192.0.2.2'))[0] \
+          .getHFBody('to').getTag(), tag)
+        self.assertNotEqual(self.respond(sr, options(branch = 'z9hG4bK-ping2'))[0] \
+          .getHFBody('to').getTag(), tag)
+
+    def test_rate_limit(self):
+        sr = SipStatelessResponder(rate = 1, burst = 2)
+        data = options()
+        # Burst of 2 from the same source, then the limit kicks in
+        self.assertNotEqual(self.respond(sr, data, now = 10.0), None)
+        self.assertNotEqual(self.respond(sr, data, now = 10.0), None)
+        self.assertEqual(self.respond(sr, data, now = 10.0), None)
+        # Other sources are not affected
+        self.assertNotEqual(self.respond(sr, data, source = '203.0.113.2', now = 10.0), None)
+        # Bucket refills at the rate
+        self.assertEqual(self.respond(sr, data, now = 10.5), None)
+        self.assertNotEqual(self.respond(sr, data, now = 11.5), None)
+        self.assertEqual(self.respond(sr, data, now = 11.5), None)
+        self.assertEqual((sr.answered, sr.dropped, len(sr.buckets)), (4, 3, 2))
+
+    def test_maxsources(self):
+        sr = SipStatelessResponder(rate = 1, burst = 2, maxsources = 2)
+        data = options()
+        self.respond(sr, data, source = '203.0.113.1', now = 0.0)
+        self.respond(sr, data, source = '203.0.113.2', now = 0.5)
+        # First bucket is full again by now and is forgotten
+        self.respond(sr, data, source = '203.0.113.3', now = 1.2)
+        self.assertEqual(sorted(sr.buckets.keys()), ['203.0.113.2', '203.0.113.3'])
+        # Nothing to forget, start from scratch
+        self.respond(sr, data, source = '203.0.113.4', now = 1.2)
+        self.assertEqual(list(sr.buckets.keys()), ['203.0.113.4'])
+
+if __name__ == '__main__':
+    unittest.main()
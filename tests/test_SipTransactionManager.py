@@ -0,0 +1,203 @@
+import socket
+import unittest
+
+from sippy.Core.EventDispatcher import ED2
+from sippy.Time.Timeout import Timeout
+from sippy.SipRequest import SipRequest
+from sippy.SipHeader import SipHeader
+from sippy.SipRoute import SipRoute
+from sippy.SipAddress import SipAddress
+from sippy.SipURL import SipURL
+from sippy.SipTransactionManager import SipTransactionManager, COMPLETED, TERMINATED
+
+class DummyLogger(object):
+    def write(self, *args, **kwargs):
+        pass
+
+class CappedTM(SipTransactionManager):
+    nworkers_udp = 1
+
+def stop_timers(ts):
+    for t in ts:
+        for te in (t.teA, t.teB, t.teC, t.teD, t.teE, t.teF, t.teG):
+            if te != None:
+                te.cancel()
+
+def request(method, call_id, address):
+    return ('%s sip:bob@127.0.0.1 SIP/2.0\r\n' \
+      'Via: SIP/2.0/UDP %s:%d;branch=z9hG4bK-%s\r\n' \
+      'From: <sip:alice@127.0.0.1>;tag=ftag\r\n' \
+      'To: <sip:bob@127.0.0.1>\r\n' \
+      'Call-ID: %s\r\n' \
+      'CSeq: 1 %s\r\n' \
+      'Contact: <sip:alice@127.0.0.1>\r\n' \
+      'Max-Forwards: 70\r\n' \
+      'Content-Length: 0\r\n\r\n' % (method, address[0], address[1], \
+      call_id, call_id, method)).encode()
+
+class TestTransactionCaps(unittest.TestCase):
+    def setUp(self):
+        self.peer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.peer.bind(('127.0.0.1', 0))
+        self.peer.settimeout(2.0)
+        self.paddr = self.peer.getsockname()
+        gc = {'_sip_address':'127.0.0.1', '_sip_port':0, '_sip_logger':DummyLogger()}
+        self.requests = []
+        self.tm = CappedTM(gc, self.req_cb)
+        self.userv = list(self.tm.l4r.cache_l2s.values())[0]
+
+    def tearDown(self):
+        stop_timers(list(self.tm.tclient.values()) + list(self.tm.tserver.values()))
+        self.userv.shutdown()
+        self.peer.close()
+
+    def isYours(self, req):
+        return None
+
+    def req_cb(self, req, t):
+        self.requests.append((req, t))
+        return (req.genResponse(180, 'Ringing'), None, self.noack)
+
+    def noack(self):
+        self.requests.append(('noack', None))
+
+    def request(self, method, call_id):
+        return request(method, call_id, self.paddr)
+
+    def receive(self, method, call_id):
+        self.tm.handleIncoming(self.request(method, call_id), self.paddr, self.userv, \
+          ED2.last_ts)
+        return self.peer.recv(8192).split(b'\r\n', 1)[0]
+
+    def test_server_cap(self):
+        self.tm.max_tserver = 1
+        self.assertEqual(self.receive('INVITE', 'c1'), b'SIP/2.0 180 Ringing')
+        # Transaction in progress is never evicted
+        self.assertEqual(self.receive('INVITE', 'c2'), b'SIP/2.0 503 Service Unavailable')
+        req, t = self.requests[0]
+        self.tm.sendResponse(req.genResponse(200, 'OK'), t)
+        self.assertEqual(self.peer.recv(8192).split(b'\r\n', 1)[0], b'SIP/2.0 200 OK')
+        self.assertEqual(t.state, COMPLETED)
+        # Transaction waiting for the ACK makes room for the new one and
+        # its owner is told that the ACK is not coming
+        self.assertEqual(self.receive('INVITE', 'c3'), b'SIP/2.0 180 Ringing')
+        self.assertEqual([x[0] if x[0] == 'noack' else x[0].getMethod() \
+          for x in self.requests], ['INVITE', 'noack', 'INVITE'])
+        self.assertEqual(len(self.tm.tserver), 1)
+        self.assertEqual((self.tm.nevicted, self.tm.nrejected, self.tm.hwm_tserver), (1, 1, 1))
+
+    def test_consumers_cap(self):
+        self.tm.max_consumers = 1
+        self.tm.regConsumer(self, 'c1')
+        self.assertEqual(self.receive('INVITE', 'c2'), b'SIP/2.0 503 Service Unavailable')
+        self.assertEqual(len(self.tm.tserver), 0)
+        # Known dialogs are let in
+        self.assertEqual(self.receive('INVITE', 'c1'), b'SIP/2.0 180 Ringing')
+        self.tm.unregConsumer(self, 'c1')
+        self.assertEqual(self.receive('INVITE', 'c3'), b'SIP/2.0 180 Ringing')
+
+    def test_client_cap(self):
+        self.tm.max_tclient = 1
+        responses = []
+        def resp_cb(resp):
+            responses.append(resp.getSCode()[0])
+        def newTransaction(call_id):
+            req = SipRequest(self.request('OPTIONS', call_id))
+            req.setTarget(self.paddr)
+            return self.tm.newTransaction(req, resp_cb, userv = self.userv)
+        t1 = newTransaction('c1')
+        self.assertTrue(self.peer.recv(8192).startswith(b'OPTIONS '))
+        t2 = newTransaction('c2')
+        self.assertEqual(responses, [])
+        # Local 503 is delivered from the event loop, not from the
+        # newTransaction()
+        Timeout(ED2.breakLoop, 0.05)
+        ED2.loop()
+        self.assertEqual(responses, [503])
+        self.assertEqual(list(self.tm.tclient.values()), [t1])
+        # Timed out transaction makes room for the new one
+        t1.teB.cancel()
+        self.tm.timerB(t1)
+        self.assertEqual((t1.state, responses), (TERMINATED, [503, 408]))
+        t3 = newTransaction('c3')
+        self.assertEqual(list(self.tm.tclient.values()), [t3])
+        self.assertEqual((self.tm.nevicted, self.tm.nrejected), (1, 1))
+
+    def test_cancel(self):
+        req = SipRequest(self.request('INVITE', 'c1'))
+        req.appendHeader(SipHeader(name = 'route', body = SipRoute(address = \
+          SipAddress(url = SipURL(host = '127.0.0.1', port = self.paddr[1], lr = True)))))
+        req.setTarget(self.paddr)
+        t = self.tm.newTransaction(req, userv = self.userv)
+        self.assertTrue(self.peer.recv(8192).startswith(b'INVITE '))
+        # Changes to the original message once it's sent don't matter
+        req.getHFBody('cseq').incCSeqNum()
+        req.getHFBody('via').genBranch()
+        req.removeHeader(req.getHF('route'))
+        cancel = self.tm.getCANCEL(t)
+        self.assertIs(self.tm.getCANCEL(t), cancel)
+        self.assertEqual(cancel.getMethod(), 'CANCEL')
+        self.assertEqual(str(cancel.getRURI()), 'sip:bob@127.0.0.1')
+        self.assertEqual(cancel.getHFBody('cseq').getCSeq(), (1, 'CANCEL'))
+        self.assertEqual(cancel.getHFBody('via').getBranch(), 'z9hG4bK-c1')
+        self.assertEqual(str(cancel.getHFBody('call-id')), 'c1')
+        self.assertEqual(cancel.getHFBody('from').getTag(), 'ftag')
+        self.assertEqual(len(cancel.getHFBodys('route')), 1)
+        self.assertEqual(cancel.getTarget(), self.paddr)
+        self.assertEqual(cancel.getTId(True, True)[:3], t.tid[:3])
+
+class TcpTM(SipTransactionManager):
+    nworkers_udp = 1
+    tcp_transport = True
+
+class TestTcpFallback(unittest.TestCase):
+    def setUp(self):
+        self.tms = []
+
+    def tearDown(self):
+        for tm in self.tms:
+            stop_timers(list(tm.tclient.values()))
+            for server in list(tm.l4r.cache_l2s.values()) + list(tm.l4r.cache_l2t.values()):
+                server.shutdown()
+
+    def send(self, port, size):
+        gc = {'_sip_address':'127.0.0.1', '_sip_port':port, '_sip_logger':DummyLogger()}
+        tm = TcpTM(gc, None)
+        self.tms.append(tm)
+        req = SipRequest(request('INVITE', 'c1', ('127.0.0.1', 5060)))
+        req.appendHeader(SipHeader(name = 'x-pad', bodys = 'x' * size))
+        req.setTarget(('127.0.0.1', 9))
+        return (req, tm.newTransaction(req))
+
+    def getPort(self):
+        # Same free port for both UDP and TCP
+        skt = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        skt.bind(('127.0.0.1', 0))
+        port = skt.getsockname()[1]
+        skt.close()
+        return port
+
+    def check(self, port, size, transport):
+        req, t = self.send(port, size)
+        self.assertEqual(t.userv.uopts.transport, transport)
+        self.assertEqual(req.getHFBody('via').getTransport(), transport)
+        self.assertEqual(t.via.getTransport(), transport)
+        # Same as if the request has been rendered for this server from
+        # scratch
+        self.assertEqual(t.data, req.localBytes(*t.userv.uopts.getSIPaddr()))
+        self.assertTrue((' SIP/2.0/%s ' % transport).encode() in t.data)
+
+    def test_small(self):
+        self.check(self.getPort(), 10, 'UDP')
+
+    def test_large(self):
+        # Only the Via is patched up in the rendered request
+        self.check(self.getPort(), 2000, 'TCP')
+
+    def test_large_other_port(self):
+        # TCP and UDP servers listen on different ports, request has to
+        # be rendered again
+        self.check(0, 2000, 'TCP')
+
+if __name__ == '__main__':
+    unittest.main()
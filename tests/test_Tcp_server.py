@@ -0,0 +1,146 @@
+import socket
+import unittest
+from threading import Thread
+
+from sippy.Core.EventDispatcher import ED2
+from sippy.Tcp_server import Tcp_server, Tcp_server_opts, SipStreamFramer
+
+msg1 = b'OPTIONS sip:x SIP/2.0\r\nl: 4\r\n\r\nbody'
+msg2 = b'SIP/2.0 200 OK\r\nContent-Length: 0\r\n\r\n'
+
+class TestSipStreamFramer(unittest.TestCase):
+
+    def test_split_reads(self):
+        sf = SipStreamFramer()
+        data = msg1 + msg2
+        msgs = []
+        # Content-Length header, the header/body boundary and the body
+        # itself all end up split between reads
+        for i in range(len(data)):
+            msgs.extend(sf.feed(data[i:i + 1]))
+            if i < len(msg1) - 1:
+                self.assertEqual(msgs, [])
+        self.assertEqual(msgs, [msg1, msg2])
+        self.assertEqual(sf.buf, b'')
+
+    def test_keepalives(self):
+        sf = SipStreamFramer()
+        self.assertEqual(sf.feed(b'\r\n\r\n'), [])
+        self.assertEqual(sf.feed(b'\r\n' + msg1 + b'\r\n\r\n' + msg2 + b'\r\n'), [msg1, msg2])
+        self.assertEqual(sf.feed(b'\r\n\r\n'), [])
+        self.assertEqual(sf.buf, b'')
+
+    def test_oversize(self):
+        # Headers that never end
+        sf = SipStreamFramer(maxsize = 64)
+        self.assertEqual(sf.feed(b'INVITE sip:x SIP/2.0\r\n'), [])
+        self.assertRaises(ValueError, sf.feed, b'Via: x\r\n' * 8)
+        # Body that is announced to be too long is rejected before it
+        # is received
+        sf = SipStreamFramer(maxsize = 64)
+        self.assertRaises(ValueError, sf.feed, b'INVITE sip:x SIP/2.0\r\nl: 100\r\n\r\n')
+
+    def test_missing_clen(self):
+        sf = SipStreamFramer()
+        self.assertRaises(ValueError, sf.feed, b'INVITE sip:x SIP/2.0\r\nVia: foo\r\n\r\n')
+
+class TestTcpServer(unittest.TestCase):
+    servers = None
+
+    def setUp(self):
+        self.servers = []
+        self.got = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+
+    def server(self, data_callback, **kwargs):
+        uopts = Tcp_server_opts(('127.0.0.1', 0), data_callback)
+        for name, value in kwargs.items():
+            setattr(uopts, name, value)
+        server = Tcp_server({}, uopts)
+        self.servers.append(server)
+        return server
+
+    def client(self, server):
+        skt = socket.create_connection(server.uopts.laddress, 2.0)
+        self.addCleanup(skt.close)
+        return skt
+
+    def received(self, data, address, server, rtime):
+        self.got.append((data, address, server))
+        ED2.breakLoop()
+
+    def test_framing(self):
+        server = self.server(self.received)
+        skt = self.client(server)
+        skt.sendall(b'\r\n\r\n' + msg1[:20])
+        skt.sendall(msg1[20:-2])
+        skt.sendall(msg1[-2:] + b'\r\n' + msg2)
+        while len(self.got) < 2:
+            ED2.loop(2)
+        self.assertEqual([x[0] for x in self.got], [msg1, msg2])
+        self.assertEqual(server.stats[2], 2)
+        # No I/O thread if the loop polls the sockets itself
+        self.assertEqual(server.worker == None, ED2.selector_io)
+
+    def test_oversize(self):
+        server = self.server(self.received, max_msg_size = 64)
+        skt = self.client(server)
+        skt.sendall(b'INVITE sip:x SIP/2.0\r\nl: 100\r\n\r\n')
+        ED2.loop(0.2)
+        # Connection is dropped without anything passed up
+        self.assertEqual(skt.recv(1024), b'')
+        self.assertEqual(self.got, [])
+
+    def test_reuse_accepted(self):
+        server = self.server(self.received)
+        skt = self.client(server)
+        skt.sendall(msg1)
+        ED2.loop(2)
+        data, address, view = self.got[0]
+        self.assertEqual(address, skt.getsockname())
+        # Response goes back over the connection the request came in
+        view.send_to(msg2, address)
+        self.assertEqual(skt.recv(1024), msg2)
+        self.assertEqual(len(server.connections), 1)
+
+    def test_large_write(self):
+        server = self.server(self.received)
+        skt = self.client(server)
+        skt.sendall(msg1)
+        ED2.loop(2)
+        data, address, view = self.got[0]
+        # Way more than the socket buffers can take at once
+        data = b'x' * (4 << 20)
+        got = []
+        def reader():
+            while sum([len(x) for x in got]) < len(data):
+                got.append(skt.recv(65536))
+            ED2.callFromThread(ED2.breakLoop)
+        t = Thread(target = reader)
+        t.start()
+        view.send_to(data, address)
+        ED2.loop(5)
+        t.join()
+        self.assertEqual(b''.join(got), data)
+
+    def test_reuse_initiated(self):
+        def ping_received(data, address, server, rtime):
+            self.got.append(data)
+            server.send_to(msg2, address)
+        pong = self.server(self.received)
+        ping = self.server(ping_received)
+        pong.send_to(msg1, ping.uopts.laddress)
+        ED2.loop(2)
+        pong.send_to(msg1, ping.uopts.laddress)
+        ED2.loop(2)
+        self.assertEqual([x if x == msg1 else x[0] for x in self.got], [msg1, msg2, msg1, msg2])
+        # Both requests and both responses went over the same single
+        # connection
+        self.assertEqual((len(ping.connections), len(pong.connections)), (1, 1))
+        self.assertEqual((ping.stats[1], pong.stats[1]), (2, 2))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import unittest
+
+from sippy.Core.EventDispatcher import EventListener
+from sippy.Core.TimerQueue import TimerHeap, TimerWheel
+from sippy.Time.MonoTime import MonoTime
+
+base = MonoTime(monot = 1000.0)
+
+def listener(offset):
+    el = EventListener()
+    el.etime = base.getOffsetCopy(offset)
+    return el
+
+def expire(tq, offset):
+    now = base.getOffsetCopy(offset)
+    fired = []
+    while True:
+        el = tq.getExpired(now)
+        if el == None:
+            return fired
+        fired.append(el)
+
+class TimerQueueTests(object):
+    # Common checks for both implementations, see the make()
+    tick = 0.0
+
+    def test_order(self):
+        tq = self.make()
+        offsets = (0.0, 0.005, 0.011, 1.0, 2.55, 2.56, 3.0, 170.0, 700.0, 50000.0, 2.0 ** 25)
+        els = [listener(x) for x in offsets]
+        for el in reversed(els):
+            tq.insert(el)
+        self.assertEqual(len(tq), len(els))
+        self.assertEqual(set(tq.listeners()), set(els))
+        fired = []
+        for ival in (0.0, 0.01, 0.02, 2.549, 2.56, 100.0, 1000.0, 100000.0, 2.0 ** 26):
+            for el in expire(tq, ival):
+                # Never early
+                self.assertTrue(el.etime.monot <= base.monot + ival)
+                fired.append(el)
+        self.assertEqual(fired, els)
+        self.assertEqual((len(tq), tq.nextExpiry()), (0, None))
+
+    def test_cancel(self):
+        tq = self.make()
+        els = [listener(x) for x in (1.0, 2.0, 3.0, 300.0)]
+        for el in els:
+            tq.insert(el)
+        tq.remove(els[1])
+        tq.remove(els[3])
+        # Removing twice is harmless
+        tq.remove(els[1])
+        self.assertEqual(len(tq), 2)
+        self.assertEqual(set(tq.listeners()), set((els[0], els[2])))
+        self.assertEqual(expire(tq, 1000.0), [els[0], els[2]])
+        self.assertEqual(len(tq), 0)
+
+    def test_cancel_due(self):
+        # Cancelled after it's due, but before it has been popped
+        tq = self.make()
+        els = [listener(x) for x in (1.0, 1.001, 2.0)]
+        for el in els:
+            tq.insert(el)
+        self.assertIs(tq.getExpired(base.getOffsetCopy(5.0)), els[0])
+        tq.remove(els[1])
+        self.assertEqual(expire(tq, 5.0), [els[2]])
+        self.assertEqual(len(tq), 0)
+
+    def test_update(self):
+        tq = self.make()
+        els = [listener(x) for x in (1.0, 2.0, 3.0)]
+        for el in els:
+            tq.insert(el)
+        els[2].etime = base.getOffsetCopy(0.5)
+        tq.update(els[2])
+        els[0].etime = base.getOffsetCopy(4.0)
+        tq.update(els[0])
+        self.assertEqual(len(tq), 3)
+        self.assertEqual(expire(tq, 10.0), [els[2], els[1], els[0]])
+        # Listener that is not in the queue is inserted
+        tq.update(els[1])
+        self.assertEqual(len(tq), 1)
+        self.assertIs(tq.getExpired(base.getOffsetCopy(10.0)), els[1])
+
+    def test_next_expiry(self):
+        tq = self.make()
+        self.assertEqual(tq.nextExpiry(), None)
+        els = [listener(x) for x in (3.0, 700.0)]
+        for el in els:
+            tq.insert(el)
+        # Following the nextExpiry() gets every timer fired on time
+        fired = []
+        for i in range(0, 10):
+            tnext = tq.nextExpiry()
+            if tnext == None:
+                break
+            now = MonoTime(monot = tnext)
+            for el in expire(tq, now.monot - base.monot):
+                self.assertTrue(el.etime.monot <= now.monot <= el.etime.monot + self.tick)
+                fired.append(el)
+        self.assertEqual(fired, els)
+
+class TestTimerWheel(TimerQueueTests, unittest.TestCase):
+    tick = 0.01
+
+    def make(self):
+        return TimerWheel(self.tick, base)
+
+    def test_rounding(self):
+        # Fires on the tick the etime has been rounded up to
+        tq = self.make()
+        el = listener(0.015)
+        tq.insert(el)
+        self.assertEqual(expire(tq, 0.019), [])
+        self.assertEqual(expire(tq, 0.02), [el])
+
+    def test_cascade(self):
+        tq = self.make()
+        els = [listener(x) for x in (5.0, 200.0, 20000.0)]
+        for el in els:
+            tq.insert(el)
+        self.assertEqual(expire(tq, 4.99), [])
+        self.assertEqual(expire(tq, 5.0), els[:1])
+        self.assertEqual(expire(tq, 199.99), [])
+        self.assertEqual(expire(tq, 20000.0), els[1:])
+        self.assertTrue(tq.ncascaded > 0)
+
+class TestTimerHeap(TimerQueueTests, unittest.TestCase):
+
+    def make(self):
+        return TimerHeap()
+
+    def checkIndex(self, tq):
+        heap = tq.tlisteners
+        for i, el in enumerate(heap):
+            self.assertEqual(el.tindex, i)
+            if i > 0:
+                self.assertTrue(heap[(i - 1) >> 1].etime.monot <= el.etime.monot)
+
+    def test_cancel_index(self):
+        tq = self.make()
+        els = [listener((x * 37) % 100) for x in range(0, 100)]
+        for el in els:
+            tq.insert(el)
+        self.checkIndex(tq)
+        # Cancelled timers are taken out right away, the heap only holds
+        # the active ones
+        for el in els[::3]:
+            tq.remove(el)
+            self.assertEqual(el.tindex, None)
+            self.checkIndex(tq)
+        self.assertEqual(len(tq.tlisteners), 66)
+        fired = expire(tq, 1000.0)
+        self.assertEqual(fired, sorted([x for x in els if x not in els[::3]], \
+          key = lambda x: x.etime.monot))
+        self.assertTrue(all([x.tindex == None for x in fired]))
+
+    def test_update_index(self):
+        tq = self.make()
+        els = [listener(x) for x in range(0, 50)]
+        for el in els:
+            tq.insert(el)
+        # Move timers both ways
+        for i, offset in ((0, 60.0), (49, -1.0), (25, 10.5), (10, 30.5)):
+            els[i].etime = base.getOffsetCopy(offset)
+            tq.update(els[i])
+            self.checkIndex(tq)
+        self.assertIs(tq.tlisteners[0], els[49])
+        self.assertEqual(len(tq), 50)
+        self.assertEqual(expire(tq, 1000.0), sorted(els, key = lambda x: x.etime.monot))
+
+if __name__ == '__main__':
+    unittest.main()